@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
@@ -6,12 +6,23 @@ import pandas as pd
 from pathlib import Path as FilePath
 import os
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 from enum import Enum
-from fastapi.params import Path
-import numpy as np
+from fastapi.params import Path, Query
+import logging
 
-from routers import model, prediction, health
+from routers import model, prediction, health, catalog, boundaries, choropleth, spatial, aggregates, timeseries
+from utils.model_registry import registry as model_registry
+from utils.county_features import county_features
+from utils.spatial_index import county_index
+from utils.result_store import result_store
+from utils.aggregates import rollup_store
+from utils.job_store import job_store
+from utils.response_cache import file_version
+from utils.columnar import DataFormat, table_response
+from utils.executors import run_in, IO, loop_lag
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Crop Yield Prediction API",
@@ -45,6 +56,32 @@ app.add_middleware(
 app.include_router(health.router, tags=["Health"])
 app.include_router(model.router, tags=["Model"])
 app.include_router(prediction.router, tags=["Predictions"])
+app.include_router(catalog.router, tags=["Catalog"])
+app.include_router(boundaries.router, tags=["Boundaries"])
+app.include_router(choropleth.router, tags=["Choropleth"])
+app.include_router(spatial.router, tags=["Spatial"])
+app.include_router(aggregates.router, tags=["Aggregates"])
+app.include_router(timeseries.router, tags=["Time Series"])
+
+def warm_up():
+    """Blocking per-worker warm-up, run off the event loop at startup"""
+    # Load and trace every checkpoint once per worker
+    model_registry.load_all()
+    county_features.warm()
+    county_index.warm()
+    # Rollup tables are rebuilt with every snapshot the store loads
+    result_store.subscribe(rollup_store.update)
+    # Every prediction route answers from this in-memory copy of the results,
+    # which a per-worker poller keeps in step with new result CSVs
+    result_store.load()
+    result_store.start_watcher()
+    # Jobs left unfinished by a worker that died are failed, not polled forever
+    job_store.fail_stale()
+
+@app.on_event("startup")
+async def load_models():
+    await run_in(IO, warm_up)
+    loop_lag.start()
 
 # Data directory configuration
 BASE_DIR = FilePath(__file__).resolve().parent
@@ -62,79 +99,78 @@ class PredictionRecord(BaseModel):
     y_test: float = Field(..., description="Actual yield", example=45.8)
     y_test_pred_uncertainty: float = Field(..., description="Prediction uncertainty", example=0.79)
 
+async def csv_response(request, file_path, format=None):
+    """Serve a CSV as JSON records (or Arrow / Parquet), encoded once per
+    version of the file; non-finite values are sent as null. Reading and
+    encoding happen on the I/O pool."""
+    return await run_in(
+        IO, lambda: table_response(request, str(file_path), file_version(file_path),
+                                   lambda: pd.read_csv(file_path), format))
+
+FORMAT_QUERY = Query(None, description="Response format: json (default), arrow or parquet")
+
 @app.get("/api/data/{crop}/{year}/{month}.json", include_in_schema=False)
 async def get_map_data(crop: str, year: str, month: str):
     try:
         file_path = DATA_DIR / crop / year / f"{month}.json"
         if not file_path.exists():
             raise HTTPException(status_code=404, detail=f"Data not found: {file_path}")
-        return file_path.read_text()
+        return await run_in(IO, file_path.read_text)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/data/corn_yield_US.csv", include_in_schema=False)
-async def get_historical_data():
+async def get_historical_data(request: Request, format: Optional[DataFormat] = FORMAT_QUERY):
     try:
         file_path = DATA_DIR / "corn_yield_US.csv"
         if not file_path.exists():
             raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
-            
-        df = pd.read_csv(file_path)
-        
-        # Print data info for debugging
-        print("DataFrame info:")
-        print(df.info())
-        
-        # Convert all numeric columns to float64 first
-        numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
-        for col in numeric_columns:
-            df[col] = df[col].astype('float64', errors='ignore')
-        
-        # Replace problematic values
-        df = df.replace([float('inf'), float('-inf')], None)
-        df = df.replace({pd.NA: None})
-        df = df.where(pd.notnull(df), None)
-        
-        # Additional safety check
-        for col in df.columns:
-            df[col] = df[col].apply(lambda x: None if pd.isna(x) or (isinstance(x, float) and not np.isfinite(x)) else x)
-        
-        result = df.to_dict(orient="records")
-        
-        # Verify the result is JSON serializable
-        import json
-        json.dumps(result)  # This will raise an error if there are any JSON incompatible values
-        
-        return result
-        
+
+        # NaN and +/-Inf become null, and the encoded body is reused until
+        # the file changes
+        return await csv_response(request, file_path, format)
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error processing CSV: {str(e)}")  # Debug log
+        logger.error(f"Error processing CSV: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing data: {str(e)}")
 
 @app.get("/api/data/average_pred.csv", include_in_schema=False)
-async def get_average_pred():
+async def get_average_pred(request: Request, format: Optional[DataFormat] = FORMAT_QUERY):
     try:
-        file_path = DATA_DIR / "average_pred.csv"
-        df = pd.read_csv(file_path)
-        return df.to_dict(orient="records")
+        return await csv_response(request, DATA_DIR / "average_pred.csv", format)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/data/county.csv", include_in_schema=False)
-async def get_county_data():
+async def get_county_data(request: Request, format: Optional[DataFormat] = FORMAT_QUERY):
     try:
-        file_path = DATA_DIR / "county.csv"
-        df = pd.read_csv(file_path)
-        return df.to_dict(orient="records")
+        return await csv_response(request, DATA_DIR / "county.csv", format)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/data/county_info.csv", include_in_schema=False)
-async def get_county_info():
+async def get_county_info(request: Request, format: Optional[DataFormat] = FORMAT_QUERY):
+    try:
+        return await csv_response(request, DATA_DIR / "county_info.csv", format)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/data/pred_data.csv", include_in_schema=False)
+async def get_pred_data(request: Request, format: Optional[DataFormat] = FORMAT_QUERY):
     try:
-        file_path = DATA_DIR / "county_info.csv"
-        df = pd.read_csv(file_path)
-        return df.to_dict(orient="records")
+        return await csv_response(request, DATA_DIR / "pred_data.csv", format)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -149,6 +185,13 @@ async def get_county_info():
     - Predicted yield
     - Actual yield
     - Prediction uncertainty
+
+    The body is encoded once per data version and served gzip- or
+    brotli-compressed when accepted, with a strong `ETag`.
+
+    JSON is the default. `Accept: application/vnd.apache.arrow.stream` or
+    `?format=arrow` returns an Arrow IPC stream and `?format=parquet` a Parquet
+    file (both need pyarrow on the server).
     """,
     response_model=List[PredictionRecord],
     responses={
@@ -173,6 +216,15 @@ async def get_county_info():
                 }
             }
         },
+        304: {"description": "Not modified since the ETag in If-None-Match"},
+        406: {
+            "description": "Requested format unavailable",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "parquet output requires pyarrow"}
+                }
+            }
+        },
         404: {
             "description": "Predictions not found",
             "content": {
@@ -192,14 +244,23 @@ async def get_county_info():
     }
 )
 async def get_predictions(
+    request: Request,
     crop: CropType = Path(..., description="Type of crop (corn or soybean)"),
-    year: str = Path(..., description="Prediction year (e.g., 2024)", regex="^20\d{2}$")
+    year: str = Path(..., description="Prediction year (e.g., 2024)", regex="^20\d{2}$"),
+    format: Optional[DataFormat] = FORMAT_QUERY
 ):
     try:
-        base_dir = RESULT_SOYBEAN_DIR if crop == "soybean" else RESULT_DIR
-        file_path = base_dir / "bnn" / f"result{year}.csv"
-        df = pd.read_csv(file_path)
-        return df.to_dict(orient="records")
+        snapshot = result_store.snapshot
+        if not snapshot.has(crop.value, year):
+            raise HTTPException(status_code=404, detail="No predictions found for specified crop and year")
+        # Encoded once per result store snapshot and format
+        return await run_in(
+            IO, table_response,
+            request, ("predictions", crop.value, year), snapshot.version,
+            lambda: snapshot.frame(crop.value, year), format,
+            records=lambda: snapshot.table(crop.value, year))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
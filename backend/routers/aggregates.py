@@ -0,0 +1,96 @@
+from fastapi import APIRouter, HTTPException, Path, Query, Request
+from pydantic import BaseModel, Field
+from typing import List
+from enum import Enum
+
+from utils.aggregates import rollup_store
+from utils.response_cache import encoded_response
+from utils.executors import run_in, IO
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Aggregates"]
+)
+
+class CropType(str, Enum):
+    corn = "corn"
+    soybean = "soybean"
+
+class Grouping(str, Enum):
+    state = "state"
+    l1 = "l1"
+    l2 = "l2"
+    domain = "domain"
+
+class GroupAggregate(BaseModel):
+    code: str = Field(..., description="State FIPS, ecoregion code or domain ID", example="55")
+    count: int = Field(..., description="Number of counties with a prediction", example=64)
+    mean: float = Field(..., description="Mean county prediction", example=176.2)
+    median: float = Field(..., description="Median county prediction", example=178.9)
+    weighted_mean: float = Field(..., description="Inverse-variance weighted mean of the county predictions", example=179.5)
+    uncertainty: float = Field(..., description="Standard error of the weighted mean", example=1.2)
+
+class AggregatesResponse(BaseModel):
+    crop: str = Field(..., description="Crop type (corn or soybean)", example="corn")
+    year: int = Field(..., description="Prediction year", example=2023)
+    doy: str = Field(..., description="Day of year or end_of_season", example="end_of_season")
+    by: Grouping = Field(..., description="Grouping of the counties", example="state")
+    groups: List[GroupAggregate]
+
+@router.get("/aggregates/{crop}/{year}/{doy}",
+    response_model=AggregatesResponse,
+    summary="Get Predictions Rolled Up by State or Ecoregion",
+    description="""
+    Aggregates the county predictions of one result file by a grouping from
+    `county_info.csv`:
+    - state: STATE_FIPS
+    - l1, l2: EPA level I and level II ecoregion codes (NA_L1CODE, NA_L2CODE)
+    - domain: DomainID
+
+    Each group reports the number of counties with a prediction, the mean
+    and median prediction, the inverse-variance weighted mean and its
+    standard error. The tables of every file and grouping are computed
+    whenever the results load, so requests are served from memory.
+    """,
+    responses={
+        200: {
+            "description": "One row per group, in code order",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "crop": "corn",
+                        "year": 2023,
+                        "doy": "end_of_season",
+                        "by": "state",
+                        "groups": [
+                            {"code": "55", "count": 64, "mean": 176.2, "median": 178.9,
+                             "weighted_mean": 179.5, "uncertainty": 1.2}
+                        ]
+                    }
+                }
+            }
+        },
+        304: {"description": "Unchanged since the ETag in If-None-Match"},
+        404: {
+            "description": "No result file for the crop, year and DOY",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "No predictions available for corn in 2024 at DOY 188"}
+                }
+            }
+        }
+    })
+async def get_aggregates(
+    request: Request,
+    crop: CropType = Path(..., description="Type of crop (corn or soybean)"),
+    year: int = Path(..., description="Prediction year", ge=2000, le=2099),
+    doy: str = Path(..., description="Day of year (e.g. 188) or end_of_season", regex="^(\d{3}|end_of_season)$"),
+    by: Grouping = Query(Grouping.state, description="Grouping of the counties")
+):
+    encoded = await run_in(IO, rollup_store.encoded, crop.value, year, doy, by.value)
+    if encoded is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No predictions available for {crop.value} in {year} at DOY {doy}"
+        )
+    return encoded_response(request, encoded)
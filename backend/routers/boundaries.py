@@ -0,0 +1,130 @@
+from fastapi import APIRouter, Path, Query, Request
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from enum import Enum
+
+from utils.boundaries import boundary_store, LEVELS
+from utils.response_cache import encoded_response
+from utils.executors import run_in, IO
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Boundaries"]
+)
+
+# Versioned URLs never change content; unversioned ones are revalidated daily
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=86400"
+
+class BoundaryLayer(str, Enum):
+    counties = "counties"
+    states = "states"
+
+class BoundaryLevel(BaseModel):
+    level: int = Field(..., description="Simplification level, 0 keeps every vertex", example=2)
+    tolerance: float = Field(..., description="Douglas-Peucker tolerance in degrees", example=0.02)
+    url: str = Field(..., description="Versioned URL of the TopoJSON file", example="/api/boundaries/counties?level=2&v=d58cb630ae818588")
+
+class BoundaryLayerInfo(BaseModel):
+    version: str = Field(..., description="Content version of the layer", example="d58cb630ae818588")
+    object: str = Field(..., description="Name of the TopoJSON object holding the geometries", example="counties")
+    levels: List[BoundaryLevel]
+
+class BoundaryIndexResponse(BaseModel):
+    layers: Dict[str, BoundaryLayerInfo]
+
+@router.get("/boundaries",
+    response_model=BoundaryIndexResponse,
+    summary="List Boundary Layers",
+    description="""
+    Lists the TopoJSON boundary layers and their simplification levels, with
+    versioned URLs that can be cached indefinitely.
+    """,
+    responses={
+        200: {
+            "description": "Available layers and levels",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "layers": {
+                            "counties": {
+                                "version": "d58cb630ae818588",
+                                "object": "counties",
+                                "levels": [
+                                    {"level": 0, "tolerance": 0.0, "url": "/api/boundaries/counties?level=0&v=d58cb630ae818588"},
+                                    {"level": 2, "tolerance": 0.02, "url": "/api/boundaries/counties?level=2&v=d58cb630ae818588"}
+                                ]
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    })
+async def list_boundaries():
+    layers = {}
+    for layer in BoundaryLayer:
+        version = await run_in(IO, boundary_store.version, layer.value)
+        layers[layer.value] = {
+            "version": version,
+            "object": layer.value,
+            "levels": [
+                {
+                    "level": level,
+                    "tolerance": tolerance,
+                    "url": f"/api/boundaries/{layer.value}?level={level}&v={version}"
+                }
+                for level, tolerance in enumerate(LEVELS)
+            ]
+        }
+    return {"layers": layers}
+
+@router.get("/boundaries/{layer}",
+    summary="Get Boundary Geometry as TopoJSON",
+    description="""
+    Returns county or state boundaries as quantized TopoJSON, generated once
+    from the census 1:20M files and kept on disk.
+
+    - Neighbouring polygons share arcs, so borders stay gap-free at every level
+    - `level` 0 keeps every vertex; higher levels are simplified further for
+      lower zoom levels (see `GET /api/boundaries` for the tolerances)
+    - Each geometry's `id` is its FIPS code (5 digits for counties, 2 for
+      states), to join predictions client-side; `properties.NAME` is kept
+
+    With `v` set to the layer's current version (as in the URLs listed by
+    `GET /api/boundaries`), the response is marked immutable for a year.
+    """,
+    responses={
+        200: {
+            "description": "TopoJSON topology",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "type": "Topology",
+                        "bbox": [-179.14734, 17.884813, 179.77847, 71.352561],
+                        "transform": {"scale": [0.000358929, 0.0000534683], "translate": [-179.14734, 17.884813]},
+                        "objects": {
+                            "counties": {
+                                "type": "GeometryCollection",
+                                "geometries": [
+                                    {"type": "Polygon", "arcs": [[0, 1, -3]], "id": "55025", "properties": {"NAME": "Dane"}}
+                                ]
+                            }
+                        },
+                        "arcs": [[[251234, 466890], [12, -3], [0, 41]]]
+                    }
+                }
+            }
+        },
+        304: {"description": "Topology unchanged since the ETag in If-None-Match"}
+    })
+async def get_boundaries(
+    request: Request,
+    layer: BoundaryLayer = Path(..., description="Boundary layer: counties or states"),
+    level: int = Query(1, description="Simplification level", ge=0, le=len(LEVELS) - 1),
+    v: Optional[str] = Query(None, description="Layer version, for an immutable response")
+):
+    encoded = await run_in(IO, boundary_store.encoded, layer.value, level)
+    version = boundary_store.version(layer.value)
+    cache_control = IMMUTABLE if v == version else REVALIDATE
+    return encoded_response(request, encoded, headers={"Cache-Control": cache_control})
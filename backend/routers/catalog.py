@@ -0,0 +1,99 @@
+from fastapi import APIRouter, Header, Query, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from enum import Enum
+
+from utils.catalog import catalog, BNN, SNAPSHOT
+from utils.response_cache import etag_matches
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Catalog"]
+)
+
+class CatalogSource(str, Enum):
+    bnn = BNN
+    snapshot = SNAPSHOT
+
+class CatalogEntry(BaseModel):
+    source: CatalogSource = Field(..., description="bnn for backend result files, snapshot for the dated frontend tree", example="bnn")
+    crop: str = Field(..., description="Crop type (corn or soybean)", example="corn")
+    year: int = Field(..., description="Prediction year", example=2024)
+    doy: str = Field(..., description="Day of year of the prediction, or end_of_season", example="188")
+    path: str = Field(..., description="File path relative to the repository root", example="backend/result_corn/bnn/result2024_188.csv")
+    rows: int = Field(..., description="Number of county rows", example=922)
+    size: int = Field(..., description="File size in bytes", example=44872)
+    checksum: str = Field(..., description="SHA-256 of the file contents", example="9f2c...e1")
+    snapshot_date: str = Field(..., description="Date of the dataset snapshot", example="2026-03-06")
+    modified: str = Field(..., description="Last modification time (UTC)", example="2024-07-09T14:02:11+00:00")
+
+class CatalogResponse(BaseModel):
+    etag: str = Field(..., description="Version of the catalog; changes whenever any file does", example="5d41402abc4b2a76b9719d911017c592")
+    generated_at: str = Field(..., description="When the catalog last changed (UTC)", example="2024-07-09T14:02:40+00:00")
+    count: int = Field(..., description="Number of entries returned", example=1)
+    entries: List[CatalogEntry]
+
+@router.get("/catalog",
+    response_model=CatalogResponse,
+    summary="List Available Prediction Files",
+    description="""
+    Lists every crop / year / DOY combination with prediction data, built from
+    one scan of the result directories and the dated frontend snapshot tree.
+
+    Each entry records the file path, row count, SHA-256 checksum and snapshot
+    date. The response carries an `ETag`; send it back in `If-None-Match` to
+    get a `304 Not Modified` while nothing has changed.
+    """,
+    responses={
+        200: {
+            "description": "Catalog entries",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "etag": "5d41402abc4b2a76b9719d911017c592",
+                        "generated_at": "2024-07-09T14:02:40+00:00",
+                        "count": 1,
+                        "entries": [
+                            {
+                                "source": "bnn",
+                                "crop": "corn",
+                                "year": 2024,
+                                "doy": "188",
+                                "path": "backend/result_corn/bnn/result2024_188.csv",
+                                "rows": 922,
+                                "size": 44872,
+                                "checksum": "9f2c...e1",
+                                "snapshot_date": "2024-07-09",
+                                "modified": "2024-07-09T14:02:11+00:00"
+                            }
+                        ]
+                    }
+                }
+            }
+        },
+        304: {"description": "Catalog unchanged since the ETag in If-None-Match"}
+    })
+async def get_catalog(
+    source: Optional[CatalogSource] = Query(None, description="Only entries of this source"),
+    crop: Optional[str] = Query(None, description="Only entries of this crop", regex="^(corn|soybean)$"),
+    year: Optional[int] = Query(None, description="Only entries of this year", ge=2000, le=2099),
+    if_none_match: Optional[str] = Header(None)
+):
+    entries = catalog.entries(source=source.value if source else None,
+                              crop=crop, year=year)
+    etag = f'"{catalog.etag}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    return JSONResponse(
+        content={
+            "etag": catalog.etag,
+            "generated_at": catalog.generated_at.isoformat(),
+            "count": len(entries),
+            "entries": entries
+        },
+        headers=headers
+    )
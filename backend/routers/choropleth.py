@@ -0,0 +1,88 @@
+from fastapi import APIRouter, HTTPException, Path, Query, Request
+from enum import Enum
+
+from utils.boundaries import LEVELS
+from utils.choropleth import choropleth, DEFAULT_LEVEL
+from utils.response_cache import encoded_response
+from utils.executors import run_in, IO
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Choropleth"]
+)
+
+class CropType(str, Enum):
+    corn = "corn"
+    soybean = "soybean"
+
+@router.get("/choropleth/{crop}/{year}/{doy}",
+    summary="Get Predictions Joined onto County Geometry",
+    description="""
+    Returns one result file as a GeoJSON FeatureCollection, ready to draw as a
+    choropleth without a client-side join.
+
+    Each feature is a county with its FIPS code as `id` and these properties:
+    - FIPS and NAME
+    - prediction: predicted yield
+    - actual: reported yield (null where unknown)
+    - uncertainty: prediction uncertainty
+    - error: prediction minus actual (null where actual is unknown)
+
+    `doy` is an in-season day of year such as `188`, or `end_of_season`.
+    Geometry comes from the county boundary layer at the requested
+    simplification `level` (see `GET /api/boundaries`). Every combination is
+    encoded once and then served from cache with an `ETag`.
+    """,
+    responses={
+        200: {
+            "description": "GeoJSON FeatureCollection",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "type": "FeatureCollection",
+                        "features": [
+                            {
+                                "type": "Feature",
+                                "id": "55025",
+                                "properties": {
+                                    "FIPS": 55025,
+                                    "NAME": "Dane",
+                                    "prediction": 178.4,
+                                    "actual": 181.2,
+                                    "uncertainty": 9.7,
+                                    "error": -2.8
+                                },
+                                "geometry": {
+                                    "type": "Polygon",
+                                    "coordinates": [[[-89.369127, 42.845046], [-89.838167, 42.857397], [-89.720295, 43.292928], [-89.009139, 43.28483], [-89.369127, 42.845046]]]
+                                }
+                            }
+                        ]
+                    }
+                }
+            }
+        },
+        304: {"description": "Unchanged since the ETag in If-None-Match"},
+        404: {
+            "description": "No result file for the crop, year and DOY",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "No predictions available for corn in 2024 at DOY 188"}
+                }
+            }
+        }
+    })
+async def get_choropleth(
+    request: Request,
+    crop: CropType = Path(..., description="Type of crop (corn or soybean)"),
+    year: int = Path(..., description="Prediction year", ge=2000, le=2099),
+    doy: str = Path(..., description="Day of year (e.g. 188) or end_of_season", regex="^(\d{3}|end_of_season)$"),
+    level: int = Query(DEFAULT_LEVEL, description="Geometry simplification level", ge=0, le=len(LEVELS) - 1)
+):
+    encoded = await run_in(IO, choropleth, crop.value, year, doy, level)
+    if encoded is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No predictions available for {crop.value} in {year} at DOY {doy}"
+        )
+    return encoded_response(request, encoded)
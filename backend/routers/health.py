@@ -9,6 +9,15 @@ from datetime import datetime, timezone
 import sys
 import os
 
+from utils.model_registry import registry as model_registry
+from utils.batching import model_batcher
+from utils.feature_cache import feature_cache
+from utils.result_store import result_store
+from utils.response_cache import response_cache
+from utils.executors import executor_stats, loop_lag, run_in, IO
+from utils.job_store import job_store
+from utils.spatial_index import county_index
+
 router = APIRouter(
     prefix="/api",
     tags=["Health"],
@@ -122,6 +131,85 @@ async def health_check(response: Response):
                             "python_version": "3.9.0",
                             "timezone": "UTC",
                             "hostname": "server-name"
+                        },
+                        "models": {
+                            "BNN2": {
+                                "warm": True,
+                                "backend": "numpy",
+                                "weights_path": "/app/backend/weights/BNN2",
+                                "load_time_seconds": 0.03,
+                                "loaded_at": "2024-03-20T09:58:12Z",
+                                "error": None
+                            }
+                        },
+                        "batching": {
+                            "max_batch_size": 64,
+                            "max_wait_ms": 5.0,
+                            "requests": 120,
+                            "batches": 31,
+                            "mean_batch_size": 3.87,
+                            "queue_depth": 0,
+                            "max_queue_depth": 9,
+                            "batch_size_histogram": {"1": 12, "4": 10, "8": 9},
+                            "queue_depth_histogram": {"0": 28, "16": 3}
+                        },
+                        "feature_cache": {
+                            "path": "/app/backend/cache/features.sqlite",
+                            "entries": 3400,
+                            "bytes": 1062400,
+                            "max_bytes": 268435456,
+                            "max_entries": 200000,
+                            "hits": 57,
+                            "partial_hits": 4,
+                            "misses": 12
+                        },
+                        "results": {
+                            "loaded": True,
+                            "files": 288,
+                            "counties": 1004,
+                            "nbytes": 3855360,
+                            "load_time_seconds": 0.02,
+                            "loaded_at": "2024-03-20T09:59:40Z",
+                            "reloads": 3,
+                            "last_changes": {"added": 2, "changed": 0, "removed": 0},
+                            "poll_interval_seconds": 30.0,
+                            "last_error": None
+                        },
+                        "response_cache": {
+                            "entries": 5,
+                            "bytes": 1482330,
+                            "max_entries": 256,
+                            "hits": 940,
+                            "misses": 5,
+                            "brotli": False
+                        },
+                        "executors": {
+                            "io": {"max_workers": 4, "running": 1, "queued": 0, "completed": 812},
+                            "extraction": {"max_workers": 4, "running": 4, "queued": 3, "completed": 57},
+                            "compute": {"max_workers": 2, "running": 0, "queued": 0, "completed": 21},
+                            "jobs": {"max_workers": 2, "running": 2, "queued": 1, "completed": 9}
+                        },
+                        "event_loop": {
+                            "interval_seconds": 0.5,
+                            "last_ms": 0.4,
+                            "mean_ms": 0.6,
+                            "max_ms": 12.3,
+                            "samples": 7200,
+                            "histogram_ms": {"1": 7011, "5": 170, "10": 16, "25": 3}
+                        },
+                        "jobs": {
+                            "path": "/app/backend/cache/jobs.sqlite",
+                            "ttl_seconds": 604800,
+                            "queued": 1,
+                            "running": 2,
+                            "succeeded": 40,
+                            "failed": 1
+                        },
+                        "spatial_index": {
+                            "built": True,
+                            "polygons": 3221,
+                            "centroids": 3106,
+                            "build_time_seconds": 0.62
                         }
                     }
                 }
@@ -144,6 +232,15 @@ async def detailed_health_check(response: Response):
             - python_version: Current Python version
             - timezone: System timezone
             - hostname: System hostname
+        - models: Load time and warm status of each served model checkpoint
+        - batching: Micro-batching queue depth and batch-size histograms
+        - feature_cache: Size, limits and hit counts of the persistent feature cache
+        - results: File count and last reload of the in-memory prediction store
+        - response_cache: Pre-encoded response bodies and their hit counts
+        - executors: Running, queued and completed calls of each worker pool
+        - event_loop: Event-loop lag (late wake-ups from a timed sleep)
+        - jobs: Asynchronous prediction jobs in the shared job store, by state
+        - spatial_index: Size and build time of the county spatial indexes
     
     Raises:
         - 503: Service Unavailable if health check fails, includes error message
@@ -151,6 +248,11 @@ async def detailed_health_check(response: Response):
     try:
         boot_time = datetime.fromtimestamp(psutil.boot_time())
         uptime = datetime.now() - boot_time
+
+        # SQLite scans under the locks the extraction and job paths take,
+        # so they run on the IO pool rather than the event loop
+        feature_stats = await run_in(IO, feature_cache.stats)
+        job_stats = await run_in(IO, job_store.stats)
         
         health_info = {
             "status": "healthy",
@@ -161,7 +263,16 @@ async def detailed_health_check(response: Response):
                 "python_version": sys.version,
                 "timezone": time.tzname[0],
                 "hostname": os.uname().nodename if hasattr(os, 'uname') else None
-            }
+            },
+            "models": model_registry.status(),
+            "batching": model_batcher.stats(),
+            "feature_cache": feature_stats,
+            "results": result_store.status(),
+            "response_cache": response_cache.stats(),
+            "executors": executor_stats(),
+            "event_loop": loop_lag.stats(),
+            "jobs": job_stats,
+            "spatial_index": county_index.status()
         }
         return health_info
     except Exception as e:
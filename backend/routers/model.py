@@ -1,21 +1,52 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query, Response
 from pydantic import BaseModel, Field
-from typing import Dict, Any, List
-from fastapi.responses import JSONResponse
+from typing import Dict, Any, List, Optional
+from enum import Enum
+from fastapi.responses import JSONResponse, StreamingResponse
+from datetime import datetime, timezone
 import tempfile
 from pathlib import Path  # Using Path from pathlib instead of os.path
 import json
+import os
+import time
 import uuid
+import asyncio
 import numpy as np
 
 from utils.geo_utils import validate_geojson
-from utils.get_feature import get_features
-from utils.run_model import run_model
+from utils.get_feature import get_features, get_feature_matrix
+from utils.batching import model_batcher
+from utils.model_registry import registry as model_registry
+from utils.county_features import county_features
+from utils.spatial_index import county_index, geojson_geometry
+from utils.provisional import provisional_estimate
+from utils.executors import run_in, pools, IO, EXTRACTION, COMPUTE, JOBS
+from utils.job_store import (job_store, STAGES, FINAL_STATES, STAGE_RUNNING,
+                             STAGE_DONE, STAGE_CACHED, STAGE_FAILED)
 
 router = APIRouter(
     prefix="/api"
 )
 
+# Year whose satellite and weather data are used for uploaded geometries
+FEATURE_YEAR = 2023
+
+# Jobs accepted per worker (running or queued) before answering 503
+JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 32))
+# How often an event stream checks the job store, and sends a keep-alive
+JOB_EVENT_POLL_SECONDS = float(os.environ.get('JOB_EVENT_POLL_SECONDS', 0.5))
+JOB_KEEPALIVE_SECONDS = 15
+# Longest a single event stream stays open; EventSource clients reconnect
+# and resume from Last-Event-ID
+JOB_STREAM_MAX_SECONDS = float(os.environ.get('JOB_STREAM_MAX_SECONDS', 600))
+
+CROP_QUERY = Query("corn", description="Crop whose county results back the provisional estimate",
+                   regex="^(corn|soybean)$")
+
+# Job stage of each feature extraction source
+SOURCE_STAGES = {'soil': 'soil', 'modis_vi': 'vi', 'lst': 'lst',
+                 'prism': 'prism', 'gldas': 'gldas'}
+
 class GeoJSONGeometry(BaseModel):
     type: str = Field(..., example="Polygon")
     coordinates: List[List[List[float]]] = Field(..., description="Array of coordinates defining the polygon")
@@ -69,9 +100,77 @@ class GeoJSONRequest(BaseModel):
             }
         }
 
+class InferenceMode(str, Enum):
+    sample = "sample"
+    map = "map"
+    monte_carlo = "monte_carlo"
+    moments = "moments"
+
 class PredictionResponse(BaseModel):
     status: str = Field(..., example="success")
-    prediction: List[float] = Field(..., description="Model predictions for crop yield")
+    prediction: List[float] = Field(..., description="Predicted crop yield and its aleatoric standard deviation")
+    mode: InferenceMode = Field(InferenceMode.sample, description="Inference mode used for the prediction")
+    epistemic_uncertainty: Optional[float] = Field(None, description="Model (epistemic) standard deviation, for monte_carlo and moments modes", example=0.27)
+    county_fips: Optional[int] = Field(None, description="County containing the field's centroid, resolved from the geometry rather than the STATE/COUNTY properties", example=55025)
+
+class FieldPrediction(BaseModel):
+    prediction: List[float] = Field(..., description="Predicted crop yield and its aleatoric standard deviation")
+    epistemic_uncertainty: Optional[float] = Field(None, description="Model (epistemic) standard deviation, for monte_carlo and moments modes")
+    county_fips: Optional[int] = Field(None, description="County containing the field's centroid")
+
+class BatchPredictionResponse(BaseModel):
+    status: str = Field(..., example="success")
+    mode: InferenceMode = Field(..., description="Inference mode used for the predictions")
+    predictions: Dict[str, FieldPrediction] = Field(
+        ...,
+        description="Predictions keyed by the GEO_ID of each input feature",
+        example={
+            "0500000US55025": {"prediction": [156.78, 0.52], "epistemic_uncertainty": None, "county_fips": 55025}
+        }
+    )
+
+class JobState(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+class ProvisionalCounty(BaseModel):
+    FIPS: int = Field(..., description="County FIPS code", example=55025)
+    weight: float = Field(..., description="Share of the covered field area in this county", example=0.82)
+    prediction: float = Field(..., description="County prediction", example=178.4)
+    uncertainty: float = Field(..., description="County prediction uncertainty", example=9.7)
+
+class ProvisionalEstimate(BaseModel):
+    prediction: List[float] = Field(..., description="Area-weighted county yield and its standard deviation", example=[176.9, 10.3])
+    crop: str = Field(..., description="Crop of the county results used", example="corn")
+    year: int = Field(..., description="Year of the county results used", example=2024)
+    doy: str = Field(..., description="DOY of the newest in-season result file", example="284")
+    coverage: Optional[float] = Field(None, description="Fraction of the field area covered by counties with a prediction", example=1.0)
+    counties: List[ProvisionalCounty]
+
+class JobCreatedResponse(BaseModel):
+    job_id: str = Field(..., example="3f6c1e0a9b2d4c8e8f0a1b2c3d4e5f60")
+    status: JobState = Field(JobState.queued, description="Initial job state")
+    status_url: str = Field(..., description="Poll this URL for the job status", example="/api/model/jobs/3f6c1e0a9b2d4c8e8f0a1b2c3d4e5f60")
+    events_url: str = Field(..., description="Server-sent event stream of the job's progress", example="/api/model/jobs/3f6c1e0a9b2d4c8e8f0a1b2c3d4e5f60/events")
+    provisional: Optional[ProvisionalEstimate] = Field(None, description="Immediate area-weighted estimate from the overlapping counties' latest predictions, null when the field overlaps none")
+
+class JobStatusResponse(BaseModel):
+    job_id: str = Field(..., example="3f6c1e0a9b2d4c8e8f0a1b2c3d4e5f60")
+    status: JobState = Field(..., description="queued, running, succeeded or failed")
+    mode: InferenceMode = Field(..., description="Inference mode of the job")
+    stage: Optional[str] = Field(None, description="Most recently updated stage", example="prism")
+    stages: Dict[str, str] = Field(
+        ...,
+        description="Latest state of each stage: pending, running, done, cached or failed",
+        example={"validate": "done", "soil": "done", "vi": "running", "lst": "done",
+                 "prism": "running", "gldas": "done", "inference": "pending"}
+    )
+    result: Optional[PredictionResponse] = Field(None, description="Prediction, once the job has succeeded")
+    error: Optional[str] = Field(None, description="Error message, if the job failed")
+    created_at: str = Field(..., description="Submission time (UTC)", example="2024-07-09T14:02:11+00:00")
+    updated_at: str = Field(..., description="Last update (UTC)", example="2024-07-09T14:03:40+00:00")
 
 import numpy as np
 import pandas as pd
@@ -140,6 +239,75 @@ def verify_feature_vector(feature_vector):
     
     return True
 
+def extract_features(geojson, progress=None):
+    """
+    Raw feature dictionary for one GeoJSON request (blocking)
+    
+    Census county boundaries were already extracted by the training
+    pipeline and are looked up in the county store; anything else goes
+    through Earth Engine.
+    
+    Args:
+        geojson (dict): Validated GeoJSON FeatureCollection
+        progress (callable): Optional ``progress(source, state)`` callback
+            for each data source
+        
+    Returns:
+        dict: Feature name to value, or None if extraction failed
+    """
+    features_dict = county_features.features_for(geojson, FEATURE_YEAR)
+    if features_dict is not None:
+        if progress is not None:
+            for source in SOURCE_STAGES:
+                progress(source, STAGE_CACHED)
+        return features_dict
+
+    # Create temporary directory using pathlib
+    temp_dir = Path(tempfile.gettempdir()) / 'crop_prediction'
+    temp_dir.mkdir(exist_ok=True)
+
+    # Generate unique filename
+    temp_file = temp_dir / f"request_{uuid.uuid4()}.json"
+
+    # Save GeoJSON to temporary file
+    temp_file.write_text(json.dumps(geojson))
+
+    # Get features
+    try:
+        features_df = get_features(temp_file, FEATURE_YEAR, progress=progress)
+    finally:
+        temp_file.unlink(missing_ok=True)
+
+    if features_df is None:
+        return None
+
+    # Convert DataFrame to dictionary
+    return features_df.to_dict(orient='records')[0]
+
+def build_model_input(features_dict):
+    """
+    Model input row for one raw feature dictionary
+    
+    Args:
+        features_dict (dict): Feature name to value, as from extract_features
+        
+    Returns:
+        numpy.ndarray: 293-length vector (year, padding and 291 features)
+    """
+    # replace nan with 0
+    features_dict = {name: 0 if value is None or np.isnan(value) else value
+                     for name, value in features_dict.items()}
+
+    # Rearrange features
+    feature_vector = rearrange_features(features_dict)
+
+    # Verify feature vector
+    if not verify_feature_vector(feature_vector):
+        raise ValueError("Invalid feature vector generated")
+
+    # Add year and padding to create 293-length vector
+    return np.concatenate([[2024, 0], feature_vector])
+
 @router.post("/model/",
     response_model=PredictionResponse,
     summary="Generate Crop Yield Predictions",
@@ -148,7 +316,9 @@ def verify_feature_vector(feature_vector):
     
     This endpoint:
     1. Validates the input GeoJSON format
-    2. Extracts relevant features from satellite and weather data
+    2. Extracts relevant features from satellite and weather data, or looks
+       them up in the precomputed county store when the geometry is exactly
+       a census county boundary with its `GEO_ID`
     3. Processes features through a machine learning model
     4. Returns predicted crop yield with uncertainty estimates
     
@@ -157,6 +327,18 @@ def verify_feature_vector(feature_vector):
     - Dynamic features including vegetation indices (EVI, NDVI, etc.)
     - Weather data (precipitation, temperature, etc.)
     - Satellite-derived moisture indices
+
+    The `mode` query parameter selects how the Bayesian network is evaluated:
+    - sample: a single stochastic forward pass (default)
+    - map: the posterior mean weights only
+    - monte_carlo: 100 weight samples, adding epistemic uncertainty
+    - moments: deterministic moment propagation, adding epistemic uncertainty in one pass
+
+    With `provisional=true` the endpoint does not wait for feature extraction.
+    It answers `202 Accepted` at once with an area-weighted estimate from the
+    newest in-season predictions of the counties the field overlaps, plus a
+    job whose exact result follows at `status_url` (poll) or `events_url`
+    (server-sent events), as with `POST /api/model/jobs`.
     """,
     responses={
         200: {
@@ -165,7 +347,33 @@ def verify_feature_vector(feature_vector):
                 "application/json": {
                     "example": {
                         "status": "success",
-                        "prediction": [156.78]
+                        "prediction": [156.78, 0.52],
+                        "mode": "moments",
+                        "epistemic_uncertainty": 0.27,
+                        "county_fips": 55025
+                    }
+                }
+            }
+        },
+        202: {
+            "description": "Provisional estimate, with a job for the exact prediction",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "job_id": "3f6c1e0a9b2d4c8e8f0a1b2c3d4e5f60",
+                        "status": "queued",
+                        "status_url": "/api/model/jobs/3f6c1e0a9b2d4c8e8f0a1b2c3d4e5f60",
+                        "events_url": "/api/model/jobs/3f6c1e0a9b2d4c8e8f0a1b2c3d4e5f60/events",
+                        "provisional": {
+                            "prediction": [176.9, 10.3],
+                            "crop": "corn",
+                            "year": 2024,
+                            "doy": "284",
+                            "coverage": 1.0,
+                            "counties": [
+                                {"FIPS": 55025, "weight": 1.0, "prediction": 176.9, "uncertainty": 10.3}
+                            ]
+                        }
                     }
                 }
             }
@@ -188,66 +396,474 @@ def verify_feature_vector(feature_vector):
         }
     }
 )
-async def process_geojson(geojson_data: GeoJSONRequest):
+async def process_geojson(
+    geojson_data: GeoJSONRequest,
+    mode: InferenceMode = Query(InferenceMode.sample, description="Inference mode for the Bayesian network"),
+    provisional: bool = Query(False, description="Answer at once with an area-weighted county estimate and a job for the exact prediction"),
+    crop: str = CROP_QUERY
+):
+    if provisional:
+        job = await start_job(geojson_data.dict(), mode, crop)
+        return JSONResponse(status_code=202, content=job.dict(),
+                            headers={"Location": job.status_url})
+
     try:
         # Validate GeoJSON
         if not validate_geojson(geojson_data.dict()):
             raise HTTPException(status_code=400, detail="Invalid GeoJSON format")
 
-        # Create temporary directory using pathlib
-        temp_dir = Path(tempfile.gettempdir()) / 'crop_prediction'
-        temp_dir.mkdir(exist_ok=True)
-
-        # Generate unique filename
-        temp_file = temp_dir / f"request_{uuid.uuid4()}.json"
+        # The county comes from the geometry; client-supplied STATE/COUNTY
+        # properties are often wrong or missing
+        county_fips = await run_in(IO, county_index.resolve_geometry, geojson_data.dict())
 
-        # Save GeoJSON to temporary file
-        temp_file.write_text(json.dumps(geojson_data.dict()))
+        # Blocking Earth Engine work runs on the extraction pool, keeping
+        # the event loop free for other requests
+        features_dict = await run_in(EXTRACTION, extract_features, geojson_data.dict())
+        if features_dict is None:
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to extract features"
+            )
 
-        # Get features
-        features_df = get_features(temp_file)
+        final_vector = build_model_input(features_dict)
 
-        # replace nan with 0
-        features_df = features_df.fillna(0)
+        # random for testing
+        # final_vector = np.random.rand(1, 293)
+        
+        # Reshape for model input (expecting shape (1, 293))
+        model_input = final_vector.reshape(1, -1)
         
+        # Run model prediction through the micro-batching queue, which
+        # shares one forward pass between concurrent requests
+        result = await asyncio.wrap_future(
+            model_batcher.submit(model_input[0], key=mode.value))
+
+        return PredictionResponse(
+            status="success",
+            prediction=[result["mean"], result["aleatoric"]],
+            mode=mode,
+            epistemic_uncertainty=result["epistemic"],
+            county_fips=county_fips
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}") 
+
+@router.post("/model/batch",
+    response_model=BatchPredictionResponse,
+    summary="Generate Crop Yield Predictions for Many Fields",
+    description="""
+    Predicts crop yield separately for every feature of a FeatureCollection.
+
+    Unlike `/api/model/`, which reduces over the union of all geometries,
+    this endpoint:
+    1. Extracts per-feature statistics with one reduceRegions request per data source
+    2. Builds an (N, 293) feature matrix
+    3. Runs a single batched forward pass
+    4. Returns the results keyed by each feature's `GEO_ID`
+    """,
+    responses={
+        200: {
+            "description": "Successful prediction",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "success",
+                        "mode": "sample",
+                        "predictions": {
+                            "0500000US55025": {"prediction": [156.78, 0.52], "epistemic_uncertainty": None, "county_fips": 55025}
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Invalid GeoJSON format or duplicate GEO_ID",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Duplicate GEO_ID values: 0500000US55025"}
+                }
+            }
+        },
+        500: {
+            "description": "Server processing error",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Error processing request: [error details]"}
+                }
+            }
+        }
+    }
+)
+async def process_geojson_batch(
+    geojson_data: GeoJSONRequest,
+    mode: InferenceMode = Query(InferenceMode.sample, description="Inference mode for the Bayesian network")
+):
+    if not validate_geojson(geojson_data.dict()):
+        raise HTTPException(status_code=400, detail="Invalid GeoJSON format")
+
+    geo_ids = [feature.properties.GEO_ID for feature in geojson_data.features]
+    duplicates = sorted({geo_id for geo_id in geo_ids if geo_ids.count(geo_id) > 1})
+    if duplicates:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Duplicate GEO_ID values: {', '.join(duplicates)}"
+        )
+
+    temp_dir = Path(tempfile.gettempdir()) / 'crop_prediction'
+    temp_dir.mkdir(exist_ok=True)
+    temp_file = temp_dir / f"request_{uuid.uuid4()}.json"
+
+    try:
+        temp_file.write_text(json.dumps(geojson_data.dict()))
+
+        # One row of raw features per input feature
+        features_df = await run_in(EXTRACTION, get_feature_matrix, temp_file, FEATURE_YEAR)
         if features_df is None:
             raise HTTPException(
                 status_code=500,
                 detail="Failed to extract features"
             )
+        features_df = features_df.fillna(0)
 
-        # Convert DataFrame to dictionary
-        features_dict = features_df.to_dict(orient='records')[0]
-
-        # Rearrange features
-        feature_vector = rearrange_features(features_dict)
-        
-        # Verify feature vector
-        if not verify_feature_vector(feature_vector):
+        feature_matrix = np.stack([
+            rearrange_features(row)
+            for row in features_df.to_dict(orient='records')
+        ])
+        if not all(verify_feature_vector(row) for row in feature_matrix):
             raise HTTPException(
                 status_code=500,
                 detail="Invalid feature vector generated"
             )
-        
-        # Add year and padding to create 293-length vector
-        final_vector = np.concatenate([[2024, 0], feature_vector])
 
-        # random for testing
-        # final_vector = np.random.rand(1, 293)
-        
-        # Reshape for model input (expecting shape (1, 293))
-        model_input = final_vector.reshape(1, -1)
-        
-        # Run model prediction
-        prediction = run_model(model_input)
+        # Add year and padding to create (N, 293) model input
+        prefix = np.tile(np.array([2024, 0], dtype=np.float32), (len(feature_matrix), 1))
+        model_input = np.hstack([prefix, feature_matrix])
 
-        # Clean up temporary file
-        temp_file.unlink()
+        # One forward pass for every field
+        result = await run_in(COMPUTE, model_registry.infer, model_input, mode=mode.value)
+        epistemic = result["epistemic"]
 
-        return PredictionResponse(
+        counties = await run_in(IO, county_index.resolve_geometries, [
+            geojson_geometry(feature.geometry.dict()) for feature in geojson_data.features])
+
+        return BatchPredictionResponse(
             status="success",
-            prediction=prediction.tolist()
+            mode=mode,
+            predictions={
+                geo_id: FieldPrediction(
+                    prediction=[float(result["mean"][i]), float(result["aleatoric"][i])],
+                    epistemic_uncertainty=float(epistemic[i]) if epistemic is not None else None,
+                    county_fips=int(counties[i]) or None
+                )
+                for i, geo_id in enumerate(geo_ids)
+            }
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+    finally:
+        temp_file.unlink(missing_ok=True)
+
+def run_job(job_id, geojson, mode):
+    """
+    Run one prediction job to completion (blocking, on the job pool)
+    
+    Every stage change and the final result or error are written to the
+    job store, where any worker can read them.
+    
+    Args:
+        job_id (str): Id returned by job_store.create
+        geojson (dict): Validated GeoJSON FeatureCollection
+        mode (InferenceMode): Inference mode for the Bayesian network
+    """
+    stage = None
+
+    def progress(source, state):
+        job_store.stage(job_id, SOURCE_STAGES[source], state)
+
+    try:
+        county_fips = county_index.resolve_geometry(geojson)
+        features_dict = extract_features(geojson, progress)
+        if features_dict is None:
+            raise ValueError("Failed to extract features")
+
+        stage = 'inference'
+        job_store.stage(job_id, stage, STAGE_RUNNING)
+        model_input = build_model_input(features_dict)
+        result = model_batcher.submit(model_input, key=mode.value).result()
+        job_store.stage(job_id, stage, STAGE_DONE)
+
+        job_store.finish(job_id, PredictionResponse(
+            status="success",
+            prediction=[result["mean"], result["aleatoric"]],
+            mode=mode,
+            epistemic_uncertainty=result["epistemic"],
+            county_fips=county_fips
+        ).dict())
+    except Exception as e:
+        if stage is not None:
+            job_store.stage(job_id, stage, STAGE_FAILED, str(e))
+        job_store.fail(job_id, f"Error processing request: {str(e)}")
+
+async def start_job(geojson, mode, crop):
+    """
+    Validate a request, queue its prediction job and estimate it provisionally
+    
+    Args:
+        geojson (dict): GeoJSON FeatureCollection from the request
+        mode (InferenceMode): Inference mode for the Bayesian network
+        crop (str): Crop whose county results back the provisional estimate
+        
+    Returns:
+        JobCreatedResponse: Job id, follow-up URLs and provisional estimate
+    """
+    if not validate_geojson(geojson):
+        raise HTTPException(status_code=400, detail="Invalid GeoJSON format")
+
+    job_pool = pools[JOBS]
+    if job_pool.pending >= JOB_MAX_PENDING:
+        raise HTTPException(status_code=503,
+                            detail="Too many pending jobs, retry later",
+                            headers={"Retry-After": "30"})
+
+    # Counties overlapping the field give an answer in milliseconds, while
+    # the exact prediction waits for Earth Engine. Estimated first, so a
+    # failure here cannot leave a job running that nobody was told about
+    provisional = await run_in(IO, provisional_estimate, geojson, crop)
+
+    job_id = await run_in(IO, job_store.create, mode.value)
+    await run_in(IO, job_store.stage, job_id, 'validate', STAGE_DONE)
+    job_pool.submit(run_job, job_id, geojson, mode)
+
+    status_url = f"/api/model/jobs/{job_id}"
+    return JobCreatedResponse(
+        job_id=job_id,
+        status=JobState.queued,
+        status_url=status_url,
+        events_url=f"{status_url}/events",
+        provisional=provisional
+    )
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+def job_status(job_id):
+    """Job dict with the latest state of every stage (blocking)"""
+    job = job_store.get(job_id)
+    if job is None:
+        return None
+    stages = {stage: "pending" for stage in STAGES}
+    for event in job_store.events(job_id):
+        if event["stage"] in stages:
+            stages[event["stage"]] = event["state"]
+    job["stages"] = stages
+    job["created_at"] = _isoformat(job["created_at"])
+    job["updated_at"] = _isoformat(job["updated_at"])
+    return job
+
+def _sse(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def job_event_stream(job_id, after=0):
+    """Server-sent events for a job, from the event after ``after`` until
+    the job has finished or the stream reaches its maximum lifetime"""
+    last_sent = time.monotonic()
+    deadline = last_sent + JOB_STREAM_MAX_SECONDS
+    while time.monotonic() < deadline:
+        events = await run_in(IO, job_store.events, job_id, after)
+        for event in events:
+            after = event["id"]
+            kind = "status" if event["stage"] == "job" else "progress"
+            yield _sse(after, kind, {
+                "stage": event["stage"],
+                "state": event["state"],
+                "message": event["message"],
+                "at": _isoformat(event["at"])
+            })
+            last_sent = time.monotonic()
+
+        if not events or events[-1]["state"] in FINAL_STATES:
+            job = await run_in(IO, job_status, job_id)
+            if job is None or job["status"] in FINAL_STATES:
+                yield _sse(after, "result", job)
+                return
+
+        if time.monotonic() - last_sent >= JOB_KEEPALIVE_SECONDS:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        await asyncio.sleep(JOB_EVENT_POLL_SECONDS)
+
+@router.post("/model/jobs",
+    status_code=202,
+    response_model=JobCreatedResponse,
+    summary="Submit an Asynchronous Prediction Job",
+    description="""
+    Queues the same prediction as `POST /api/model/` and returns a job id at once,
+    with a provisional area-weighted estimate from the newest in-season
+    predictions of the counties the field overlaps.
+
+    Feature extraction can take minutes for geometries that are not cached,
+    longer than a request should be held open. The job runs on a bounded
+    worker pool; its status and result are kept in a job store shared by all
+    workers for `JOB_TTL` seconds (7 days by default).
+
+    Follow the job with either:
+    - `GET /api/model/jobs/{job_id}`: poll the status, stages and result
+    - `GET /api/model/jobs/{job_id}/events`: a server-sent event stream of
+      per-stage progress (validate, soil, vi, lst, prism, gldas, inference)
+    """,
+    responses={
+        202: {
+            "description": "Job accepted",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "job_id": "3f6c1e0a9b2d4c8e8f0a1b2c3d4e5f60",
+                        "status": "queued",
+                        "status_url": "/api/model/jobs/3f6c1e0a9b2d4c8e8f0a1b2c3d4e5f60",
+                        "events_url": "/api/model/jobs/3f6c1e0a9b2d4c8e8f0a1b2c3d4e5f60/events",
+                        "provisional": {
+                            "prediction": [176.9, 10.3],
+                            "crop": "corn",
+                            "year": 2024,
+                            "doy": "284",
+                            "coverage": 1.0,
+                            "counties": [
+                                {"FIPS": 55025, "weight": 1.0, "prediction": 176.9, "uncertainty": 10.3}
+                            ]
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Invalid GeoJSON format",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid GeoJSON format"}
+                }
+            }
+        },
+        503: {
+            "description": "Too many jobs pending in this worker",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Too many pending jobs, retry later"}
+                }
+            }
+        }
+    }
+)
+async def submit_job(
+    geojson_data: GeoJSONRequest,
+    response: Response,
+    mode: InferenceMode = Query(InferenceMode.sample, description="Inference mode for the Bayesian network"),
+    crop: str = CROP_QUERY
+):
+    job = await start_job(geojson_data.dict(), mode, crop)
+    response.headers["Location"] = job.status_url
+    return job
+
+@router.get("/model/jobs/{job_id}",
+    response_model=JobStatusResponse,
+    summary="Get Prediction Job Status",
+    description="""
+    Returns the state of a prediction job, the latest state of each stage and,
+    once the job has succeeded, its prediction in the same shape as
+    `POST /api/model/`.
+    """,
+    responses={
+        200: {
+            "description": "Job status",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "job_id": "3f6c1e0a9b2d4c8e8f0a1b2c3d4e5f60",
+                        "status": "succeeded",
+                        "mode": "moments",
+                        "stage": "inference",
+                        "stages": {"validate": "done", "soil": "done", "vi": "done", "lst": "done",
+                                   "prism": "done", "gldas": "done", "inference": "done"},
+                        "result": {
+                            "status": "success",
+                            "prediction": [156.78, 0.52],
+                            "mode": "moments",
+                            "epistemic_uncertainty": 0.27,
+                            "county_fips": 55025
+                        },
+                        "error": None,
+                        "created_at": "2024-07-09T14:02:11+00:00",
+                        "updated_at": "2024-07-09T14:03:40+00:00"
+                    }
+                }
+            }
+        },
+        404: {
+            "description": "Unknown or expired job",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Job not found"}
+                }
+            }
+        }
+    }
+)
+async def get_job(job_id: str):
+    job = await run_in(IO, job_status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/model/jobs/{job_id}/events",
+    summary="Stream Prediction Job Progress",
+    description="""
+    Server-sent event stream of a job's progress, closed once the job finishes.
+
+    Events:
+    - `progress`: a stage (validate, soil, vi, lst, prism, gldas, inference)
+      changed state (running, done, cached or failed)
+    - `status`: the job itself changed state (queued, succeeded or failed)
+    - `result`: the final job status, as from `GET /api/model/jobs/{job_id}`;
+      always the last event
+
+    Every event has an `id`; reconnecting with `Last-Event-ID` resumes after it.
+    A stream is closed after `JOB_STREAM_MAX_SECONDS` (10 minutes by default)
+    even if the job is still running, and EventSource clients reconnect and
+    resume. A job whose worker stopped is failed once it has gone
+    `JOB_STALE_SECONDS` without a heartbeat, which ends its stream.
+    """,
+    responses={
+        200: {
+            "description": "Event stream",
+            "content": {
+                "text/event-stream": {
+                    "example": "id: 4\nevent: progress\ndata: {\"stage\": \"soil\", \"state\": \"done\", \"message\": null, \"at\": \"2024-07-09T14:02:19+00:00\"}\n\n"
+                }
+            }
+        },
+        404: {
+            "description": "Unknown or expired job",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Job not found"}
+                }
+            }
+        }
+    }
+)
+async def stream_job_events(
+    job_id: str,
+    last_event_id: Optional[int] = Header(None)
+):
+    if await run_in(IO, job_store.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        job_event_stream(job_id, last_event_id or 0),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -3,9 +3,10 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from typing import Dict, Optional, Union
 from pathlib import Path as PathLib
-import pandas as pd
 from enum import Enum
-import re
+
+from utils.catalog import catalog
+from utils.result_store import result_store
 
 router = APIRouter(tags=["Predictions"])
 
@@ -23,8 +24,7 @@ class PredictionType(str, Enum):
 
 def get_all_prediction_files(crop: str, year: str) -> list[PathLib]:
     """Helper function to get all prediction files for a year"""
-    result_dir = BASE_DIR / f"result_{crop}" / "bnn"
-    return list(result_dir.glob(f"result{year}*.csv"))
+    return catalog.paths(crop, year)
 
 # Define response models
 class PredictionData(BaseModel):
@@ -167,20 +167,19 @@ async def get_predictions(
         raise HTTPException(status_code=400, detail="Invalid crop type")
     
     try:
-        result_dir = BASE_DIR / f"result_{crop.value}" / "bnn"
-        
+        # Answered from the in-memory result store; no files are read here
+        store = result_store.snapshot
+
         if prediction_type == PredictionType.end_of_season:
-            file_path = result_dir / f"result{year}.csv"
-            if not file_path.exists():
+            if not store.has(crop.value, year):
                 raise HTTPException(
                     status_code=404, 
                     detail=f"No predictions available for {crop.value} in {year}"
                 )
             
-            df = pd.read_csv(file_path)
-            prediction = df[df['FIPS'] == int(fips)]
+            prediction = store.county(crop.value, year, int(fips))
             
-            if prediction.empty:
+            if prediction is None:
                 raise HTTPException(
                     status_code=404,
                     detail=f"No prediction found for FIPS {fips}"
@@ -190,33 +189,17 @@ async def get_predictions(
                 "crop": crop.value,
                 "year": year,
                 "fips": fips,
-                "prediction": float(prediction.iloc[0]['y_test_pred']),
-                "actual": float(prediction.iloc[0]['y_test']),
-                "uncertainty": float(prediction.iloc[0]['y_test_pred_uncertainty'])
+                **prediction
             }
             
         else:  # in_season
-            files = get_all_prediction_files(crop.value, year)
-            if not files:
+            if not store.available_doys(crop.value, year):
                 raise HTTPException(
                     status_code=404,
                     detail=f"No predictions found for {crop.value} in {year}"
                 )
             
-            predictions = {}
-            for file in files:
-                # Extract day from filename using regex
-                if match := re.search(rf"result{year}_(\d+)\.csv$", file.name):
-                    day = match.group(1)
-                    df = pd.read_csv(file)
-                    prediction = df[df['FIPS'] == int(fips)]
-                    
-                    if not prediction.empty:
-                        predictions[day] = {
-                            "prediction": float(prediction.iloc[0]['y_test_pred']),
-                            "actual": float(prediction.iloc[0]['y_test']),
-                            "uncertainty": float(prediction.iloc[0]['y_test_pred_uncertainty'])
-                        }
+            predictions = store.in_season(crop.value, year, int(fips))
             
             if not predictions:
                 raise HTTPException(
@@ -231,6 +214,8 @@ async def get_predictions(
                 "predictions": predictions
             }
             
+    except HTTPException:
+        raise
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid FIPS code")
     except Exception as e:
@@ -0,0 +1,323 @@
+from fastapi import APIRouter, Body, HTTPException, Path, Query
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from enum import Enum
+
+import math
+import numpy as np
+import shapely
+
+from utils.geo_utils import validate_geojson
+from utils.result_store import result_store, to_python
+from utils.spatial_index import county_index, geojson_geometry
+from utils.executors import run_in, IO
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Spatial"]
+)
+
+# Largest number of neighbours a k-nearest query may ask for
+MAX_NEIGHBOURS = 100
+# Largest number of points per batch FIPS resolution
+MAX_RESOLVE_POINTS = 10000
+
+class CropType(str, Enum):
+    corn = "corn"
+    soybean = "soybean"
+
+class SpatialPrediction(BaseModel):
+    FIPS: int = Field(..., description="County FIPS code", example=55025)
+    NAME: Optional[str] = Field(None, description="County name", example="Dane")
+    prediction: float = Field(..., description="Predicted yield", example=178.4)
+    actual: Optional[float] = Field(None, description="Actual yield, where known", example=181.2)
+    uncertainty: float = Field(..., description="Prediction uncertainty", example=9.7)
+    distance_km: Optional[float] = Field(None, description="Great-circle distance to the county centroid, for nearest queries", example=12.4)
+
+class SpatialResponse(BaseModel):
+    crop: str = Field(..., description="Crop type (corn or soybean)", example="corn")
+    year: int = Field(..., description="Prediction year", example=2023)
+    doy: str = Field(..., description="Day of year or end_of_season", example="end_of_season")
+    query: str = Field(..., description="Query type: bbox, intersects or nearest", example="bbox")
+    count: int = Field(..., description="Number of counties returned", example=1)
+    predictions: List[SpatialPrediction]
+
+class ResolvedPoint(BaseModel):
+    lat: float = Field(..., description="Latitude of the point", example=43.07)
+    lon: float = Field(..., description="Longitude of the point", example=-89.4)
+    FIPS: Optional[int] = Field(None, description="FIPS code of the containing county, null outside every county", example=55025)
+    NAME: Optional[str] = Field(None, description="County name", example="Dane")
+
+class ResolveBatchRequest(BaseModel):
+    points: List[List[float]] = Field(..., description="Points as [lon, lat] pairs", example=[[-89.4, 43.07], [-87.9, 43.04]])
+
+class ResolveBatchResponse(BaseModel):
+    count: int = Field(..., description="Number of points", example=2)
+    resolved: int = Field(..., description="Number of points inside a county", example=2)
+    fips: List[Optional[int]] = Field(..., description="FIPS code per point, in input order; null outside every county", example=[55025, 55079])
+
+DOY_QUERY = Query("end_of_season", description="Day of year (e.g. 188) or end_of_season",
+                  regex="^(\d{3}|end_of_season)$")
+
+def parse_bbox(bbox):
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400,
+                            detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(status_code=400,
+                            detail="bbox minimum exceeds its maximum")
+    return min_lon, min_lat, max_lon, max_lat
+
+def query_geometry(geojson):
+    """Shapely geometry of a GeoJSON geometry, Feature or FeatureCollection"""
+    if not validate_geojson(geojson):
+        raise HTTPException(status_code=400, detail="Invalid GeoJSON format")
+    try:
+        geometry = geojson_geometry(geojson)
+    except shapely.errors.GEOSException as e:
+        raise HTTPException(status_code=400, detail=f"Invalid geometry: {str(e)}")
+    if not geometry.is_valid:
+        raise HTTPException(status_code=400,
+                            detail=f"Invalid geometry: {shapely.is_valid_reason(geometry)}")
+    return geometry
+
+def spatial_predictions(crop, year, doy, query, fips, distances=None):
+    """Response body for the counties ``fips`` that have a prediction"""
+    snapshot = result_store.snapshot
+    if not snapshot.has(crop, year, doy):
+        raise HTTPException(
+            status_code=404,
+            detail=f"No predictions available for {crop} in {year} at DOY {doy}"
+        )
+
+    found, values = snapshot.counties(crop, year, fips, doy)
+    if distances is not None:
+        distance = dict(zip(np.asarray(fips).tolist(), np.round(distances, 3).tolist()))
+
+    predictions = []
+    for code, (prediction, actual, uncertainty) in zip(found.tolist(), to_python(values)):
+        predictions.append({
+            "FIPS": code,
+            "NAME": county_index.name(code),
+            "prediction": prediction,
+            "actual": None if math.isnan(actual) else actual,
+            "uncertainty": uncertainty,
+            "distance_km": distance[code] if distances is not None else None
+        })
+    return {
+        "crop": crop,
+        "year": year,
+        "doy": doy,
+        "query": query,
+        "count": len(predictions),
+        "predictions": predictions
+    }
+
+@router.get("/predictions/{crop}/{year}/spatial",
+    response_model=SpatialResponse,
+    summary="Find Predictions by Bounding Box or Nearest Counties",
+    description="""
+    Returns the predictions of the counties matching one spatial query,
+    answered from in-memory spatial indexes built at startup:
+
+    - `bbox=min_lon,min_lat,max_lon,max_lat`: counties whose boundary
+      intersects the box (STRtree over the census county polygons)
+    - `lat`, `lon` and `k`: the `k` counties with a prediction whose
+      centroids are nearest (KD-tree over the `county_info.csv` centroids),
+      nearest first, with their distance in km
+
+    Counties without a prediction in the selected file are left out. Use
+    `POST` on the same path to query by polygon.
+    """,
+    responses={
+        200: {
+            "description": "Matching county predictions",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "crop": "corn",
+                        "year": 2023,
+                        "doy": "end_of_season",
+                        "query": "nearest",
+                        "count": 1,
+                        "predictions": [
+                            {"FIPS": 55025, "NAME": "Dane", "prediction": 178.4, "actual": 181.2,
+                             "uncertainty": 9.7, "distance_km": 12.4}
+                        ]
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Missing, conflicting or malformed query",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Give either bbox or lat and lon"}
+                }
+            }
+        },
+        404: {
+            "description": "No result file for the crop, year and DOY",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "No predictions available for corn in 2024 at DOY end_of_season"}
+                }
+            }
+        }
+    })
+async def get_spatial_predictions(
+    crop: CropType = Path(..., description="Type of crop (corn or soybean)"),
+    year: int = Path(..., description="Prediction year", ge=2000, le=2099),
+    doy: str = DOY_QUERY,
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat", example="-90.5,42.5,-88.5,43.5"),
+    lat: Optional[float] = Query(None, description="Latitude of the query point", ge=-90, le=90),
+    lon: Optional[float] = Query(None, description="Longitude of the query point", ge=-180, le=180),
+    k: int = Query(5, description="Number of nearest counties", ge=1, le=MAX_NEIGHBOURS)
+):
+    point = lat is not None and lon is not None
+    if (bbox is None) == (not point) or (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="Give either bbox or lat and lon")
+
+    if bbox is not None:
+        fips = await run_in(IO, county_index.within_bbox, *parse_bbox(bbox))
+        return spatial_predictions(crop.value, year, doy, "bbox", fips)
+
+    # Counties without a prediction are left out, so widen the search until
+    # k of them have one or every centroid has been looked at
+    searched = k
+    while True:
+        fips, distances = await run_in(IO, county_index.nearest, lat, lon, searched)
+        result = spatial_predictions(crop.value, year, doy, "nearest", fips, distances)
+        if result["count"] >= k or len(fips) < searched:
+            break
+        searched *= 4
+    result["predictions"] = result["predictions"][:k]
+    result["count"] = len(result["predictions"])
+    return result
+
+@router.post("/predictions/{crop}/{year}/spatial",
+    response_model=SpatialResponse,
+    summary="Find Predictions Intersecting a Polygon",
+    description="""
+    Returns the predictions of every county whose boundary intersects the
+    posted GeoJSON geometry, Feature or FeatureCollection (features are
+    unioned). Counties without a prediction in the selected file are left out.
+    """,
+    responses={
+        200: {
+            "description": "Matching county predictions",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "crop": "corn",
+                        "year": 2023,
+                        "doy": "end_of_season",
+                        "query": "intersects",
+                        "count": 1,
+                        "predictions": [
+                            {"FIPS": 55025, "NAME": "Dane", "prediction": 178.4, "actual": 181.2,
+                             "uncertainty": 9.7, "distance_km": None}
+                        ]
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Invalid GeoJSON or self-intersecting geometry",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid geometry: Self-intersection[-89.5 43.05]"}
+                }
+            }
+        },
+        404: {
+            "description": "No result file for the crop, year and DOY",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "No predictions available for corn in 2024 at DOY end_of_season"}
+                }
+            }
+        }
+    })
+async def post_spatial_predictions(
+    crop: CropType = Path(..., description="Type of crop (corn or soybean)"),
+    year: int = Path(..., description="Prediction year", ge=2000, le=2099),
+    doy: str = DOY_QUERY,
+    geometry: Dict[str, Any] = Body(..., example={
+        "type": "Polygon",
+        "coordinates": [[[-90.0, 42.8], [-89.0, 42.8], [-89.0, 43.3], [-90.0, 43.3], [-90.0, 42.8]]]
+    })
+):
+    fips = await run_in(IO, county_index.intersecting, query_geometry(geometry))
+    return spatial_predictions(crop.value, year, doy, "intersects", fips)
+
+@router.get("/resolve/fips",
+    response_model=ResolvedPoint,
+    summary="Resolve a Point to its County",
+    description="""
+    Returns the FIPS code of the county containing a point, by point-in-polygon
+    test against prepared census county boundaries indexed in an STRtree.
+    """,
+    responses={
+        200: {
+            "description": "Containing county, or nulls outside every county",
+            "content": {
+                "application/json": {
+                    "example": {"lat": 43.07, "lon": -89.4, "FIPS": 55025, "NAME": "Dane"}
+                }
+            }
+        }
+    })
+async def resolve_point(
+    lat: float = Query(..., description="Latitude of the point", ge=-90, le=90),
+    lon: float = Query(..., description="Longitude of the point", ge=-180, le=180)
+):
+    fips = county_index.resolve(lon, lat)
+    return {
+        "lat": lat,
+        "lon": lon,
+        "FIPS": fips,
+        "NAME": county_index.name(fips) if fips is not None else None
+    }
+
+@router.post("/resolve/fips",
+    response_model=ResolveBatchResponse,
+    summary="Resolve Many Points to their Counties",
+    description=f"""
+    Resolves up to {MAX_RESOLVE_POINTS} `[lon, lat]` points to county FIPS codes
+    in one vectorized pass (about 1 µs per point).
+    """,
+    responses={
+        200: {
+            "description": "FIPS code per point",
+            "content": {
+                "application/json": {
+                    "example": {"count": 2, "resolved": 2, "fips": [55025, 55079]}
+                }
+            }
+        },
+        400: {
+            "description": "Malformed or too many points",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Each point must be a [lon, lat] pair"}
+                }
+            }
+        }
+    })
+async def resolve_points(body: ResolveBatchRequest):
+    if len(body.points) > MAX_RESOLVE_POINTS:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {MAX_RESOLVE_POINTS} points per request")
+    if any(len(point) != 2 for point in body.points):
+        raise HTTPException(status_code=400, detail="Each point must be a [lon, lat] pair")
+
+    coordinates = np.asarray(body.points, dtype=np.float64).reshape(-1, 2)
+    fips = await run_in(IO, county_index.resolve_many, coordinates[:, 0], coordinates[:, 1])
+    return {
+        "count": len(fips),
+        "resolved": int(np.count_nonzero(fips)),
+        "fips": [code or None for code in fips.tolist()]
+    }
@@ -0,0 +1,142 @@
+from fastapi import APIRouter, HTTPException, Path, Request
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from enum import Enum
+
+import numpy as np
+
+from utils.response_cache import response_cache, encoded_response, encode_json
+from utils.result_store import result_store, to_python, PREDICTION
+from utils.spatial_index import county_index
+from utils.executors import run_in, IO
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Time Series"]
+)
+
+# Largest number of counties per time-series request
+MAX_SERIES_COUNTIES = 200
+
+# Response key of each field of the result store, in FIELDS order
+SERIES_KEYS = ("prediction", "actual", "uncertainty")
+
+class CropType(str, Enum):
+    corn = "corn"
+    soybean = "soybean"
+
+class TimeSeriesResponse(BaseModel):
+    crop: str = Field(..., description="Crop type (corn or soybean)", example="corn")
+    fips: List[int] = Field(..., description="Counties along the first axis of each matrix", example=[55025])
+    names: List[Optional[str]] = Field(..., description="County names, aligned with fips", example=["Dane"])
+    missing: List[int] = Field(..., description="Requested FIPS codes without any result", example=[])
+    years: List[int] = Field(..., description="Years along the second axis", example=[2023, 2024])
+    doys: List[str] = Field(..., description="DOY labels along the third axis, end_of_season first", example=["end_of_season", "284"])
+    prediction: List[List[List[Optional[float]]]] = Field(..., description="Predicted yield [county][year][doy], null where missing", example=[[[178.4, 176.9], [None, 180.2]]])
+    actual: List[List[List[Optional[float]]]] = Field(..., description="Actual yield [county][year][doy], null where missing", example=[[[181.2, 181.2], [None, None]]])
+    uncertainty: List[List[List[Optional[float]]]] = Field(..., description="Prediction uncertainty [county][year][doy], null where missing", example=[[[9.7, 10.1], [None, 10.6]]])
+
+def parse_fips(fips):
+    codes = [int(code) for code in fips.split(",")]
+    if len(codes) > MAX_SERIES_COUNTIES:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {MAX_SERIES_COUNTIES} counties per request")
+    # Repeated codes would only repeat rows
+    return list(dict.fromkeys(codes))
+
+def encode_timeseries(crop, fips, years, doys, found, values):
+    """JSON of the year x DOY matrices of the counties ``found``"""
+    body = {
+        "crop": crop,
+        "fips": found.tolist(),
+        "names": [county_index.name(code) for code in found.tolist()],
+        "missing": sorted(set(fips) - set(found.tolist()), key=fips.index),
+        "years": years,
+        "doys": doys
+    }
+    for field, key in enumerate(SERIES_KEYS):
+        body[key] = to_python(values[..., field])
+    return encode_json(body)
+
+def timeseries(crop, fips):
+    """Cached EncodedBody of one time-series response, or None if none of
+    the counties has a prediction for the crop"""
+    snapshot = result_store.snapshot
+    series = snapshot.series(crop, fips)
+    if series is None:
+        return None
+    years, doys, found, values = series
+    predicted = ~np.isnan(values[..., PREDICTION]).all(axis=(1, 2))
+    if not predicted.any():
+        return None
+    return response_cache.get(
+        ("timeseries", crop, tuple(fips)),
+        snapshot.version,
+        lambda: encode_timeseries(crop, fips, years, doys,
+                                  found[predicted], values[predicted]))
+
+@router.get("/timeseries/{crop}/{fips}",
+    response_model=TimeSeriesResponse,
+    summary="Get the Full History of One or More Counties",
+    description=f"""
+    Returns every year and DOY of one or more counties in one call, sliced
+    from the in-memory result store instead of one request per result file.
+
+    `fips` is a FIPS code or a comma-separated list of up to
+    {MAX_SERIES_COUNTIES}. `prediction`, `actual` and `uncertainty` are
+    matrices indexed [county][year][doy] along `fips`, `years` and `doys`;
+    `doys` holds `end_of_season` first, then the in-season days in order.
+    Years and DOYs without any result file for the crop are left out, and
+    cells without a value are null. Requested counties without any result
+    are listed in `missing`.
+    """,
+    responses={
+        200: {
+            "description": "Year x DOY matrices per county",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "crop": "corn",
+                        "fips": [55025],
+                        "names": ["Dane"],
+                        "missing": [],
+                        "years": [2023, 2024],
+                        "doys": ["end_of_season", "284"],
+                        "prediction": [[[178.4, 176.9], [None, 180.2]]],
+                        "actual": [[[181.2, 181.2], [None, None]]],
+                        "uncertainty": [[[9.7, 10.1], [None, 10.6]]]
+                    }
+                }
+            }
+        },
+        304: {"description": "Unchanged since the ETag in If-None-Match"},
+        400: {
+            "description": "Too many counties",
+            "content": {
+                "application/json": {
+                    "example": {"detail": f"At most {MAX_SERIES_COUNTIES} counties per request"}
+                }
+            }
+        },
+        404: {
+            "description": "None of the counties has a result",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "No predictions found for FIPS 99999"}
+                }
+            }
+        }
+    })
+async def get_timeseries(
+    request: Request,
+    crop: CropType = Path(..., description="Type of crop (corn or soybean)"),
+    fips: str = Path(..., description="County FIPS code or comma-separated codes", regex="^\d{5}(,\d{5})*$")
+):
+    codes = parse_fips(fips)
+    encoded = await run_in(IO, timeseries, crop.value, codes)
+    if encoded is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No predictions found for FIPS {fips}"
+        )
+    return encoded_response(request, encoded)
@@ -18,6 +18,45 @@ from numpy.random import seed
 from utils.file_organize import model_prediction, evaluate_regression_results
 
 
+# Gauss-Hermite nodes used to take expectations through the softplus head
+GH_NODES, GH_WEIGHTS = np.polynomial.hermite.hermgauss(32)
+GH_WEIGHTS = GH_WEIGHTS / np.sqrt(np.pi)
+
+
+def relu_moments(mean, var):
+    """Mean and variance of relu(z) for z ~ N(mean, var)"""
+    std = tf.sqrt(tf.maximum(var, 1e-12))
+    normal = tfd.Normal(tf.zeros_like(mean), tf.ones_like(mean))
+    alpha = mean / std
+    cdf = normal.cdf(alpha)
+    pdf = normal.prob(alpha)
+    out_mean = mean * cdf + std * pdf
+    second = (mean * mean + var) * cdf + mean * std * pdf
+    return out_mean, tf.maximum(second - out_mean * out_mean, 0.), cdf
+
+
+def softplus_moments(mean, var):
+    """Mean and variance of softplus(z) for z ~ N(mean, var)"""
+    z = mean[..., None] + tf.sqrt(2 * var)[..., None] * GH_NODES.astype(
+        np.float32)
+    f = tf.nn.softplus(z)
+    weights = GH_WEIGHTS.astype(np.float32)
+    out_mean = tf.reduce_sum(f * weights, -1)
+    second = tf.reduce_sum(f * f * weights, -1)
+    return out_mean, tf.maximum(second - out_mean * out_mean, 0.)
+
+
+def relu_cov_moments(mean, cov):
+    """Moments of relu(z) for z ~ N(mean, cov) with full covariances
+
+    The per-unit means and variances are exact; off-diagonal covariances
+    are scaled by the expected ReLU slopes P(z > 0).
+    """
+    out_mean, out_var, slope = relu_moments(mean, tf.linalg.diag_part(cov))
+    out_cov = cov * slope[:, :, tf.newaxis] * slope[:, tf.newaxis, :]
+    return out_mean, tf.linalg.set_diag(out_cov, out_var)
+
+
 # Xavier initializer
 def xavier(shape):
     return tf.random.truncated_normal(shape,
@@ -69,15 +108,18 @@ class BayesianDenseLayer(tf.keras.Model):
         if sampling:
 
             # Flipout-estimated weight samples
+            # Use the dynamic batch size so the pass can be traced once
+            # with an unknown leading dimension
+            n = tf.shape(x)[0]
             s = tfp.random.rademacher(tf.shape(x))
-            r = tfp.random.rademacher([x.shape[0], self.d_out])
+            r = tfp.random.rademacher([n, self.d_out])
             w_samples = tf.nn.softplus(self.w_std) * tf.random.normal(
                 [self.d_in, self.d_out])
             w_perturbations = r * tf.matmul(x * s, w_samples)
             w_outputs = tf.matmul(x, self.w_loc) + w_perturbations
 
             # Flipout-estimated bias samples
-            r = tfp.random.rademacher([x.shape[0], self.d_out])
+            r = tfp.random.rademacher([n, self.d_out])
             b_samples = tf.nn.softplus(self.b_std) * tf.random.normal(
                 [self.d_out])
             b_outputs = self.b_loc + r * b_samples
@@ -87,6 +129,79 @@ class BayesianDenseLayer(tf.keras.Model):
         else:
             return x @ self.w_loc + self.b_loc
 
+    def call_samples(self, x, n_samples):
+        """Perform n_samples stochastic forward passes in one tensor op
+
+        Parameters
+        ----------
+        x : tensorflow.Tensor
+            Input of shape (N, d_in), shared by every pass, or of shape
+            (n_samples, N, d_in) with one slice per pass
+        n_samples : int
+            Number of weight samples to draw
+
+        Returns
+        -------
+        tensorflow.Tensor of shape (n_samples, N, d_out), where each
+        slice is distributed as one ``call(x, sampling=True)``
+        """
+
+        if len(x.shape) == 2:
+            x = tf.broadcast_to(x[tf.newaxis],
+                                [n_samples, tf.shape(x)[0], self.d_in])
+        n = tf.shape(x)[1]
+
+        # Flipout-estimated weight samples, one weight draw per pass
+        s = tfp.random.rademacher(tf.shape(x))
+        r = tfp.random.rademacher([n_samples, n, self.d_out])
+        w_samples = tf.nn.softplus(self.w_std) * tf.random.normal(
+            [n_samples, self.d_in, self.d_out])
+        w_perturbations = r * tf.matmul(x * s, w_samples)
+        w_outputs = tf.matmul(x, self.w_loc) + w_perturbations
+
+        # Flipout-estimated bias samples
+        r = tfp.random.rademacher([n_samples, n, self.d_out])
+        b_samples = tf.nn.softplus(self.b_std) * tf.random.normal(
+            [n_samples, 1, self.d_out])
+        b_outputs = self.b_loc + r * b_samples
+
+        return w_outputs + b_outputs
+
+    def call_moments(self, mean, cov):
+        """Propagate the input mean and covariance through the layer
+
+        Parameters
+        ----------
+        mean : tensorflow.Tensor of shape (N, d_in)
+            Input means
+        cov : tensorflow.Tensor of shape (N, d_in) or (N, d_in, d_in)
+            Input variances (diagonal) or full covariances
+
+        Returns
+        -------
+        Output mean (N, d_out) and covariance (N, d_out, d_out)
+        """
+
+        # With independent Gaussian weights, z = x @ W + b has
+        # E[z] = E[x] @ mu and
+        # Cov[z] = mu^T Cov[x] mu + diag(E[x^2] @ sigma^2 + sigma_b^2)
+        w_var = tf.nn.softplus(self.w_std)**2
+        b_var = tf.nn.softplus(self.b_std)**2
+        out_mean = mean @ self.w_loc + self.b_loc
+
+        if len(cov.shape) == 2:
+            second = mean * mean + cov
+            out_cov = tf.matmul(
+                tf.transpose(self.w_loc) * cov[:, tf.newaxis, :], self.w_loc)
+        else:
+            second = mean * mean + tf.linalg.diag_part(cov)
+            out_cov = tf.matmul(self.w_loc,
+                                tf.matmul(cov, self.w_loc),
+                                transpose_a=True)
+
+        noise = second @ w_var + b_var
+        return out_mean, out_cov + tf.linalg.diag(noise)
+
     @property
     def losses(self):
         """Sum of the KL divergences between priors + posteriors"""
@@ -145,6 +260,25 @@ class BayesianDenseNetwork(tf.keras.Model):
 
         return x
 
+    def call_samples(self, x, n_samples):
+        """Perform n_samples stochastic forward passes at once"""
+
+        for i in range(len(self.steps)):
+            x = self.steps[i].call_samples(x, n_samples)
+            x = self.acts[i](x)
+
+        return x
+
+    def call_moments(self, mean, cov):
+        """Propagate means and covariances through the network"""
+
+        for i in range(len(self.steps)):
+            mean, cov = self.steps[i].call_moments(mean, cov)
+            if i < len(self.steps) - 1:
+                mean, cov = relu_cov_moments(mean, cov)
+
+        return mean, cov
+
     @property
     def losses(self):
         """Sum of the KL divergences between priors + posteriors"""
@@ -209,6 +343,67 @@ class BayesianDensityNetwork(tf.keras.Model):
         # Return mean and std predictions
         return tf.concat([loc_preds, std_preds], 1)
 
+    def call_samples(self, x, n_samples=100):
+        """Draw n_samples posterior predictions for the whole batch at once
+
+        Parameters
+        ----------
+        x : tf.Tensor of shape (N, d_in)
+            Input data
+        n_samples : int
+            Number of weight samples to draw
+
+        Returns
+        -------
+        preds : tf.Tensor of shape (n_samples, N, 2)
+            Mean (``[..., 0]``) and standard deviation (``[..., 1]``)
+            predictions for every weight sample, equivalent to stacking
+            n_samples calls with ``sampling=True``.
+        """
+
+        x = self.core_net.call_samples(x, n_samples)
+        x = tf.nn.relu(x)
+
+        loc_preds = self.loc_net.call_samples(x, n_samples)
+        std_preds = self.std_net.call_samples(x, n_samples)
+        std_preds = tf.nn.softplus(std_preds)
+
+        return tf.concat([loc_preds, std_preds], -1)
+
+    def call_moments(self, x):
+        """Deterministic moment-propagation pass
+
+        Pushes means and covariances through each BayesianDenseLayer
+        (treating the weight posteriors as independent Gaussians) and
+        through the ReLU activations analytically, instead of drawing
+        weight samples.
+
+        Parameters
+        ----------
+        x : tf.Tensor of shape (N, d_in)
+            Input data
+
+        Returns
+        -------
+        means : tf.Tensor of shape (N, 2)
+            Expected mean-head and std-head outputs
+        variances : tf.Tensor of shape (N, 2)
+            Variance of both heads over the weight posterior
+        """
+
+        x = tf.convert_to_tensor(x, tf.float32)
+        mean, cov = self.core_net.call_moments(x, tf.zeros_like(x))
+        mean, cov = relu_cov_moments(mean, cov)
+
+        loc_mean, loc_cov = self.loc_net.call_moments(mean, cov)
+        std_mean, std_cov = self.std_net.call_moments(mean, cov)
+        std_mean, std_var = softplus_moments(std_mean[:, 0],
+                                             std_cov[:, 0, 0])
+
+        means = tf.stack([loc_mean[:, 0], std_mean], 1)
+        variances = tf.stack([loc_cov[:, 0, 0], std_var], 1)
+        return means, variances
+
     def log_likelihood(self, x, y, sampling=True):
         """Compute the log likelihood of y given x"""
 
@@ -354,32 +549,53 @@ def Dual_BNN_model_prediction(model, x_test):
 
 
 # Markov sampling
-def MS_BNN_model_prediction(model, x_test):
-    y_pred_list = []
-    y_std_list = []
+def MS_BNN_model_prediction(model, x_test, n_samples=100):
+    # All weight samples are drawn in a single batched pass of shape
+    # (n_samples, N, 2) rather than one forward pass per sample
+    y = model.call_samples(tf.convert_to_tensor(x_test, tf.float32),
+                           n_samples).numpy()
+
+    y_preds = y[:, :, 0]
+    y_stds = y[:, :, 1]
 
-    for i in range(100):
-        y = model(x_test, sampling=True)
+    y_pred_mean = np.mean(y_preds, axis=0)
+    y_pred_sigma = np.std(y_preds, axis=0, ddof=1)
 
-        y_pred = y[:, 0]
-        y_pred = tf.expand_dims(y_pred, 1)
+    y_std_mean = np.mean(y_stds, axis=0)
+    y_std_sigma = np.std(y_stds, axis=0, ddof=1)
 
-        y_std = y[:, 1]
-        y_std = tf.expand_dims(y_std, 1)
+    return y_pred_mean, y_pred_sigma, y_std_mean, y_std_sigma
 
-        y_pred_list.append(y_pred)
-        y_std_list.append(y_std)
 
-    y_preds = np.concatenate(y_pred_list, axis=1)
-    y_stds = np.concatenate(y_std_list, axis=1)
+def MC_BNN_uncertainty(model, x_test, n_samples=100):
+    """Per-sample mean, epistemic and aleatoric uncertainty for a batch
 
-    y_pred_mean = np.mean(y_preds, axis=1)
-    y_pred_sigma = np.std(y_preds, axis=1, ddof=1)
+    Parameters
+    ----------
+    model : BayesianDensityNetwork
+        Trained network
+    x_test : array-like of shape (N, d_in)
+        Input data, e.g. every county of a year
+    n_samples : int
+        Number of posterior weight samples
+
+    Returns
+    -------
+    mean : numpy.ndarray of shape (N,)
+        Posterior predictive mean
+    epistemic : numpy.ndarray of shape (N,)
+        Standard deviation of the mean head across weight samples
+    aleatoric : numpy.ndarray of shape (N,)
+        Root mean square of the predicted standard deviation head
+    """
+    y = model.call_samples(tf.convert_to_tensor(x_test, tf.float32),
+                           n_samples).numpy()
 
-    y_std_mean = np.mean(y_stds, axis=1)
-    y_std_sigma = np.std(y_stds, axis=1, ddof=1)
+    mean = np.mean(y[:, :, 0], axis=0)
+    epistemic = np.std(y[:, :, 0], axis=0)
+    aleatoric = np.sqrt(np.mean(y[:, :, 1]**2, axis=0))
 
-    return y_pred_mean, y_pred_sigma, y_std_mean, y_std_sigma
+    return mean, epistemic, aleatoric
 
 
 def save_uncertainty(uncertainty_filename, y_test_pred_var_source_domain,
@@ -462,15 +678,11 @@ def load_BNN(num_features, save_model_path):
 
 def predict_T(model, x_i, y_i, T=10):
 
-    # predict stochastic dropout model T times
-    p_hat = []
-    p_hat_std = []
-    for t in range(T):
-        pred_t = model(x_i, sampling=True)
-        p_hat.append(pred_t[0, 0])
-        p_hat_std.append(pred_t[0, 1])
-    p_hat = np.array(p_hat)
-    p_hat_std = np.array(p_hat_std)
+    # predict stochastic model T times for every row in one batched pass
+    pred_t = model.call_samples(tf.convert_to_tensor(x_i, tf.float32),
+                                T).numpy()
+    p_hat = pred_t[:, :, 0]
+    p_hat_std = pred_t[:, :, 1]
 
     # mean prediction
     prediction = np.mean(p_hat, axis=0)
@@ -483,7 +695,7 @@ def predict_T(model, x_i, y_i, T=10):
     # see https://github.com/ykwon0407/UQ_BNN/issues/1
     aleatoric = np.mean(p_hat * (1 - p_hat), axis=0)
     epistemic = np.mean(p_hat**2, axis=0) - np.mean(p_hat, axis=0)**2
-    error = prediction - y_i
+    error = prediction - np.squeeze(np.asarray(y_i))
 
     return np.squeeze(prediction), np.squeeze(aleatoric), np.squeeze(
-        epistemic), prediction_std, error
+        epistemic), np.squeeze(prediction_std), np.squeeze(error)
@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.response_cache import response_cache, encode_json
+from utils.result_store import (result_store, to_python, PREDICTION,
+                                UNCERTAINTY)
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+COUNTY_INFO = BASE_DIR / 'data' / 'county_info.csv'
+
+# Grouping name -> county_info.csv column holding each county's group code
+GROUPINGS = {
+    "state": "STATE_FIPS",
+    "l1": "NA_L1CODE",
+    "l2": "NA_L2CODE",
+    "domain": "DomainID"
+}
+
+# Codes county_info.csv uses for counties outside every group
+UNASSIGNED = ("", "0")
+
+STATISTICS = ("count", "mean", "median", "weighted_mean", "uncertainty")
+
+
+def _code_order(code):
+    """Numeric order of codes such as 8, 8.3 and 10.1"""
+    return tuple(int(part) for part in code.split("."))
+
+
+def read_groups(path=COUNTY_INFO):
+    """Group of every county per grouping, and the group codes
+
+    Returns:
+        tuple: DataFrame indexed by FIPS with one column per grouping
+            holding an index into the codes, -1 outside every group; and
+            the list of codes, in numeric order
+    """
+    info = pd.read_csv(path, usecols=['FIPS', *GROUPINGS.values()], dtype=str)
+    columns = {name: info[column].str.strip() for name, column in GROUPINGS.items()}
+    codes = sorted({code for column in columns.values() for code in column
+                    if code not in UNASSIGNED}, key=_code_order)
+    ids = {code: i for i, code in enumerate(codes)}
+    groups = pd.DataFrame({name: column.map(ids).fillna(-1).astype(np.int64)
+                           for name, column in columns.items()})
+    groups.index = info['FIPS'].astype(np.int64)
+    return groups, codes
+
+
+def build_rollups(snapshot, groups, codes):
+    """Rollup tables of every result file and grouping in one groupby pass
+
+    Every county prediction of every file is laid out once per grouping as
+    a long frame, and a single groupby over (grouping, file, group) yields
+    the count, mean and median of the predictions and the inverse-variance
+    weighted mean with its standard error,
+    sqrt(1 / sum(1 / uncertainty^2)).
+
+    Args:
+        snapshot (ResultSnapshot): Results to aggregate
+        groups, codes: Groups of the counties, from ``read_groups``
+
+    Returns:
+        dict: (crop, year, doy, grouping) -> list of group records, by code
+    """
+    crops, years, doys = np.nonzero(snapshot.present)
+    block = snapshot.values[crops, years, doys]
+    files, counties = np.nonzero(~np.isnan(block[:, :, PREDICTION]))
+    prediction = block[files, counties, PREDICTION].astype(np.float64)
+    weight = 1.0 / block[files, counties, UNCERTAINTY].astype(np.float64) ** 2
+
+    names = list(GROUPINGS)
+    group = groups.reindex(snapshot.fips, fill_value=-1)[names].to_numpy()[counties].T.ravel()
+    keep = group >= 0
+    frame = pd.DataFrame({
+        "by": np.repeat(np.arange(len(names)), len(files))[keep],
+        "file": np.tile(files, len(names))[keep],
+        "group": group[keep],
+        "prediction": np.tile(prediction, len(names))[keep],
+        "weight": np.tile(weight, len(names))[keep]
+    })
+    frame["weighted"] = frame["prediction"] * frame["weight"]
+
+    table = frame.groupby(["by", "file", "group"]).agg(
+        count=("prediction", "size"),
+        mean=("prediction", "mean"),
+        median=("prediction", "median"),
+        weighted=("weighted", "sum"),
+        weight=("weight", "sum"))
+    table["weighted_mean"] = table["weighted"] / table["weight"]
+    table["uncertainty"] = np.sqrt(1.0 / table["weight"])
+
+    # Records are built column-wise once and then cut into one table per
+    # grouping and file, which are contiguous in the sorted result
+    by, file, group = (table.index.get_level_values(level).to_numpy()
+                       for level in range(3))
+    records = [dict(zip(("code",) + STATISTICS, record)) for record in
+               zip([codes[i] for i in group.tolist()], table["count"].tolist(),
+                   *(to_python(table[name]) for name in STATISTICS[1:]))]
+    starts = np.flatnonzero(np.r_[True, (by[1:] != by[:-1]) | (file[1:] != file[:-1])])
+    ends = np.r_[starts[1:], len(table)]
+
+    labels = [(snapshot.crops[crop], snapshot.years[year], snapshot.doys[doy])
+              for crop, year, doy in zip(crops, years, doys)]
+    return {labels[file[start]] + (names[by[start]],): records[start:end]
+            for start, end in zip(starts.tolist(), ends.tolist())}
+
+
+class RollupStore:
+    """Per-worker rollup tables of the current result snapshot
+
+    Rebuilt whenever the result store loads a new snapshot (see
+    ``ResultStore.subscribe``), or on first use if that did not happen, so
+    a request only encodes one precomputed table.
+    """
+
+    def __init__(self, store=result_store, info_path=COUNTY_INFO):
+        self.store = store
+        self.info_path = Path(info_path)
+        self.build_time = None
+        self._groups = None
+        self._rollups = (None, {})
+        self._lock = threading.Lock()
+
+    def update(self, snapshot):
+        """Build the tables of a snapshot unless they are current"""
+        with self._lock:
+            if self._rollups[0] == snapshot.version:
+                return self._rollups[1]
+            if self._groups is None:
+                self._groups = read_groups(self.info_path)
+            start = time.perf_counter()
+            rollups = build_rollups(snapshot, *self._groups)
+            self.build_time = time.perf_counter() - start
+            self._rollups = (snapshot.version, rollups)
+        logger.info(f"Built {len(rollups)} rollup tables in "
+                    f"{self.build_time:.2f}s")
+        return rollups
+
+    def table(self, crop, year, doy, by):
+        """Group records of one file and grouping, or None if it is missing"""
+        snapshot = self.store.snapshot
+        if not snapshot.has(crop, year, doy):
+            return None
+        version, rollups = self._rollups
+        if version != snapshot.version:
+            rollups = self.update(snapshot)
+        return rollups.get((crop, int(year), doy, by), [])
+
+    def encoded(self, crop, year, doy, by):
+        """Cached EncodedBody of one rollup response, or None"""
+        groups = self.table(crop, year, doy, by)
+        if groups is None:
+            return None
+        return response_cache.get(
+            ("aggregates", crop, int(year), doy, by),
+            self._rollups[0],
+            lambda: encode_json({
+                "crop": crop,
+                "year": int(year),
+                "doy": doy,
+                "by": by,
+                "groups": groups
+            }))
+
+
+rollup_store = RollupStore()
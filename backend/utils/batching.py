@@ -0,0 +1,153 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+from utils.model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = int(os.environ.get('MODEL_MAX_BATCH_SIZE', 64))
+MAX_WAIT_MS = float(os.environ.get('MODEL_MAX_WAIT_MS', 5))
+
+# Upper bounds of the histogram buckets reported by MicroBatcher.stats
+HISTOGRAM_BUCKETS = [0, 1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+def _bucket(value):
+    for bound in HISTOGRAM_BUCKETS:
+        if value <= bound:
+            return str(bound)
+    return f"{HISTOGRAM_BUCKETS[-1]}+"
+
+
+class MicroBatcher:
+    """Collect rows from concurrent callers and run them as one batch
+
+    Callers ``submit`` a single feature vector and get a Future back. A
+    background thread waits up to ``max_wait_ms`` after the first pending
+    row for more to arrive (or until ``max_batch_size`` rows are queued),
+    runs ``fn`` once per distinct key on the stacked rows and scatters the
+    per-row results back to each Future.
+
+    Args:
+        fn (callable): ``fn(rows, key)`` taking an (N, d) array and
+            returning a sequence of N per-row results
+        max_batch_size (int): Largest number of rows per call of ``fn``
+        max_wait_ms (float): Longest time the first row of a batch waits
+            for company
+    """
+
+    def __init__(self, fn, max_batch_size=MAX_BATCH_SIZE,
+                 max_wait_ms=MAX_WAIT_MS):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._queue_depths = Counter()
+        self._max_queue_depth = 0
+        self._requests = 0
+        self._batches = 0
+
+    def submit(self, row, key=None):
+        """Queue one feature vector; returns a Future of its result"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((np.asarray(row, dtype=np.float32).ravel(), key,
+                         future))
+        return future
+
+    def _ensure_started(self):
+        # Started lazily so each forked gunicorn worker gets its own thread
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run,
+                                                    name='model-batcher',
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(pending) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            depth = self._queue.qsize()
+
+            groups = {}
+            for row, key, future in pending:
+                # Rows whose caller went away (a cancelled Future) are
+                # dropped rather than computed
+                if future.set_running_or_notify_cancel():
+                    groups.setdefault(key, []).append((row, future))
+
+            for key, items in groups.items():
+                futures = [future for _, future in items]
+                try:
+                    results = self.fn(np.stack([row for row, _ in items]), key)
+                except Exception as e:
+                    logger.error(f"Batched model call failed: {str(e)}")
+                    for future in futures:
+                        future.set_exception(e)
+                else:
+                    for future, result in zip(futures, results):
+                        future.set_result(result)
+                self._record(len(items), depth)
+
+    def _record(self, batch_size, depth):
+        with self._stats_lock:
+            self._requests += batch_size
+            self._batches += 1
+            self._batch_sizes[_bucket(batch_size)] += 1
+            self._queue_depths[_bucket(depth)] += 1
+            self._max_queue_depth = max(self._max_queue_depth, depth)
+
+    def stats(self):
+        """Queue depth and batch-size histograms for tuning"""
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "requests": self._requests,
+                "batches": self._batches,
+                "mean_batch_size": (self._requests / self._batches
+                                    if self._batches else None),
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "batch_size_histogram": dict(self._batch_sizes),
+                "queue_depth_histogram": dict(self._queue_depths)
+            }
+
+
+def _infer_rows(rows, mode):
+    """Run one batched inference and split it into per-row results"""
+    result = registry.infer(rows, mode=mode or "sample")
+    epistemic = result["epistemic"]
+    return [{
+        "mean": float(result["mean"][i]),
+        "aleatoric": float(result["aleatoric"][i]),
+        "epistemic": float(epistemic[i]) if epistemic is not None else None
+    } for i in range(rows.shape[0])]
+
+
+model_batcher = MicroBatcher(_infer_rows)
@@ -0,0 +1,527 @@
+"""TensorFlow-free inference for BayesianDensityNetwork checkpoints
+
+Serving only needs the forward pass of ``BayesianDenseLayer``, so this
+module reads the TensorFlow checkpoint bundle (``BNN2.index`` and
+``BNN2.data-00000-of-00001``) directly and evaluates the network with
+NumPy. The weights can also be exported to a compact ``.npz`` file that
+loads without parsing the bundle at all.
+"""
+import struct
+import threading
+from pathlib import Path
+
+import numpy as np
+
+VARIABLE_SUFFIX = '/.ATTRIBUTES/VARIABLE_VALUE'
+NETWORKS = ['core_net', 'loc_net', 'std_net']
+
+# Subset of tensorflow.DataType values that checkpoints of this model use
+TF_DTYPES = {
+    1: np.float32,
+    2: np.float64,
+    3: np.int32,
+    9: np.int64,
+    10: np.bool_,
+    19: np.float16,
+}
+
+TABLE_MAGIC = 0xdb4775248b80fb57
+FOOTER_SIZE = 48
+
+
+def _read_varint(buf, pos):
+    """Decode a base-128 varint, returning (value, new position)"""
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _parse_proto(buf):
+    """Decode a protobuf message into {field number: [values]}
+
+    Only varint, fixed and length-delimited wire types are needed for the
+    bundle protos; nested messages are returned as raw bytes.
+    """
+    fields = {}
+    pos = 0
+    while pos < len(buf):
+        key, pos = _read_varint(buf, pos)
+        field, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire_type == 1:
+            value = struct.unpack_from('<Q', buf, pos)[0]
+            pos += 8
+        elif wire_type == 2:
+            length, pos = _read_varint(buf, pos)
+            value = bytes(buf[pos:pos + length])
+            pos += length
+        elif wire_type == 5:
+            value = struct.unpack_from('<I', buf, pos)[0]
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        fields.setdefault(field, []).append(value)
+    return fields
+
+
+def _read_block(data, handle):
+    """Return the (key, value) entries of one SSTable block"""
+    offset, size = handle
+    block = data[offset:offset + size]
+    if data[offset + size] != 0:
+        raise ValueError("Compressed checkpoint index blocks are not supported")
+
+    num_restarts = struct.unpack_from('<I', block, size - 4)[0]
+    end = size - 4 * (num_restarts + 1)
+
+    entries = []
+    key = b''
+    pos = 0
+    while pos < end:
+        shared, pos = _read_varint(block, pos)
+        non_shared, pos = _read_varint(block, pos)
+        value_length, pos = _read_varint(block, pos)
+        key = key[:shared] + bytes(block[pos:pos + non_shared])
+        pos += non_shared
+        entries.append((key, bytes(block[pos:pos + value_length])))
+        pos += value_length
+    return entries
+
+
+def read_checkpoint(prefix):
+    """Read every variable of a TensorFlow checkpoint bundle
+
+    Args:
+        prefix (str or Path): Checkpoint prefix, e.g. ``weights/BNN2``
+
+    Returns:
+        dict: Variable name (without the ``/.ATTRIBUTES/VARIABLE_VALUE``
+            suffix) mapped to a NumPy array
+    """
+    prefix = str(prefix)
+    index = Path(prefix + '.index').read_bytes()
+
+    footer = index[-FOOTER_SIZE:]
+    if struct.unpack_from('<Q', footer, FOOTER_SIZE - 8)[0] != TABLE_MAGIC:
+        raise ValueError(f"{prefix}.index is not a checkpoint index")
+    pos = 0
+    _, pos = _read_varint(footer, pos)  # metaindex offset
+    _, pos = _read_varint(footer, pos)  # metaindex size
+    index_offset, pos = _read_varint(footer, pos)
+    index_size, pos = _read_varint(footer, pos)
+
+    entries = []
+    for _, handle in _read_block(index, (index_offset, index_size)):
+        offset, p = _read_varint(handle, 0)
+        size, _ = _read_varint(handle, p)
+        entries.extend(_read_block(index, (offset, size)))
+
+    header = {}
+    tensors = []
+    for key, value in entries:
+        if key == b'':
+            header = _parse_proto(value)
+        else:
+            tensors.append((key.decode(), _parse_proto(value)))
+
+    num_shards = header.get(1, [1])[0]
+    shards = {}
+    variables = {}
+    for name, entry in tensors:
+        if not name.endswith(VARIABLE_SUFFIX):
+            continue
+        dtype = TF_DTYPES[entry.get(1, [0])[0]]
+        shape = []
+        for dim in _parse_proto(entry.get(2, [b''])[0]).get(2, []):
+            shape.append(_parse_proto(dim).get(1, [0])[0])
+        shard_id = entry.get(3, [0])[0]
+        offset = entry.get(4, [0])[0]
+        size = entry.get(5, [0])[0]
+
+        if shard_id not in shards:
+            shard_path = f"{prefix}.data-{shard_id:05d}-of-{num_shards:05d}"
+            shards[shard_id] = Path(shard_path).read_bytes()
+        raw = shards[shard_id][offset:offset + size]
+        array = np.frombuffer(raw, dtype=np.dtype(dtype).newbyteorder('<'))
+        variables[name[:-len(VARIABLE_SUFFIX)]] = array.reshape(shape).copy()
+
+    return variables
+
+
+# Gauss-Hermite nodes used to take expectations through the softplus head
+GH_NODES, GH_WEIGHTS = np.polynomial.hermite.hermgauss(32)
+GH_WEIGHTS = GH_WEIGHTS / np.sqrt(np.pi)
+
+
+def softplus(x):
+    return np.logaddexp(0, x)
+
+
+def relu(x):
+    return np.maximum(x, 0)
+
+
+def norm_cdf(x):
+    """Standard normal CDF (Abramowitz & Stegun 7.1.26, error < 1.5e-7)"""
+    z = np.abs(x) / np.sqrt(2)
+    t = 1 / (1 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (
+        1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1 - poly * np.exp(-z * z)
+    return 0.5 * (1 + np.sign(x) * erf)
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def relu_moments(mean, var):
+    """Mean and variance of relu(z) for z ~ N(mean, var)"""
+    std = np.sqrt(np.maximum(var, 1e-12))
+    alpha = mean / std
+    cdf = norm_cdf(alpha)
+    pdf = norm_pdf(alpha)
+    out_mean = mean * cdf + std * pdf
+    second = (mean * mean + var) * cdf + mean * std * pdf
+    return out_mean, np.maximum(second - out_mean * out_mean, 0)
+
+
+def softplus_moments(mean, var):
+    """Mean and variance of softplus(z) for z ~ N(mean, var)"""
+    z = mean[..., None] + np.sqrt(2 * var)[..., None] * GH_NODES
+    f = softplus(z)
+    out_mean = f @ GH_WEIGHTS
+    second = (f * f) @ GH_WEIGHTS
+    return out_mean, np.maximum(second - out_mean * out_mean, 0)
+
+
+class NumpyBayesianDensityNetwork:
+    """NumPy port of the BayesianDensityNetwork forward pass
+
+    Parameters
+    ----------
+    variables : dict
+        Checkpoint variables as returned by ``read_checkpoint``, keyed
+        like ``core_net/steps/0/w_loc``
+    seed : None or int
+        Seed for the weight-sampling random generator
+
+    Methods
+    -------
+    __call__ : numpy.ndarray
+        MAP or sampled (flipout) forward pass, shape (N, 2)
+    call_samples : numpy.ndarray
+        Many sampled passes at once, shape (n_samples, N, 2)
+    """
+
+    def __init__(self, variables, seed=None):
+        self.variables = {k: np.asarray(v, dtype=np.float32)
+                          for k, v in variables.items()}
+        self.rng = np.random.default_rng(seed)
+        self._rng_lock = threading.Lock()
+
+        # (w_loc, softplus(w_std), b_loc, softplus(b_std)) per layer
+        self.layers = {}
+        for net in NETWORKS:
+            steps = []
+            i = 0
+            while f"{net}/steps/{i}/w_loc" in self.variables:
+                key = f"{net}/steps/{i}"
+                steps.append((self.variables[key + '/w_loc'],
+                              softplus(self.variables[key + '/w_std']),
+                              self.variables[key + '/b_loc'],
+                              softplus(self.variables[key + '/b_std'])))
+                i += 1
+            if not steps:
+                raise ValueError(f"Checkpoint has no layers for {net}")
+            self.layers[net] = steps
+
+        self.num_features = self.layers['core_net'][0][0].shape[0]
+
+    @classmethod
+    def from_checkpoint(cls, prefix, seed=None):
+        return cls(read_checkpoint(prefix), seed=seed)
+
+    @classmethod
+    def from_npz(cls, path, seed=None):
+        with np.load(path) as data:
+            return cls({k: data[k] for k in data.files}, seed=seed)
+
+    @classmethod
+    def load(cls, prefix, seed=None):
+        """Load ``<prefix>.npz`` when exported, else the checkpoint bundle"""
+        npz_path = Path(str(prefix) + '.npz')
+        if npz_path.exists():
+            return cls.from_npz(npz_path, seed=seed)
+        return cls.from_checkpoint(prefix, seed=seed)
+
+    def export_npz(self, path):
+        """Write the raw variables to a compressed ``.npz`` file"""
+        np.savez_compressed(path, **self.variables)
+
+    @property
+    def nbytes(self):
+        return sum(v.nbytes for v in self.variables.values())
+
+    def _rademacher(self, shape):
+        return self.rng.integers(0, 2, size=shape).astype(np.float32) * 2 - 1
+
+    def _normal(self, shape):
+        return self.rng.standard_normal(shape, dtype=np.float32)
+
+    def _dense(self, x, layer, sampling):
+        w_loc, w_scale, b_loc, b_scale = layer
+        if not sampling:
+            return x @ w_loc + b_loc
+
+        # Flipout-estimated weight and bias samples, as in BayesianDenseLayer
+        n = x.shape[0]
+        d_out = w_loc.shape[1]
+        s = self._rademacher(x.shape)
+        r = self._rademacher((n, d_out))
+        w_samples = w_scale * self._normal(w_loc.shape)
+        w_outputs = x @ w_loc + r * ((x * s) @ w_samples)
+
+        r = self._rademacher((n, d_out))
+        b_samples = b_scale * self._normal((d_out,))
+        return w_outputs + b_loc + r * b_samples
+
+    def _dense_samples(self, x, layer):
+        w_loc, w_scale, b_loc, b_scale = layer
+        n_samples, n = x.shape[:2]
+        d_in, d_out = w_loc.shape
+        s = self._rademacher(x.shape)
+        r = self._rademacher((n_samples, n, d_out))
+        w_samples = w_scale * self._normal((n_samples, d_in, d_out))
+        w_outputs = x @ w_loc + r * np.matmul(x * s, w_samples)
+
+        r = self._rademacher((n_samples, n, d_out))
+        b_samples = b_scale * self._normal((n_samples, 1, d_out))
+        return w_outputs + b_loc + r * b_samples
+
+    def _dense_moments(self, mean, cov, layer):
+        # With independent Gaussian weights, z = x @ W + b has
+        # E[z] = E[x] @ mu and
+        # Cov[z] = mu^T Cov[x] mu + diag(E[x^2] @ sigma^2 + sigma_b^2).
+        # cov is either a (N, d) diagonal or a full (N, d, d) matrix.
+        w_loc, w_scale, b_loc, b_scale = layer
+        out_mean = mean @ w_loc + b_loc
+
+        if cov.ndim == 2 and not cov.any():
+            # Deterministic input: the output units stay independent
+            out_var = (mean * mean) @ (w_scale * w_scale) + b_scale**2
+            return out_mean, out_var
+        elif cov.ndim == 2:
+            second = mean * mean + cov
+            out_cov = np.matmul(w_loc.T * cov[:, None, :], w_loc)
+        else:
+            second = mean * mean + np.diagonal(cov, axis1=1, axis2=2)
+            out_cov = np.matmul(w_loc.T, np.matmul(cov, w_loc))
+
+        diag = np.arange(w_loc.shape[1])
+        out_cov[:, diag, diag] += second @ (w_scale * w_scale) + b_scale**2
+        return out_mean, out_cov
+
+    @staticmethod
+    def _relu_moments(mean, cov):
+        # Exact mean and variance per unit; off-diagonal covariances are
+        # scaled by the expected ReLU slopes P(z > 0)
+        if cov.ndim == 2:
+            return relu_moments(mean, cov)
+        diag = np.arange(mean.shape[1])
+        var = cov[:, diag, diag]
+        out_mean, out_var = relu_moments(mean, var)
+        slope = norm_cdf(mean / np.sqrt(np.maximum(var, 1e-12)))
+        out_cov = cov * slope[:, :, None] * slope[:, None, :]
+        out_cov[:, diag, diag] = out_var
+        return out_mean, out_cov
+
+    def _network(self, net, x, sampling):
+        steps = self.layers[net]
+        for i, layer in enumerate(steps):
+            x = self._dense(x, layer, sampling)
+            if i < len(steps) - 1:
+                x = relu(x)
+        return x
+
+    def _network_samples(self, net, x):
+        steps = self.layers[net]
+        for i, layer in enumerate(steps):
+            x = self._dense_samples(x, layer)
+            if i < len(steps) - 1:
+                x = relu(x)
+        return x
+
+    def _network_moments(self, net, mean, cov):
+        steps = self.layers[net]
+        for i, layer in enumerate(steps):
+            mean, cov = self._dense_moments(mean, cov, layer)
+            if i < len(steps) - 1:
+                mean, cov = self._relu_moments(mean, cov)
+        return mean, cov
+
+    def __call__(self, x, sampling=True):
+        """Pass data through the model
+
+        Parameters
+        ----------
+        x : array-like of shape (N, num_features)
+            Input data
+        sampling : bool
+            Sample parameter values from their variational distributions
+            (True, the default) or use the MAP estimates (False)
+
+        Returns
+        -------
+        preds : numpy.ndarray of shape (N, 2)
+            Mean predictions in the first column, standard deviation
+            predictions in the second.
+        """
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.num_features)
+        with self._rng_lock:
+            x = relu(self._network('core_net', x, sampling))
+            loc_preds = self._network('loc_net', x, sampling)
+            std_preds = softplus(self._network('std_net', x, sampling))
+        return np.concatenate([loc_preds, std_preds], axis=1)
+
+    def call_samples(self, x, n_samples=100):
+        """Draw n_samples posterior predictions for the batch at once
+
+        Returns
+        -------
+        preds : numpy.ndarray of shape (n_samples, N, 2)
+        """
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.num_features)
+        x = np.broadcast_to(x, (n_samples,) + x.shape)
+        with self._rng_lock:
+            x = relu(self._network_samples('core_net', x))
+            loc_preds = self._network_samples('loc_net', x)
+            std_preds = softplus(self._network_samples('std_net', x))
+        return np.concatenate([loc_preds, std_preds], axis=-1)
+
+    def call_moments(self, x, chunk_size=128):
+        """Propagate means and covariances through the network in one pass
+
+        The weight posteriors are treated as independent Gaussians, the
+        ReLU means and variances are computed in closed form and the
+        softplus of the std head is integrated by Gauss-Hermite
+        quadrature. The result is deterministic and approximates
+        ``call_samples`` at large n_samples.
+
+        Parameters
+        ----------
+        x : array-like of shape (N, num_features)
+            Input data
+        chunk_size : int
+            Rows processed together, bounding the (rows, d, d) covariance
+            buffers
+
+        Returns
+        -------
+        means : numpy.ndarray of shape (N, 2)
+            Expected mean-head and std-head outputs
+        variances : numpy.ndarray of shape (N, 2)
+            Variance of the mean-head and std-head outputs over the
+            weight posterior
+        """
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.num_features)
+        means = np.empty((x.shape[0], 2), dtype=np.float32)
+        variances = np.empty((x.shape[0], 2), dtype=np.float32)
+
+        for start in range(0, x.shape[0], chunk_size):
+            rows = x[start:start + chunk_size]
+            mean, cov = self._network_moments('core_net', rows,
+                                              np.zeros_like(rows))
+            mean, cov = self._relu_moments(mean, cov)
+
+            loc_mean, loc_cov = self._network_moments('loc_net', mean, cov)
+            std_mean, std_cov = self._network_moments('std_net', mean, cov)
+            std_mean, std_var = softplus_moments(std_mean[:, 0],
+                                                 std_cov[:, 0, 0])
+
+            chunk = slice(start, start + rows.shape[0])
+            means[chunk, 0] = loc_mean[:, 0]
+            means[chunk, 1] = std_mean
+            variances[chunk, 0] = loc_cov[:, 0, 0]
+            variances[chunk, 1] = std_var
+
+        return means, variances
+
+
+def compare_moments_with_mc(model, x, n_samples=20000, chunk_size=250):
+    """Compare moment propagation against Monte Carlo sampling
+
+    Args:
+        model (NumpyBayesianDensityNetwork): Loaded network
+        x (array-like): (N, num_features) inputs
+        n_samples (int): Number of Monte Carlo weight samples
+        chunk_size (int): Samples drawn per batched pass, to bound memory
+
+    Returns:
+        dict: Largest absolute difference of the mean and standard
+            deviation of each head between the two methods
+    """
+    means, variances = model.call_moments(x)
+
+    total = 0
+    first = 0
+    second = 0
+    while total < n_samples:
+        size = min(chunk_size, n_samples - total)
+        draws = model.call_samples(x, size).astype(np.float64)
+        first = first + draws.sum(axis=0)
+        second = second + (draws * draws).sum(axis=0)
+        total += size
+    mc_means = first / total
+    mc_stds = np.sqrt(np.maximum(second / total - mc_means**2, 0))
+
+    report = {}
+    for i, head in enumerate(['loc', 'std']):
+        report[f"{head}_mean_abs_diff"] = float(
+            np.abs(means[:, i] - mc_means[:, i]).max())
+        report[f"{head}_std_abs_diff"] = float(
+            np.abs(np.sqrt(variances[:, i]) - mc_stds[:, i]).max())
+        report[f"{head}_mc_std"] = float(mc_stds[:, i].mean())
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Load a BNN checkpoint with NumPy and export it to .npz")
+    parser.add_argument('prefix', nargs='?',
+                        default=str(Path(__file__).resolve().parent.parent /
+                                    'weights' / 'BNN2'))
+    parser.add_argument('--export', help="Path of the .npz file to write")
+    parser.add_argument('--compare', type=int, metavar='S', default=0,
+                        help="Compare moment propagation against S Monte "
+                        "Carlo samples")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = NumpyBayesianDensityNetwork.from_checkpoint(args.prefix)
+    print(f"Loaded {len(model.variables)} variables "
+          f"({model.nbytes / 1e6:.1f} MB) in "
+          f"{time.perf_counter() - start:.3f}s")
+
+    array = np.random.rand(1, model.num_features)
+    print("MAP prediction:", model(array, sampling=False)[0])
+
+    if args.compare:
+        batch = np.random.rand(32, model.num_features)
+        for key, value in compare_moments_with_mc(model, batch,
+                                                  args.compare).items():
+            print(f"{key}: {value:.4f}")
+
+    if args.export:
+        model.export_npz(args.export)
+        print(f"Exported to {args.export}")
@@ -0,0 +1,464 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+from utils.response_cache import response_cache, file_version, encode_json
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / 'data'
+CACHE_DIR = Path(os.environ.get('BOUNDARY_CACHE_DIR',
+                                BASE_DIR / 'cache' / 'boundaries'))
+
+# Census cartographic boundary files (1:20M), one TopoJSON layer each.
+# The id of every geometry is its FIPS code, to join predictions on.
+LAYERS = {
+    'counties': {
+        'path': DATA_DIR / 'gz_2010_us_050_00_20m.json',
+        'id': lambda properties: properties['GEO_ID'][-5:],
+        'properties': ('NAME',)
+    },
+    'states': {
+        'path': DATA_DIR / 'gz_2010_us_040_00_20m.json',
+        'id': lambda properties: properties['GEO_ID'][-2:],
+        'properties': ('NAME',)
+    }
+}
+
+# Douglas-Peucker tolerance of each simplification level, in degrees.
+# Level 0 keeps every vertex of the source file.
+LEVELS = (0.0, 0.005, 0.02, 0.05)
+
+# Grid step of quantized coordinates, in degrees. The census files carry 6
+# decimals, so this grid keeps every source vertex exactly; a coarser one
+# snaps close but distinct vertices together and leaves self-intersecting
+# rings behind.
+GRID = 1e-6
+
+# Location in a shapely.is_valid_reason message, e.g. "Self-intersection[x y]"
+INVALID_LOCATION = re.compile(r"\[(\S+) (\S+)\]")
+
+# Bump when the generated topology changes shape, to orphan cached files
+FORMAT_VERSION = 3
+
+
+def _polygons(geometry):
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    return geometry['coordinates']
+
+
+def _ring_key(ring):
+    """Closed ring as a tuple starting at its smallest point"""
+    start = ring.index(min(ring))
+    return tuple(ring[start:] + ring[:start])
+
+
+def _ring(arcs, refs):
+    """Closed ring stitched from arc references, ~index reversing an arc"""
+    points = []
+    for ref in refs:
+        arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+        points.extend(arc if not points else arc[1:])
+    return points
+
+
+def _farthest(coords, start, end):
+    """(offset, distance) of the vertex between start and end farthest from
+    the chord joining them"""
+    segment = coords[end] - coords[start]
+    offsets = coords[start + 1:end] - coords[start]
+    length = np.hypot(*segment)
+    if length == 0:
+        distances = np.hypot(*offsets.T)
+    else:
+        distances = np.abs(segment[0] * offsets[:, 1]
+                           - segment[1] * offsets[:, 0]) / length
+    i = int(np.argmax(distances))
+    return start + 1 + i, distances[i]
+
+
+def simplify_arc(points, tolerance, min_points=2):
+    """Douglas-Peucker simplification of one arc, keeping its endpoints
+
+    A closed arc (a ring without junctions) is split at the vertex farthest
+    from its start, so it cannot collapse onto a single point. At least
+    ``min_points`` vertices are kept where the arc has them, adding the
+    most distant ones first.
+    """
+    if tolerance <= 0 or len(points) <= 2:
+        return points
+    if points[0] == points[-1]:
+        coords = np.asarray(points, dtype=float)
+        split = int(np.argmax(np.hypot(*(coords - coords[0]).T)))
+        if split in (0, len(points) - 1):
+            return points
+        return (simplify_arc(points[:split + 1], tolerance, min_points)
+                + simplify_arc(points[split:], tolerance, min_points)[1:])
+
+    coords = np.asarray(points, dtype=float)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        middle, distance = _farthest(coords, start, end)
+        if distance > tolerance:
+            keep[middle] = True
+            stack.extend([(start, middle), (middle, end)])
+
+    while keep.sum() < min(min_points, len(points)):
+        kept = np.flatnonzero(keep)
+        middle, _ = max((_farthest(coords, start, end)
+                         for start, end in zip(kept, kept[1:]) if end > start + 1),
+                        key=lambda candidate: candidate[1])
+        keep[middle] = True
+    return [points[i] for i in np.flatnonzero(keep)]
+
+
+class Topology:
+    """Shared-arc topology of one boundary layer, in quantized coordinates
+
+    Rings are cut wherever their neighbours change, so a border between two
+    counties is stored (and simplified) once and both sides stay identical
+    at every level, without gaps or overlaps.
+    """
+
+    def __init__(self, collection, layer):
+        spec = LAYERS[layer]
+        self.layer = layer
+
+        coords = np.array([point[:2]
+                           for feature in collection['features']
+                           for polygon in _polygons(feature['geometry'])
+                           for ring in polygon for point in ring])
+        self.x0, self.y0 = np.round(coords.min(axis=0), 6)
+        x1, y1 = coords.max(axis=0)
+        self.bbox = [float(self.x0), float(self.y0), float(x1), float(y1)]
+        self.kx = self.ky = GRID
+
+        # Features as (id, properties, [[ring point lists]])
+        self.features = []
+        for feature in collection['features']:
+            properties = feature['properties']
+            polygons = []
+            for polygon in _polygons(feature['geometry']):
+                rings = [ring for ring in map(self._quantize, polygon)
+                         if len(ring) >= 3]
+                if rings:
+                    polygons.append(rings)
+            self.features.append((
+                spec['id'](properties),
+                {name: properties.get(name) for name in spec['properties']},
+                polygons))
+
+        self.arcs = []
+        self._arc_index = {}
+        junctions = self._junctions()
+        self.geometries = [
+            (fips, properties, [[self._cut(ring, junctions) for ring in polygon]
+                                for polygon in polygons])
+            for fips, properties, polygons in self.features]
+
+    def _quantize(self, ring):
+        """Open ring of integer grid points, without repeated vertices
+
+        Only exact duplicates are dropped, as the grid matches the source
+        precision.
+        """
+        points = [(int(round((x - self.x0) / self.kx)),
+                   int(round((y - self.y0) / self.ky)))
+                  for x, y, *_ in ring]
+        points = [p for i, p in enumerate(points) if i == 0 or p != points[i - 1]]
+        while len(points) > 1 and points[0] == points[-1]:
+            points.pop()
+        return points
+
+    def _junctions(self):
+        """Points where rings meet with different neighbours"""
+        neighbours = {}
+        for _, _, polygons in self.features:
+            for polygon in polygons:
+                for ring in polygon:
+                    n = len(ring)
+                    for i, point in enumerate(ring):
+                        pair = neighbours.setdefault(point, set())
+                        pair.add(ring[i - 1])
+                        pair.add(ring[(i + 1) % n])
+        return {point for point, pair in neighbours.items() if len(pair) > 2}
+
+    def _arc(self, points, loop=False):
+        """Index of an arc, ~index if stored in the opposite direction
+
+        A ``loop`` is a whole ring without junctions; it may match a stored
+        ring starting at any of its points.
+        """
+        if loop:
+            key = _ring_key(points[:-1])
+            reverse = _ring_key(points[:-1][::-1])
+            if key in self._arc_index:
+                return self._arc_index[key]
+            if reverse in self._arc_index:
+                return ~self._arc_index[reverse]
+            points = list(key) + [key[0]]
+        else:
+            key = tuple(points)
+            reverse = key[::-1]
+            if key in self._arc_index:
+                return self._arc_index[key]
+            if reverse in self._arc_index:
+                return ~self._arc_index[reverse]
+        self._arc_index[key] = len(self.arcs)
+        self.arcs.append(points)
+        return len(self.arcs) - 1
+
+    def _cut(self, ring, junctions):
+        """Arc references of one ring, split at its junctions"""
+        cuts = [i for i, point in enumerate(ring) if point in junctions]
+        if not cuts:
+            return [self._arc(ring + ring[:1], loop=True)]
+        ring = ring[cuts[0]:] + ring[:cuts[0]]
+        cuts = [i - cuts[0] for i in cuts] + [len(ring)]
+        closed = ring + ring[:1]
+        return [self._arc(closed[start:end + 1])
+                for start, end in zip(cuts, cuts[1:])]
+
+    def _shape(self, arcs, polygons, degrees):
+        """Shapely geometry of one feature, in the degrees decode_topology
+        returns; ``degrees`` caches converted arcs by index"""
+        for i in {ref if ref >= 0 else ~ref
+                  for polygon in polygons for refs in polygon for ref in refs}:
+            if i not in degrees:
+                points = np.asarray(arcs[i], dtype=np.float64) * GRID + (self.x0, self.y0)
+                degrees[i] = np.round(points, 6).tolist()
+
+        rings = [[_ring(degrees, refs) for refs in polygon] for polygon in polygons]
+        if len(rings) == 1:
+            return shape({"type": "Polygon", "coordinates": rings[0]})
+        return shape({"type": "MultiPolygon", "coordinates": rings})
+
+    @staticmethod
+    def _offending_arcs(geometry, indices, tolerances, degrees):
+        """Simplified arcs of an invalid feature at the location GEOS
+        reports, or all of them if it reports none"""
+        indices = [i for i in dict.fromkeys(indices) if tolerances[i] > 0]
+        location = INVALID_LOCATION.search(shapely.is_valid_reason(geometry))
+        if location is None:
+            return indices
+        point = shapely.Point(float(location[1]), float(location[2]))
+        near = [i for i in indices
+                if shapely.LineString(degrees[i]).distance(point) <= GRID]
+        return near or indices
+
+    def _simplified_arcs(self, tolerance):
+        tolerances = [tolerance / GRID] * len(self.arcs)
+        min_points = [2] * len(self.arcs)
+        arcs = [simplify_arc(arc, tolerances[0]) for arc in self.arcs]
+
+        def resimplify(i):
+            arcs[i] = simplify_arc(self.arcs[i], tolerances[i], min_points[i])
+
+        # Keep every ring a polygon: re-simplify the arcs of any ring that
+        # collapsed keeping an interior vertex each, for both sides of its
+        # borders alike. Full resolution is the last resort.
+        def segments(indices):
+            return sum(len(arcs[i]) - 1 for i in indices)
+
+        for _, _, polygons in self.geometries:
+            for polygon in polygons:
+                for refs in polygon:
+                    indices = [ref if ref >= 0 else ~ref for ref in refs]
+                    if segments(indices) >= 3:
+                        continue
+                    for i in indices:
+                        min_points[i] = 3
+                        resimplify(i)
+                    if segments(indices) < 3:
+                        for i in indices:
+                            tolerances[i] = 0
+                            resimplify(i)
+
+        # Simplifying can also make a ring cross itself or another ring of
+        # its feature. The arcs of every invalid feature are re-simplified
+        # at half their tolerance until it is valid, at worst down to the
+        # source vertices; features sharing those arcs are checked again.
+        features = [[ref if ref >= 0 else ~ref
+                     for polygon in polygons for refs in polygon for ref in refs]
+                    for _, _, polygons in self.geometries]
+        users = {}
+        for feature, indices in enumerate(features):
+            for i in indices:
+                users.setdefault(i, set()).add(feature)
+
+        pending = range(len(self.geometries))
+        while pending:
+            degrees = {}
+            changed = set()
+            for feature in pending:
+                geometry = self._shape(arcs, self.geometries[feature][2], degrees)
+                if not geometry.is_valid:
+                    changed.update(self._offending_arcs(geometry, features[feature],
+                                                        tolerances, degrees))
+            for i in changed:
+                tolerances[i] = tolerances[i] / 2 if tolerances[i] > 1 else 0
+                resimplify(i)
+            pending = sorted({feature for i in changed for feature in users[i]})
+        return arcs
+
+    def to_topojson(self, level=0):
+        """TopoJSON document at one simplification level"""
+        arcs = self._simplified_arcs(LEVELS[level])
+
+        encoded = []
+        for arc in arcs:
+            points = np.asarray(arc, dtype=np.int64)
+            deltas = np.vstack([points[:1], np.diff(points, axis=0)])
+            encoded.append(deltas.tolist())
+
+        geometries = []
+        for fips, properties, polygons in self.geometries:
+            if len(polygons) == 1:
+                geometry = {"type": "Polygon", "arcs": polygons[0]}
+            else:
+                geometry = {"type": "MultiPolygon", "arcs": polygons}
+            geometries.append({**geometry, "id": fips, "properties": properties})
+
+        return {
+            "type": "Topology",
+            "bbox": self.bbox,
+            "transform": {
+                "scale": [float(self.kx), float(self.ky)],
+                "translate": [float(self.x0), float(self.y0)]
+            },
+            "objects": {
+                self.layer: {"type": "GeometryCollection", "geometries": geometries}
+            },
+            "arcs": encoded
+        }
+
+
+def decode_topology(topology, layer):
+    """GeoJSON geometries of a TopoJSON layer, keyed by geometry id
+
+    Inverse of ``Topology.to_topojson``: arcs are un-delta-encoded, scaled
+    back to longitude and latitude (rounded to 6 decimals) and stitched into
+    rings.
+    """
+    (kx, ky), (x0, y0) = (topology["transform"]["scale"],
+                          topology["transform"]["translate"])
+    arcs = []
+    for arc in topology["arcs"]:
+        points = np.cumsum(np.asarray(arc, dtype=np.float64), axis=0)
+        points = np.round(points * (kx, ky) + (x0, y0), 6)
+        arcs.append(points.tolist())
+
+    geometries = {}
+    for geometry in topology["objects"][layer]["geometries"]:
+        if geometry["type"] == "Polygon":
+            coordinates = [_ring(arcs, refs) for refs in geometry["arcs"]]
+        else:
+            coordinates = [[_ring(arcs, refs) for refs in polygon]
+                           for polygon in geometry["arcs"]]
+        geometries[geometry["id"]] = {"type": geometry["type"],
+                                      "coordinates": coordinates}
+    return geometries
+
+
+def invalid_geometries(topology, layer):
+    """Ids of the geometries of a TopoJSON layer that are not valid"""
+    return [fips for fips, geometry in decode_topology(topology, layer).items()
+            if not shapely.is_valid(shape(geometry))]
+
+
+class BoundaryStore:
+    """Quantized TopoJSON boundary layers, generated once and kept on disk
+
+    Files are named after a version derived from the source file contents,
+    the simplification levels and the output format, so a changed input
+    produces new files (and new URLs) while unchanged ones are reused by
+    every worker and across restarts.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, layer):
+        """Content version of a layer, recomputed when its source changes"""
+        path = LAYERS[layer]['path']
+        stamp = file_version(path)
+        cached = self._versions.get(layer)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        digest = hashlib.sha256(path.read_bytes())
+        digest.update(f"{LEVELS}:{GRID}:{FORMAT_VERSION}".encode())
+        version = digest.hexdigest()[:16]
+        self._versions[layer] = (stamp, version)
+        return version
+
+    def path(self, layer, level):
+        return self.cache_dir / f"{layer}-{level}-{self.version(layer)}.topojson"
+
+    def build(self, layer):
+        """Generate every level of a layer and write them to disk"""
+        source = LAYERS[layer]['path']
+        with open(source, encoding='latin-1') as f:
+            topology = Topology(json.load(f), layer)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for level in range(len(LEVELS)):
+            document = topology.to_topojson(level)
+            invalid = invalid_geometries(document, layer)
+            if invalid:
+                raise RuntimeError(f"{layer} level {level} has {len(invalid)} invalid "
+                                   f"geometries: {', '.join(invalid[:10])}")
+            body = encode_json(document)
+            target = self.path(layer, level)
+            # Written under a temporary name so no worker reads a partial file
+            temp = target.with_suffix(f".{os.getpid()}.tmp")
+            temp.write_bytes(body)
+            os.replace(temp, target)
+            logger.info(f"Wrote {target.name}: {len(body)} bytes, "
+                        f"{len(topology.arcs)} arcs")
+
+    def read(self, layer, level):
+        """TopoJSON bytes of one layer and level, generating them if needed"""
+        target = self.path(layer, level)
+        if not target.exists():
+            with self._lock:
+                if not target.exists():
+                    self.build(layer)
+        return target.read_bytes()
+
+    def encoded(self, layer, level):
+        """Cached EncodedBody of one layer and level"""
+        return response_cache.get(
+            ("boundaries", layer, level), self.version(layer),
+            lambda: self.read(layer, level))
+
+
+boundary_store = BoundaryStore()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+    parser = argparse.ArgumentParser(
+        description="Pre-generate the TopoJSON boundary layers")
+    parser.add_argument('--cache-dir', type=Path, default=CACHE_DIR)
+    args = parser.parse_args()
+
+    store = BoundaryStore(args.cache_dir)
+    for name in LAYERS:
+        store.build(name)
@@ -0,0 +1,195 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ROOT_DIR = BASE_DIR.parent
+PUBLIC_DIR = Path(os.environ.get('PUBLIC_DIR', ROOT_DIR / 'public'))
+CROPS = ("corn", "soybean")
+
+# DOY label of the end-of-season file result{year}.csv
+END_OF_SEASON = "end_of_season"
+
+# Backend result CSVs: result_{crop}/bnn/result{year}[_{doy}].csv
+BNN = "bnn"
+RESULT_FILE = re.compile(r"result(\d{4})(?:_(\d+))?\.csv$")
+
+# Dated frontend snapshots:
+# public/{YYYYMMDD}/result_{crop}/bnn_{doy}/result_test_{year}_doy{doy}.csv
+SNAPSHOT = "snapshot"
+SNAPSHOT_DIR = re.compile(r"\d{8}$")
+SNAPSHOT_DOY_DIR = re.compile(r"bnn_(\d+)$")
+SNAPSHOT_FILE = re.compile(r"result_test_(\d{4})_doy(\d+)\.csv$")
+
+
+def result_dir(crop, base_dir=BASE_DIR):
+    return Path(base_dir) / f"result_{crop}" / "bnn"
+
+
+def parse_result_file(name):
+    """'result2016_060.csv' -> (2016, '060'); 'result2016.csv' -> (2016, END_OF_SEASON)"""
+    match = RESULT_FILE.match(name)
+    if match is None:
+        return None
+    return int(match.group(1)), match.group(2) or END_OF_SEASON
+
+
+def _scan_dir(directory):
+    try:
+        with os.scandir(directory) as entries:
+            return sorted(entries, key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return []
+
+
+def scan(base_dir=BASE_DIR, public_dir=PUBLIC_DIR, crops=CROPS):
+    """Find every result and snapshot CSV with one directory walk
+
+    Returns:
+        dict: (source, crop, year, doy, snapshot) -> os.DirEntry, where
+            snapshot is the YYYYMMDD directory of a snapshot file and None
+            for backend results
+    """
+    found = {}
+    for crop in crops:
+        for entry in _scan_dir(result_dir(crop, base_dir)):
+            key = parse_result_file(entry.name)
+            if key is not None and entry.is_file():
+                found[(BNN, crop) + key + (None,)] = entry
+
+    for dated in _scan_dir(public_dir):
+        if not (SNAPSHOT_DIR.match(dated.name) and dated.is_dir()):
+            continue
+        for crop in crops:
+            for doy_dir in _scan_dir(Path(dated.path) / f"result_{crop}"):
+                if not SNAPSHOT_DOY_DIR.match(doy_dir.name):
+                    continue
+                for entry in _scan_dir(doy_dir.path):
+                    match = SNAPSHOT_FILE.match(entry.name)
+                    if match is None or not entry.is_file():
+                        continue
+                    year, doy = int(match.group(1)), match.group(2)
+                    found[(SNAPSHOT, crop, year, doy, dated.name)] = entry
+    return found
+
+
+def describe(key, entry, root=ROOT_DIR):
+    """Catalog entry of one file: its key, row count, checksum and dates"""
+    source, crop, year, doy, snapshot = key
+    stat = entry.stat()
+    data = Path(entry.path).read_bytes()
+    modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+    if snapshot is not None:
+        snapshot_date = datetime.strptime(snapshot, "%Y%m%d").date()
+    else:
+        snapshot_date = modified.date()
+
+    path = Path(entry.path)
+    try:
+        path = path.relative_to(root)
+    except ValueError:
+        pass
+
+    return {
+        "source": source,
+        "crop": crop,
+        "year": year,
+        "doy": doy,
+        "path": path.as_posix(),
+        "rows": max(len(data.strip().splitlines()) - 1, 0),
+        "size": stat.st_size,
+        "checksum": hashlib.sha256(data).hexdigest(),
+        "snapshot_date": snapshot_date.isoformat(),
+        "modified": modified.isoformat()
+    }
+
+
+class Catalog:
+    """Manifest of every prediction CSV, built from one scan
+
+    ``refresh`` walks the result and snapshot directories once and only
+    reads (to count rows and checksum) files whose mtime or size changed,
+    so it is cheap enough to run on every poll of the result store. The
+    state is swapped as one tuple, and the ETag changes exactly when some
+    entry does.
+    """
+
+    def __init__(self, base_dir=BASE_DIR, public_dir=PUBLIC_DIR, crops=CROPS):
+        self.base_dir = Path(base_dir)
+        self.public_dir = Path(public_dir)
+        self.crops = crops
+        self.etag = None
+        self.generated_at = None
+        # (entries, signatures, paths), each keyed like ``scan``
+        self._state = ({}, {}, {})
+        self._present = frozenset()
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Rescan the directories; returns True if any entry changed"""
+        with self._lock:
+            found = scan(self.base_dir, self.public_dir, self.crops)
+            old_entries, old_stats, _ = self._state
+
+            entries, stats, paths = {}, {}, {}
+            for key in sorted(found, key=str):
+                entry = found[key]
+                stat = entry.stat()
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if old_stats.get(key) == signature:
+                    entries[key] = old_entries[key]
+                else:
+                    entries[key] = describe(key, entry)
+                stats[key] = signature
+                paths[key] = Path(entry.path)
+
+            changed = stats != old_stats or self.etag is None
+            if changed:
+                digest = hashlib.sha256()
+                for entry in entries.values():
+                    digest.update(f"{entry['path']}:{entry['checksum']}\n".encode())
+                self._present = frozenset(key[:4] for key in entries)
+                self._state = (entries, stats, paths)
+                self.etag = digest.hexdigest()[:32]
+                self.generated_at = datetime.now(timezone.utc)
+                logger.info(f"Catalog holds {len(entries)} files, etag {self.etag}")
+            return changed
+
+    def _current(self):
+        if self.etag is None:
+            self.refresh()
+        return self._state
+
+    def manifest(self, source=BNN):
+        """(crop, year, doy) -> (path, (mtime_ns, size)) of one source"""
+        entries, stats, paths = self._current()
+        return {key[1:4]: (paths[key], stats[key])
+                for key in entries if key[0] == source}
+
+    def entries(self, source=None, crop=None, year=None):
+        """Catalog entries, optionally filtered, in a stable order"""
+        entries, _, _ = self._current()
+        return [entry for entry in entries.values()
+                if (source is None or entry["source"] == source)
+                and (crop is None or entry["crop"] == crop)
+                and (year is None or entry["year"] == int(year))]
+
+    def exists(self, crop, year, doy=END_OF_SEASON, source=BNN):
+        """Whether a file for the crop, year and DOY is catalogued"""
+        self._current()
+        return (source, crop, int(year), doy) in self._present
+
+    def paths(self, crop, year, source=BNN):
+        """Paths of every catalogued file of one crop and year"""
+        entries, _, paths = self._current()
+        return [paths[key] for key in entries
+                if key[:3] == (source, crop, int(year))]
+
+
+catalog = Catalog()
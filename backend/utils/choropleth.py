@@ -0,0 +1,106 @@
+import json
+import threading
+
+import numpy as np
+
+from utils.boundaries import boundary_store, decode_topology
+from utils.response_cache import response_cache, encode_json
+from utils.result_store import (result_store, to_python, PREDICTION, ACTUAL,
+                                UNCERTAINTY)
+
+LAYER = 'counties'
+
+# Simplification level used when the client does not ask for one
+DEFAULT_LEVEL = 2
+
+
+class GeometryIndex:
+    """County geometries keyed by FIPS, each already serialised to JSON
+
+    Built once per simplification level from the cached TopoJSON layer, so
+    producing a choropleth only joins pre-encoded geometry fragments with
+    the per-county values.
+    """
+
+    def __init__(self, store=boundary_store, layer=LAYER):
+        self.store = store
+        self.layer = layer
+        self._levels = {}
+        self._lock = threading.Lock()
+
+    def version(self):
+        return self.store.version(self.layer)
+
+    def get(self, level):
+        """{fips: (name, geometry JSON bytes)} of one simplification level"""
+        version = self.version()
+        cached = self._levels.get(level)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with self._lock:
+            cached = self._levels.get(level)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            topology = json.loads(self.store.read(self.layer, level))
+            geometries = decode_topology(topology, self.layer)
+            names = {geometry["id"]: geometry["properties"].get("NAME")
+                     for geometry in topology["objects"][self.layer]["geometries"]}
+            index = {int(fips): (names[fips], encode_json(geometry))
+                     for fips, geometry in geometries.items()}
+            self._levels[level] = (version, index)
+            return index
+
+
+geometry_index = GeometryIndex()
+
+
+def encode_choropleth(snapshot, crop, year, doy, level=DEFAULT_LEVEL,
+                      index=geometry_index):
+    """GeoJSON FeatureCollection of one result file joined onto geometry
+
+    Every county of the file becomes a Feature with its FIPS as ``id`` and
+    the prediction, actual yield, uncertainty and error (prediction minus
+    actual) as properties. Counties without a census boundary keep a null
+    geometry.
+    """
+    geometries = index.get(level)
+    fips, values = snapshot.rows(crop, year, doy)
+    error = values[:, PREDICTION] - values[:, ACTUAL]
+
+    def finite(column):
+        return [None if np.isnan(value) else value for value in to_python(column)]
+
+    columns = zip(fips.tolist(),
+                  finite(values[:, PREDICTION]), finite(values[:, ACTUAL]),
+                  finite(values[:, UNCERTAINTY]), finite(error))
+
+    features = []
+    for code, prediction, actual, uncertainty, difference in columns:
+        name, geometry = geometries.get(code, (None, b"null"))
+        properties = encode_json({
+            "FIPS": code,
+            "NAME": name,
+            "prediction": prediction,
+            "actual": actual,
+            "uncertainty": uncertainty,
+            "error": difference
+        })
+        features.append(b'{"type":"Feature","id":"%05d","properties":%s,"geometry":%s}'
+                        % (code, properties, geometry))
+    return b'{"type":"FeatureCollection","features":[' + b",".join(features) + b"]}"
+
+
+def choropleth(crop, year, doy, level=DEFAULT_LEVEL, index=geometry_index):
+    """Cached EncodedBody of one choropleth, or None if the file is missing
+
+    Encoded once per (crop, year, doy, level) and version of the results
+    and geometry, so scrubbing back and forth only costs cache lookups.
+    """
+    snapshot = result_store.snapshot
+    if not snapshot.has(crop, year, doy):
+        return None
+    return response_cache.get(
+        ("choropleth", crop, int(year), doy, level),
+        (snapshot.version, index.version()),
+        lambda: encode_choropleth(snapshot, crop, year, doy, level, index))
@@ -0,0 +1,158 @@
+import io
+import threading
+from collections import OrderedDict
+from enum import Enum
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from utils.response_cache import response_cache, encoded_response, encode_json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is in requirements.txt
+    pa = None
+    pq = None
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+
+MAX_TABLES = 64
+
+
+class DataFormat(str, Enum):
+    json = "json"
+    arrow = "arrow"
+    parquet = "parquet"
+
+
+def negotiate(request, fmt=None):
+    """Pick the response format from ``?format=`` or the Accept header
+
+    An explicit ``format`` must be honoured, so asking for Arrow or Parquet
+    without pyarrow installed is a 406. Through Accept alone the server may
+    fall back to JSON, which stays the default.
+    """
+    if fmt is not None:
+        fmt = DataFormat(fmt)
+        if fmt != DataFormat.json and pa is None:
+            raise HTTPException(status_code=406,
+                                detail=f"{fmt.value} output requires pyarrow")
+        return fmt
+
+    accept = request.headers.get("accept", "")
+    if pa is not None:
+        if ARROW_STREAM in accept:
+            return DataFormat.arrow
+        if PARQUET in accept:
+            return DataFormat.parquet
+    return DataFormat.json
+
+
+def sanitize_columns(df):
+    """Column-wise Python values of a frame, non-finite numbers as None
+
+    Each column is masked once in NumPy (NaN, Inf and -Inf for floats,
+    missing values for everything else) rather than cell by cell.
+    """
+    columns = []
+    for name in df.columns:
+        values = df[name].to_numpy()
+        if values.dtype.kind in "iub":
+            columns.append(values.tolist())
+            continue
+        if values.dtype.kind == "f":
+            invalid = ~np.isfinite(values)
+        else:
+            invalid = pd.isna(values)
+        values = values.astype(object)
+        values[invalid] = None
+        columns.append(values.tolist())
+    return columns
+
+
+def encode_records(df):
+    """JSON array of row objects for ``df``, with NaN/Inf encoded as null"""
+    names = [str(name) for name in df.columns]
+    columns = sanitize_columns(df)
+    return encode_json([dict(zip(names, row)) for row in zip(*columns)])
+
+
+def encode_arrow(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def encode_parquet(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+    pq.write_table(table, sink, compression="zstd")
+    return sink.getvalue()
+
+
+class TableCache:
+    """Parsed DataFrames keyed like ResponseCache, so every output format
+    of one data version is encoded from a single read"""
+
+    def __init__(self, max_entries=MAX_TABLES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, build):
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(key)
+                return cached[1]
+
+        df = build()
+        with self._lock:
+            self._entries[key] = (version, df)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return df
+
+
+table_cache = TableCache()
+
+
+def table_response(request, key, version, build_frame, fmt=None, records=None):
+    """Respond with a table as JSON records, an Arrow IPC stream or Parquet
+
+    Args:
+        request (Request): Incoming request, for Accept and caching headers
+        key: Cache key of the table
+        version: Data version; bodies are rebuilt when it changes
+        build_frame (callable): Returns the table as a DataFrame
+        fmt (DataFormat): Explicit ``?format=``, if given
+        records (callable): Builds the JSON records, when they should not
+            simply be the sanitised rows of ``build_frame()``
+    """
+    fmt = negotiate(request, fmt)
+
+    def frame():
+        return table_cache.get(key, version, build_frame)
+
+    if fmt == DataFormat.arrow:
+        encoded = response_cache.get((key, fmt.value), version,
+                                     lambda: encode_arrow(frame()),
+                                     media_type=ARROW_STREAM)
+    elif fmt == DataFormat.parquet:
+        # Parquet pages are compressed already
+        encoded = response_cache.get((key, fmt.value), version,
+                                     lambda: encode_parquet(frame()),
+                                     media_type=PARQUET, compress=False)
+    else:
+        encoded = response_cache.get(
+            key, version,
+            records or (lambda: encode_records(frame())))
+
+    return encoded_response(request, encoded,
+                            headers={"Vary": "Accept, Accept-Encoding"})
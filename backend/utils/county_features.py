@@ -0,0 +1,239 @@
+import argparse
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from utils.feature_cache import geometry_hash
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STORE_DIR = Path(os.environ.get('COUNTY_FEATURES_DIR',
+                                BASE_DIR / 'data' / 'county_features'))
+COUNTY_GEOJSON = BASE_DIR / 'data' / 'gz_2010_us_050_00_20m.json'
+
+CUBE_FILE = 'county_features.npy'
+INDEX_FILE = 'county_features.json'
+
+SOIL_VARIABLES = ['awc', 'cec', 'som']
+DYNAMIC_VARIABLES = [
+    'EVI', 'NDVI', 'GCI', 'NDWI', 'LSTday', 'LSTnight',
+    'ppt', 'tmax', 'tmean', 'tmin', 'tdmean', 'vpdmax', 'vpdmean', 'vpdmin',
+    'Evap', 'PotEvap', 'RootMoist', 'GLDASws'
+]
+DOY_LIST = [f"{x:03d}" for x in range(58, 299, 16)]
+
+# Column order produced by FeatureExtractor.assemble_features
+FEATURE_NAMES = SOIL_VARIABLES + [f'{var}_{doy}' for doy in DOY_LIST
+                                  for var in DYNAMIC_VARIABLES]
+
+
+def geo_id_to_fips(geo_id):
+    """'0500000US55025' -> 55025, or None for anything but a county GEO_ID"""
+    prefix, _, code = geo_id.partition('US')
+    if prefix != '0500000' or len(code) != 5 or not code.isdigit():
+        return None
+    return int(code)
+
+
+def _column_mapping(columns):
+    """Map each served feature name to a column of the training predictors
+
+    Columns named exactly like the served features are used directly. A
+    variable whose training DOYs differ is matched by rank, the i-th
+    training DOY standing in for the i-th served DOY, as the network sees
+    them by position.
+    """
+    mapping = {}
+    for name in SOIL_VARIABLES:
+        if name not in columns:
+            raise ValueError(f"Training predictors lack column {name}")
+        mapping[name] = name
+
+    for var in DYNAMIC_VARIABLES:
+        served = [f'{var}_{doy}' for doy in DOY_LIST]
+        if all(name in columns for name in served):
+            mapping.update(zip(served, served))
+            continue
+
+        trained = sorted((c for c in columns
+                          if c.rsplit('_', 1)[0] == var
+                          and c.rsplit('_', 1)[-1].isdigit()),
+                         key=lambda c: int(c.rsplit('_', 1)[1]))
+        if len(trained) != len(served):
+            raise ValueError(f"Training predictors have {len(trained)} "
+                             f"DOYs for {var}, expected {len(served)}")
+        mapping.update(zip(served, trained))
+    return mapping
+
+
+def build_store(frames, years, out_dir=STORE_DIR):
+    """Write the [year, FIPS, feature] cube as a memory-mappable .npy file
+
+    Args:
+        frames (list): One DataFrame per year with a FIPS column and the
+            predictor columns, e.g. from ``file_organize.prepare_all_data``
+        years (list): Year of each frame
+        out_dir (Path): Directory receiving the cube and its index
+
+    Returns:
+        Path: Path of the written cube
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    fips = sorted(set().union(*(set(df['FIPS'].astype(int)) for df in frames)))
+    row_of = {code: i for i, code in enumerate(fips)}
+
+    cube_path = out_dir / CUBE_FILE
+    tmp_path = out_dir / f'.{CUBE_FILE}.tmp'
+    cube = np.lib.format.open_memmap(
+        tmp_path, mode='w+', dtype=np.float32,
+        shape=(len(years), len(fips), len(FEATURE_NAMES)))
+    cube[:] = np.nan
+
+    for i, df in enumerate(frames):
+        mapping = _column_mapping(set(df.columns))
+        df = df.drop_duplicates('FIPS')
+        rows = [row_of[code] for code in df['FIPS'].astype(int)]
+        values = df[[mapping[name] for name in FEATURE_NAMES]]
+        cube[i, rows] = values.to_numpy(dtype=np.float32)
+
+    cube.flush()
+    del cube
+    os.replace(tmp_path, cube_path)
+
+    index = {
+        'years': [int(year) for year in years],
+        'fips': fips,
+        'features': FEATURE_NAMES,
+        'built_at': datetime.now(timezone.utc).isoformat()
+    }
+    (out_dir / INDEX_FILE).write_text(json.dumps(index))
+    logger.info(f"Wrote county feature cube {len(years)}x{len(fips)}x"
+                f"{len(FEATURE_NAMES)} to {cube_path}")
+    return cube_path
+
+
+class CountyFeatureStore:
+    """Memory-mapped training features for every county and year
+
+    Requests whose geometry is exactly a census county boundary are served
+    from here instead of going to Earth Engine. The cube is opened lazily
+    and read through the page cache, so every worker shares one copy.
+    """
+
+    def __init__(self, store_dir=STORE_DIR, county_geojson=COUNTY_GEOJSON):
+        self.store_dir = Path(store_dir)
+        self.county_geojson = Path(county_geojson)
+        self._cube = None
+        self._years = None
+        self._rows = None
+        self._features = None
+        self._county_hashes = None
+        self._county_geometries = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return (self.store_dir / CUBE_FILE).exists()
+
+    def _open(self):
+        if self._cube is None:
+            with self._lock:
+                if self._cube is None:
+                    index = json.loads((self.store_dir / INDEX_FILE).read_text())
+                    self._years = {year: i for i, year in enumerate(index['years'])}
+                    self._rows = {code: i for i, code in enumerate(index['fips'])}
+                    self._features = index['features']
+                    self._cube = np.load(self.store_dir / CUBE_FILE, mmap_mode='r')
+        return self._cube
+
+    def warm(self):
+        """Open the cube and parse the county boundaries ahead of requests"""
+        if not self.available:
+            return
+        self._open()
+        with self._lock:
+            self._load_counties()
+
+    def _load_counties(self):
+        if self._county_geometries is None:
+            with open(self.county_geojson, encoding='latin-1') as f:
+                counties = json.load(f)['features']
+            self._county_geometries = {
+                feature['properties']['GEO_ID']: feature['geometry']
+                for feature in counties}
+            self._county_hashes = {}
+
+    def _county_hash(self, geo_id):
+        """Canonical hash of the census boundary of one county"""
+        with self._lock:
+            self._load_counties()
+            if geo_id not in self._county_hashes:
+                geometry = self._county_geometries.get(geo_id)
+                self._county_hashes[geo_id] = (geometry_hash(geometry)
+                                               if geometry else None)
+            return self._county_hashes[geo_id]
+
+    def match(self, geojson):
+        """FIPS of a single-feature request that is exactly a county, else None"""
+        features = geojson.get('features', [geojson])
+        if len(features) != 1:
+            return None
+        geo_id = (features[0].get('properties') or {}).get('GEO_ID')
+        if not geo_id or geo_id_to_fips(geo_id) is None:
+            return None
+        if geometry_hash(features[0]['geometry']) != self._county_hash(geo_id):
+            return None
+        return geo_id_to_fips(geo_id)
+
+    def lookup(self, fips, year):
+        """Return {feature: value} for a county and year, or None if absent
+
+        A row with any missing predictor counts as absent, so the request
+        falls back to extraction rather than sending NaN to the model.
+        """
+        if not self.available:
+            return None
+        cube = self._open()
+        year_index = self._years.get(int(year))
+        row = self._rows.get(int(fips))
+        if year_index is None or row is None:
+            return None
+        values = np.asarray(cube[year_index, row], dtype=np.float64)
+        if np.isnan(values).any():
+            return None
+        return dict(zip(self._features, values.tolist()))
+
+    def features_for(self, geojson, year):
+        """Stored features when ``geojson`` is a known county, else None"""
+        if not self.available:
+            return None
+        fips = self.match(geojson)
+        return self.lookup(fips, year) if fips is not None else None
+
+
+county_features = CountyFeatureStore()
+
+
+if __name__ == "__main__":
+    from utils.file_organize import prepare_all_data
+
+    parser = argparse.ArgumentParser(
+        description="Build the county feature cube from the training predictors")
+    parser.add_argument('--crop', default='corn',
+                        help="Passed on to prepare_all_data; the predictors, "
+                             "and so the cube, are the same for every crop")
+    parser.add_argument('--years', type=int, nargs='+',
+                        default=list(range(2015, 2025)))
+    parser.add_argument('--out', default=str(STORE_DIR))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    build_store(prepare_all_data(args.crop, args.years), args.years, args.out)
@@ -0,0 +1,153 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Workload classes, each with its own bounded pool so a burst of slow Earth
+# Engine extractions cannot starve file reads or model inference
+IO = 'io'                   # reading and encoding files
+EXTRACTION = 'extraction'   # Earth Engine feature extraction (network bound)
+COMPUTE = 'compute'         # model inference on batches
+JOBS = 'jobs'               # asynchronous prediction jobs, end to end
+
+POOL_SIZES = {
+    IO: int(os.environ.get('IO_WORKERS', 4)),
+    EXTRACTION: int(os.environ.get('EXTRACTION_WORKERS', 4)),
+    COMPUTE: int(os.environ.get('COMPUTE_WORKERS', 2)),
+    JOBS: int(os.environ.get('JOB_WORKERS', 2)),
+}
+
+# Event-loop lag sampling period, in seconds
+LAG_INTERVAL = float(os.environ.get('LOOP_LAG_INTERVAL', 0.5))
+
+# Upper bounds (ms) of the event-loop lag histogram buckets
+LAG_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+
+class BoundedPool:
+    """A named thread pool that counts running and queued calls"""
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.max_workers = max_workers
+        self.completed = 0
+        self._pending = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Created lazily so each forked gunicorn worker gets its own threads
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix=f'{self.name}-pool')
+        return self._executor
+
+    def _call(self, fn):
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking callable on this pool without blocking the loop"""
+        executor = self._ensure_started()
+        with self._lock:
+            self._pending += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, self._call, functools.partial(fn, *args, **kwargs))
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue a blocking callable in the background; returns its Future"""
+        executor = self._ensure_started()
+        with self._lock:
+            self._pending += 1
+        return executor.submit(self._call, functools.partial(fn, *args, **kwargs))
+
+    @property
+    def pending(self):
+        """Calls submitted and not yet finished (running or queued)"""
+        with self._lock:
+            return self._pending
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "running": min(self._pending, self.max_workers),
+                "queued": max(self._pending - self.max_workers, 0),
+                "completed": self.completed
+            }
+
+
+pools = {name: BoundedPool(name, size) for name, size in POOL_SIZES.items()}
+
+
+async def run_in(workload, fn, *args, **kwargs):
+    """Run ``fn(*args, **kwargs)`` on the pool of a workload class"""
+    return await pools[workload].run(fn, *args, **kwargs)
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up from a timed sleep
+
+    Anything blocking the loop (a synchronous call inside an ``async def``
+    handler) shows up directly as lag.
+    """
+
+    def __init__(self, interval=LAG_INTERVAL):
+        self.interval = interval
+        self.last_ms = None
+        self.max_ms = 0.0
+        self.mean_ms = None
+        self.samples = 0
+        self._histogram = {}
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.record((time.perf_counter() - start - self.interval) * 1000)
+
+    def record(self, lag_ms):
+        lag_ms = max(lag_ms, 0.0)
+        self.last_ms = lag_ms
+        self.max_ms = max(self.max_ms, lag_ms)
+        # Exponentially weighted, so the mean follows recent load
+        self.mean_ms = lag_ms if self.mean_ms is None else 0.9 * self.mean_ms + 0.1 * lag_ms
+        self.samples += 1
+        bucket = next((str(bound) for bound in LAG_BUCKETS_MS if lag_ms <= bound),
+                      f"{LAG_BUCKETS_MS[-1]}+")
+        self._histogram[bucket] = self._histogram.get(bucket, 0) + 1
+
+    def stats(self):
+        return {
+            "interval_seconds": self.interval,
+            "last_ms": self.last_ms,
+            "mean_ms": self.mean_ms,
+            "max_ms": self.max_ms,
+            "samples": self.samples,
+            "histogram_ms": dict(self._histogram)
+        }
+
+
+loop_lag = LoopLagMonitor()
+
+
+def executor_stats():
+    return {name: pool.stats() for name, pool in pools.items()}
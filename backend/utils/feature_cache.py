@@ -0,0 +1,273 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = Path(os.environ.get(
+    'FEATURE_CACHE_PATH',
+    Path(__file__).resolve().parent.parent / 'cache' / 'features.sqlite'))
+MAX_BYTES = int(os.environ.get('FEATURE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+MAX_ENTRIES = int(os.environ.get('FEATURE_CACHE_MAX_ENTRIES', 200000))
+
+# How long an in-season DOY stays cached while its composite window is open
+IN_SEASON_TTL = int(os.environ.get('FEATURE_CACHE_IN_SEASON_TTL', 6 * 3600))
+# Days after a DOY's composite window before its inputs are considered final
+SETTLE_DAYS = int(os.environ.get('FEATURE_CACHE_SETTLE_DAYS', 8))
+# Widest half-window of the per-DOY composites (MODIS VI uses +-8 days)
+COMPOSITE_HALF_WINDOW = 8
+
+# Bump whenever the extracted features change meaning, to orphan old rows
+FEATURE_SCHEMA_VERSION = 1
+
+# Coordinates are rounded to ~0.1 m so re-uploads of a field hash equally
+COORDINATE_PRECISION = 6
+
+SOIL_GROUP = 'soil'
+SOIL_FEATURES = {'awc', 'cec', 'som'}
+NUM_FEATURES = 291
+
+
+def _signed_area(points):
+    return sum(x0 * y1 - x1 * y0
+               for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1]))
+
+
+def _canonical_ring(ring):
+    """Round, de-duplicate, orient counter-clockwise and rotate a ring"""
+    points = [(round(float(x), COORDINATE_PRECISION),
+               round(float(y), COORDINATE_PRECISION))
+              for x, y, *_ in ring]
+    points = [p for i, p in enumerate(points) if i == 0 or p != points[i - 1]]
+    if len(points) > 1 and points[0] == points[-1]:
+        points = points[:-1]
+    if _signed_area(points) < 0:
+        points.reverse()
+    if points:
+        start = points.index(min(points))
+        points = points[start:] + points[:start]
+    return points
+
+
+def _canonical_polygon(rings):
+    exterior, *holes = [_canonical_ring(ring) for ring in rings]
+    return [exterior] + sorted(holes)
+
+
+def canonical_geometry(geometry):
+    """Normalise a GeoJSON geometry so equal shapes compare equal
+
+    Ring start vertex, ring orientation, closing vertices, hole order and
+    polygon order are all made irrelevant, and coordinates are rounded.
+    """
+    geometry_type = geometry['type']
+    coordinates = geometry.get('coordinates')
+    if geometry_type == 'Polygon':
+        return ['Polygon', _canonical_polygon(coordinates)]
+    if geometry_type == 'MultiPolygon':
+        polygons = sorted(_canonical_polygon(p) for p in coordinates)
+        if len(polygons) == 1:
+            return ['Polygon', polygons[0]]
+        return ['MultiPolygon', polygons]
+    if geometry_type == 'GeometryCollection':
+        return ['GeometryCollection',
+                sorted(canonical_geometry(g) for g in geometry['geometries'])]
+    # Points and lines only need rounding
+    def rounded(v):
+        return round(float(v), COORDINATE_PRECISION)
+    return [geometry_type, json.loads(json.dumps(coordinates),
+                                      parse_float=rounded, parse_int=rounded)]
+
+
+def geometry_hash(geojson):
+    """Hash a geometry, Feature or FeatureCollection by its canonical shape
+
+    A FeatureCollection hashes as the (unordered) set of its geometries,
+    matching extraction over the union of the features.
+    """
+    if geojson.get('type') == 'FeatureCollection':
+        shapes = sorted(canonical_geometry(f['geometry'])
+                        for f in geojson['features'])
+    elif geojson.get('type') == 'Feature':
+        shapes = [canonical_geometry(geojson['geometry'])]
+    else:
+        shapes = [canonical_geometry(geojson)]
+    payload = json.dumps(shapes, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def feature_group(name):
+    """Cache group of a feature: 'soil' or its DOY, e.g. 'EVI_058' -> '058'"""
+    if name in SOIL_FEATURES:
+        return SOIL_GROUP
+    return name.rsplit('_', 1)[1]
+
+
+def group_expiry(group, year, now=None):
+    """Expiry timestamp of a cached group, or None if it never expires
+
+    Soil is static. A DOY expires after IN_SEASON_TTL until its composite
+    window (plus SETTLE_DAYS for late-arriving products) has closed;
+    afterwards its inputs no longer change and it is kept for good.
+    """
+    if group == SOIL_GROUP:
+        return None
+    now = time.time() if now is None else now
+    window_closes = datetime(int(year), 1, 1) + timedelta(
+        days=int(group) - 1 + COMPOSITE_HALF_WINDOW + SETTLE_DAYS)
+    if window_closes.timestamp() <= now:
+        return None
+    return now + IN_SEASON_TTL
+
+
+class FeatureCache:
+    """Disk-backed cache of extracted features in a SQLite database
+
+    Rows are keyed by (geometry hash, year, schema version, group), where
+    a group is either the static soil properties or one DOY, so soil and
+    closed DOYs are kept while open in-season DOYs expire. Least recently
+    used rows are evicted once the byte or entry limit is exceeded.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES,
+                 max_entries=MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # WAL lets every gunicorn worker share the same file
+            conn = sqlite3.connect(str(self.path), timeout=30,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS features (
+                    geometry_hash TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    schema_version INTEGER NOT NULL,
+                    feature_group TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (geometry_hash, year, schema_version, feature_group)
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS features_lru "
+                         "ON features (last_access)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_groups(self, key, year):
+        """Return the unexpired cached groups as {group: {feature: value}}
+
+        Groups come soil first, then DOYs ascending: the extractor's column
+        order. Callers extract only the groups that are missing, so one
+        expired in-season DOY does not discard soil and the closed DOYs.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT feature_group, payload FROM features "
+                "WHERE geometry_hash = ? AND year = ? AND schema_version = ? "
+                "AND (expires_at IS NULL OR expires_at > ?) "
+                "ORDER BY feature_group != 'soil', feature_group",
+                (key, int(year), FEATURE_SCHEMA_VERSION, now)).fetchall()
+            groups = {group: json.loads(payload) for group, payload in rows}
+
+            if groups:
+                conn.execute(
+                    "UPDATE features SET last_access = ? "
+                    "WHERE geometry_hash = ? AND year = ? AND schema_version = ?",
+                    (now, key, int(year), FEATURE_SCHEMA_VERSION))
+                conn.commit()
+            if sum(len(values) for values in groups.values()) == NUM_FEATURES:
+                self.hits += 1
+            elif groups:
+                self.partial_hits += 1
+            else:
+                self.misses += 1
+            return groups
+
+    def get(self, key, year):
+        """Return the cached {feature: value} dict, or None unless every
+        group is cached"""
+        features = {}
+        for values in self.get_groups(key, year).values():
+            features.update(values)
+        if len(features) != NUM_FEATURES:
+            return None
+        return features
+
+    def put(self, key, year, features):
+        """Store a {feature: value} dict, split into its cache groups"""
+        groups = {}
+        for name, value in features.items():
+            groups.setdefault(feature_group(name), {})[name] = value
+
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            for group, values in groups.items():
+                payload = json.dumps(values)
+                conn.execute(
+                    "INSERT OR REPLACE INTO features VALUES "
+                    "(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, int(year), FEATURE_SCHEMA_VERSION, group, payload,
+                     len(payload), now, group_expiry(group, year, now), now))
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM features WHERE expires_at <= ? "
+                     "OR schema_version != ?", (now, FEATURE_SCHEMA_VERSION))
+        entries, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM features").fetchone()
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return
+
+        # Drop least recently used rows until both limits hold again
+        for rowid, row_size in conn.execute(
+                "SELECT rowid, size FROM features ORDER BY last_access"
+        ).fetchall():
+            if entries <= self.max_entries and size <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM features WHERE rowid = ?", (rowid,))
+            entries -= 1
+            size -= row_size
+        logger.info(f"Feature cache evicted down to {entries} rows, {size} bytes")
+
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM features"
+            ).fetchone()
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses
+        }
+
+
+feature_cache = FeatureCache()
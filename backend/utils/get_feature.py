@@ -1,27 +1,116 @@
 import ee
 import os
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from google.oauth2 import service_account
 
+from utils.feature_cache import (feature_cache, feature_group, geometry_hash,
+                                 SOIL_GROUP)
+
 KEY_PATH = 'nifa-webgis-4e708187c46c.json'
 import logging
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
+
+VI_VARIABLES = ['EVI', 'NDVI', 'GCI', 'NDWI']
+LST_VARIABLES = ['LSTday', 'LSTnight']
+PRISM_VARIABLES = ['ppt', 'tmax', 'tmean', 'tmin', 'tdmean', 'vpdmax', 'vpdmean', 'vpdmin']
+GLDAS_BANDS = {
+    'Evap': 'Evap_tavg',
+    'PotEvap': 'PotEvap_tavg',
+    'RootMoist': 'RootMoist_inst'
+}
+SOIL_VARIABLES = ['awc', 'cec', 'som']
+
+# Data sources extracted for every request, in progress-report order
+SOURCES = ['soil', 'modis_vi', 'lst', 'prism', 'gldas']
+
+# DOYs of the per-DOY composites, one every 16 days
+DOY_LIST = [f"{x:03d}" for x in range(58, 299, 16)]
+
+# Features per DOY across the VI, LST, PRISM and GLDAS sources
+FEATURES_PER_DOY = len(VI_VARIABLES) + len(LST_VARIABLES) + len(PRISM_VARIABLES) + 4
+
+# Upper bound on concurrent Earth Engine requests from this process, shared
+# by every extraction so parallel sources stay within the account quota
+EE_MAX_CONCURRENCY = int(os.environ.get('EE_MAX_CONCURRENCY', 5))
+EE_REQUEST_SLOTS = threading.BoundedSemaphore(EE_MAX_CONCURRENCY)
+
+
+def calculate_indices(image):
+    """Compute EVI, NDVI, GCI and NDWI bands for a MOD09A1 image"""
+    # Get date info
+    date = ee.Date(image.get('system:time_start'))
+    doy = date.getRelative('day', 'year')
+
+    evi = image.expression(
+        '2.5 * (nir - red) / (nir + 6 * red - 7.5 * blue + 1)',
+        {
+            'nir': image.select('sur_refl_b02'),
+            'red': image.select('sur_refl_b01'),
+            'blue': image.select('sur_refl_b03')
+        }).rename('EVI')
+
+    ndvi = image.normalizedDifference(['sur_refl_b02', 'sur_refl_b01']).rename('NDVI')
+
+    gci = image.expression(
+        '(nir / green) - 1',
+        {
+            'nir': image.select('sur_refl_b02'),
+            'green': image.select('sur_refl_b04')
+        }).rename('GCI')
+
+    ndwi = image.normalizedDifference(['sur_refl_b02', 'sur_refl_b06']).rename('NDWI')
+
+    return ee.Image.cat([evi, ndvi, gci, ndwi]).set('doy', doy)
+
+
+def gldas_water_stress(evap, pot_evap):
+    """GLDASws from mean evaporation and potential evaporation"""
+    if evap is None or not pot_evap:
+        return 0
+    return evap / (pot_evap * 0.408 * 1e-6)
+
+
 class FeatureExtractor:
-    def __init__(self, geojson_path):
+    def __init__(self, geojson_path, geojson=None, progress=None, doys=None):
         self.initialize_gee()
         logger.info("Initialized GEE")
         
-        self.doy_list = [f"{x:03d}" for x in range(58, 299, 16)]
+        # A subset of the DOYs when the others are already cached
+        self.doy_list = list(DOY_LIST if doys is None else doys)
         logger.info(f"DOY list created: {self.doy_list}")
         
-        # Load geometry
-        with open(geojson_path) as f:
-            self.geojson = json.load(f)
+        # Load geometry, unless it was already parsed by the caller
+        if geojson is None:
+            with open(geojson_path) as f:
+                geojson = json.load(f)
+        self.geojson = geojson
         self.area_of_interest = ee.FeatureCollection(self.geojson)
         logger.info(f"Loaded geometry from {geojson_path}")
 
+        # Blocking Earth Engine requests made so far and wall-clock seconds
+        # spent, per data source
+        self.round_trips = {}
+        self.timings = {}
+        self._stats_lock = threading.Lock()
+
+        # Optional ``progress(source, state)`` callback, told when each
+        # source starts ('running') and ends ('done' or 'failed')
+        self.progress = progress
+
+        # Individual features, tagged with their position, for per-field
+        # extraction with reduceRegions
+        features = self.geojson.get('features', [self.geojson])
+        self.num_regions = len(features)
+        self.regions = ee.FeatureCollection([
+            ee.Feature(ee.Geometry(feature['geometry']), {'_index': i})
+            for i, feature in enumerate(features)
+        ])
+
     def initialize_gee(self):
         """Initialize Earth Engine"""
         script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -32,339 +121,360 @@ class FeatureExtractor:
             scopes=['https://www.googleapis.com/auth/earthengine'])
         ee.Initialize(credentials)
 
+    def reduce_region(self, image, scale, source):
+        """Mean of every band over the area of interest, in one request"""
+        reduced = image.reduceRegion(
+            reducer=ee.Reducer.mean(),
+            geometry=self.area_of_interest.geometry(),
+            scale=scale,
+            maxPixels=1e9
+        )
+        return self.get_info(reduced, source)
+
+    def get_info(self, computed, source):
+        """Fetch a computed object, within the process-wide request limit"""
+        with EE_REQUEST_SLOTS:
+            value = computed.getInfo()
+        self.count_round_trip(source)
+        return value
+
+    def count_round_trip(self, source):
+        """Record one blocking Earth Engine request made for ``source``"""
+        with self._stats_lock:
+            self.round_trips[source] = self.round_trips.get(source, 0) + 1
+
+    def run_sources(self, tasks):
+        """Run independent source extractions concurrently
+
+        Args:
+            tasks (dict): Source name mapped to a zero-argument callable
+
+        Returns:
+            dict: Source name mapped to the callable's result. End-to-end
+                time is that of the slowest source rather than the sum.
+        """
+        def timed(name, task):
+            start = time.perf_counter()
+            self.report(name, 'running')
+            try:
+                result = task()
+            except Exception:
+                self.report(name, 'failed')
+                raise
+            else:
+                self.report(name, 'done')
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._stats_lock:
+                    self.timings[name] = round(elapsed, 3)
+                logger.info(f"{name} extraction took {elapsed:.2f}s")
+
+        with ThreadPoolExecutor(max_workers=min(len(tasks), EE_MAX_CONCURRENCY),
+                                thread_name_prefix='ee-source') as executor:
+            futures = {name: executor.submit(timed, name, task)
+                       for name, task in tasks.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    def report(self, source, state):
+        """Forward a source's progress to the callback, if there is one"""
+        if self.progress is None:
+            return
+        try:
+            self.progress(source, state)
+        except Exception as e:
+            logger.warning(f"Progress callback failed for {source}: {str(e)}")
+
     def get_soil_properties(self):
         """Get static soil properties"""
-        soil_data = {}
-        soil_properties = {
-            'awc': ee.Image("projects/nifa-webgis/assets/awc").select('b1'),  # Add .select('b1')
-            'cec': ee.Image("projects/nifa-webgis/assets/cec").select('b1'),
-            'som': ee.Image("projects/nifa-webgis/assets/som").select('b1')
-        }
-        
         logger.info("Starting soil property extraction")
-        for soil_type, image in soil_properties.items():
-            try:
-                logger.info(f"Processing {soil_type}")
-                reduced = image.reduceRegion(
-                    reducer=ee.Reducer.mean(),
-                    geometry=self.area_of_interest.geometry(),
-                    scale=250,
-                    maxPixels=1e9
-                ).get('b1')  # Get 'b1' band value
-                
-                value = reduced.getInfo()
-                logger.info(f"Extracted {soil_type}: {value}")
-                soil_data[soil_type] = value
-                
-            except Exception as e:
-                logger.error(f"Error extracting {soil_type}: {str(e)}")
-                raise Exception(f"Failed to extract {soil_type}: {str(e)}")
-            
+        try:
+            values = self.reduce_region(self.soil_image(), 250, 'soil')
+        except Exception as e:
+            logger.error(f"Error extracting soil properties: {str(e)}")
+            raise Exception(f"Failed to extract soil properties: {str(e)}")
+
+        soil_data = {name: values.get(name) for name in SOIL_VARIABLES}
+        logger.info(f"Extracted soil properties: {soil_data}")
         return soil_data
 
     def get_modis_vis(self, year):
         """Get vegetation indices for specific dates"""
-        start_date = f'{year}-01-01'
-        end_date = f'{year}-12-31'
-        
-        vi_data = {doy: {} for doy in self.doy_list}
-        
         logger.info(f"Starting MODIS VI extraction for year {year}")
-        
         try:
-            collection = ee.ImageCollection('MODIS/061/MOD09A1') \
-                .filterDate(start_date, end_date) \
-                .filterBounds(self.area_of_interest)
-            
-            logger.info(f"Initial collection size: {collection.size().getInfo()}")
-                
-            def calculate_indices(image):
-                # Get date info
-                date = ee.Date(image.get('system:time_start'))
-                doy = date.getRelative('day', 'year')
-                
-                evi = image.expression(
-                    '2.5 * (nir - red) / (nir + 6 * red - 7.5 * blue + 1)',
-                    {
-                        'nir': image.select('sur_refl_b02'),
-                        'red': image.select('sur_refl_b01'),
-                        'blue': image.select('sur_refl_b03')
-                    }).rename('EVI')
-                
-                ndvi = image.normalizedDifference(['sur_refl_b02', 'sur_refl_b01']).rename('NDVI')
-                
-                gci = image.expression(
-                    '(nir / green) - 1',
-                    {
-                        'nir': image.select('sur_refl_b02'),
-                        'green': image.select('sur_refl_b04')
-                    }).rename('GCI')
-                
-                ndwi = image.normalizedDifference(['sur_refl_b02', 'sur_refl_b06']).rename('NDWI')
-                
-                return ee.Image.cat([evi, ndvi, gci, ndwi]).set('doy', doy)
-            
-            indices = collection.map(calculate_indices)
-            
-            for doy in self.doy_list:
-                doy_number = int(doy)
-                # Find closest date within ±8 days
-                filtered = indices.filterMetadata('doy', 'greater_than', doy_number - 8) \
-                                .filterMetadata('doy', 'less_than', doy_number + 8)
-                
-                count = filtered.size().getInfo()
-                logger.info(f"Found {count} images for DOY {doy}")
-                
-                if count > 0:
-                    reduced = filtered.mean().reduceRegion(
-                        reducer=ee.Reducer.mean(),
-                        geometry=self.area_of_interest.geometry(),
-                        scale=250,
-                        maxPixels=1e9
-                    )
-                    values = reduced.getInfo()
-                    logger.info(f"DOY {doy} values: {values}")
-                    
-                    vi_data[doy] = {
-                        'EVI': values['EVI'],
-                        'NDVI': values['NDVI'],
-                        'GCI': values['GCI'],
-                        'NDWI': values['NDWI']
-                    }
-                else:
-                    logger.warning(f"No data found for DOY {doy}, using nearest available date")
-                    # Get nearest available date
-                    nearest = indices.sort('doy').first()
-                    reduced = nearest.reduceRegion(
-                        reducer=ee.Reducer.mean(),
-                        geometry=self.area_of_interest.geometry(),
-                        scale=250,
-                        maxPixels=1e9
-                    )
-                    values = reduced.getInfo()
-                    vi_data[doy] = {
-                        'EVI': values['EVI'],
-                        'NDVI': values['NDVI'],
-                        'GCI': values['GCI'],
-                        'NDWI': values['NDWI']
-                    }
-                    
+            # All 16 DOY composites come back from a single request
+            values = self.reduce_region(self.modis_vi_image(year), 250, 'modis_vi')
         except Exception as e:
             logger.error(f"Error in MODIS VI extraction: {str(e)}")
             raise
-            
-        return vi_data
+
+        return self.split_by_doy(values, VI_VARIABLES)
 
     def get_lst_data(self, year):
         """Get LST data for specific dates"""
-        start_date = f'{year}-01-01'
-        end_date = f'{year}-12-31'
-        
-        lst_data = {doy: {} for doy in self.doy_list}
-        
-        collection = ee.ImageCollection('MODIS/061/MOD11A1') \
-            .filterDate(start_date, end_date) \
-            .filterBounds(self.area_of_interest)
-        
-        for doy in self.doy_list:
-            doy_number = int(doy)
-            filtered = collection.filter(ee.Filter.calendarRange(doy_number, doy_number, 'day_of_year'))
-            
-            if filtered.size().getInfo() > 0:
-                day_lst = filtered.select('LST_Day_1km').mean() \
-                    .multiply(0.02).subtract(273.15)
-                night_lst = filtered.select('LST_Night_1km').mean() \
-                    .multiply(0.02).subtract(273.15)
-                
-                reduced_day = day_lst.reduceRegion(
-                    reducer=ee.Reducer.mean(),
-                    geometry=self.area_of_interest.geometry(),
-                    scale=1000,
-                    maxPixels=1e9
-                )
-                reduced_night = night_lst.reduceRegion(
-                    reducer=ee.Reducer.mean(),
-                    geometry=self.area_of_interest.geometry(),
-                    scale=1000,
-                    maxPixels=1e9
-                )
-                
-                lst_data[doy] = {
-                    'LSTday': reduced_day.getInfo()['LST_Day_1km'],
-                    'LSTnight': reduced_night.getInfo()['LST_Night_1km']
-                }
-                
-        return lst_data
+        values = self.reduce_region(self.lst_image(year), 1000, 'lst')
+        return self.split_by_doy(values, LST_VARIABLES)
 
     def get_weather_data(self, year):
         """Get PRISM weather data for specific dates"""
         try:
-            start_date = f'{year}-01-01'
-            end_date = f'{year}-12-31'
-            
-            weather_data = {doy: {} for doy in self.doy_list}
-            
             logger.info(f"Starting PRISM weather data extraction for year {year}")
-            
-            collection = ee.ImageCollection('OREGONSTATE/PRISM/AN81d') \
-                .filterDate(start_date, end_date) \
-                .filterBounds(self.area_of_interest)
-                
-            # Check collection size
-            size = collection.size().getInfo()
-            logger.info(f"PRISM collection size: {size}")
-            
-            # All required variables
-            variables = ['ppt', 'tmax', 'tmean', 'tmin', 'tdmean', 'vpdmax', 'vpdmean', 'vpdmin']
-            
-            for doy in self.doy_list:
-                logger.info(f"Processing DOY {doy}")
-                doy_number = int(doy)
-                
-                # Get date for this DOY
-                date = ee.Date.fromYMD(year, 1, 1).advance(doy_number-1, 'day')
-                date_range = ee.DateRange(date.advance(-3, 'day'), date.advance(3, 'day'))
-                
-                # Filter collection by date range
-                filtered = collection.filterDate(date_range)
-                filtered_size = filtered.size().getInfo()
-                logger.info(f"Found {filtered_size} images for DOY {doy}")
-                
-                if filtered_size > 0:
-                    try:
-                        mean_image = filtered.mean()
-                        reduced = mean_image.reduceRegion(
-                            reducer=ee.Reducer.mean(),
-                            geometry=self.area_of_interest.geometry(),
-                            scale=4000,
-                            maxPixels=1e9
-                        )
-                        values = reduced.getInfo()
-                        logger.info(f"Reduced values for DOY {doy}: {values}")
-                        
-                        # Store each variable
-                        for var in variables:
-                            weather_data[doy][var] = values.get(var, 0)  # Default to 0 if missing
-                    except Exception as e:
-                        logger.error(f"Error reducing data for DOY {doy}: {str(e)}")
-                        # Fill with zeros if reduction fails
-                        for var in variables:
-                            weather_data[doy][var] = 0
-                else:
-                    logger.warning(f"No data found for DOY {doy}, filling with zeros")
-                    for var in variables:
-                        weather_data[doy][var] = 0
-                        
+            values = self.reduce_region(self.prism_image(year), 4000, 'prism')
+
+            # Default to 0 if missing, as for DOYs without images
+            weather_data = self.split_by_doy(values, PRISM_VARIABLES)
+            for data in weather_data.values():
+                for var, value in data.items():
+                    if value is None:
+                        data[var] = 0
+
             logger.info(f"Weather data extraction complete. First DOY data: {weather_data[self.doy_list[0]]}")
             return weather_data
-            
+
         except Exception as e:
             logger.error(f"Error in weather data extraction: {str(e)}")
             raise
 
     def get_gldas_data(self, year):
         """Get GLDAS data for specific dates"""
-        start_date = f'{year}-01-01'
-        end_date = f'{year}-12-31'
-        
-        gldas_data = {doy: {} for doy in self.doy_list}
-        
+        values = self.reduce_region(self.gldas_image(year), 25000, 'gldas')
+        return self.gldas_by_doy(values)
+
+    def assemble_features(self, soil_data, vi_data, lst_data, weather_data, gldas_data):
+        """Flatten per-source data into a {feature_name: value} dictionary"""
+        features = {}
+
+        # Add soil properties
+        features.update(soil_data)
+
+        # Add time series features
+        for doy in self.doy_list:
+            # Log progress for each DOY
+            logger.debug(f"Processing DOY {doy}")
+
+            try:
+                # Add vegetation indices
+                for vi in ['EVI', 'NDVI', 'GCI', 'NDWI']:
+                    features[f'{vi}_{doy}'] = vi_data[doy].get(vi, 0)
+
+                # Add LST
+                for lst in ['LSTday', 'LSTnight']:
+                    features[f'{lst}_{doy}'] = lst_data[doy].get(lst, 0)
+
+                # Add weather variables
+                for var in ['ppt', 'tmax', 'tmean', 'tmin', 'tdmean', 'vpdmax', 'vpdmean', 'vpdmin']:
+                    features[f'{var}_{doy}'] = weather_data[doy].get(var, 0)
+
+                # Add GLDAS variables
+                for var in ['Evap', 'PotEvap', 'RootMoist', 'GLDASws']:
+                    features[f'{var}_{doy}'] = gldas_data[doy].get(var, 0)
+
+            except Exception as e:
+                logger.error(f"Error processing DOY {doy}: {str(e)}")
+                # Fill missing values with zeros
+                logger.warning(f"Filling missing values with zeros for DOY {doy}")
+                for feature_type in ['EVI', 'NDVI', 'GCI', 'NDWI', 'LSTday', 'LSTnight',
+                                'ppt', 'tmax', 'tmean', 'tmin', 'tdmean', 'vpdmax', 'vpdmean', 'vpdmin',
+                                'Evap', 'PotEvap', 'RootMoist', 'GLDASws']:
+                    features[f'{feature_type}_{doy}'] = 0
+
+        return features
+
+    def _doy_composites(self, build, fallback):
+        """Stack one composite per DOY into a single multi-band image
+
+        ``build(doy_number)`` returns an (image collection, band names)
+        pair for that DOY; DOYs without images use ``fallback(band names)``.
+        Everything is assembled server-side, so no request is made here.
+        """
+        images = []
+        for doy in self.doy_list:
+            filtered, bands = build(int(doy))
+            composite = ee.Image(ee.Algorithms.If(
+                filtered.size().gt(0),
+                filtered.mean().select(bands[0]).rename(bands[1]),
+                fallback(bands[1])))
+            images.append(composite.rename([f"{b}_{doy}" for b in bands[1]]))
+        return ee.Image.cat(images)
+
+    @staticmethod
+    def _zeros(names):
+        return ee.Image.constant([0] * len(names)).rename(names)
+
+    def soil_image(self):
+        """Static soil properties as one three-band image"""
+        return ee.Image.cat([
+            ee.Image(f"projects/nifa-webgis/assets/{name}").select('b1').rename(name)
+            for name in SOIL_VARIABLES
+        ])
+
+    def modis_vi_image(self, year):
+        """EVI/NDVI/GCI/NDWI composites for every DOY as one image"""
+        indices = ee.ImageCollection('MODIS/061/MOD09A1') \
+            .filterDate(f'{year}-01-01', f'{year}-12-31') \
+            .filterBounds(self.area_of_interest) \
+            .map(calculate_indices)
+        # DOYs without images fall back to the first image of the year
+        earliest = ee.Image(indices.sort('doy').first())
+
+        def build(doy_number):
+            filtered = indices.filterMetadata('doy', 'greater_than', doy_number - 8) \
+                .filterMetadata('doy', 'less_than', doy_number + 8)
+            return filtered, (VI_VARIABLES, VI_VARIABLES)
+
+        return self._doy_composites(
+            build, lambda names: earliest.select(VI_VARIABLES).rename(names))
+
+    def lst_image(self, year):
+        """Day and night LST (deg C) for every DOY as one image"""
+        collection = ee.ImageCollection('MODIS/061/MOD11A1') \
+            .filterDate(f'{year}-01-01', f'{year}-12-31') \
+            .filterBounds(self.area_of_interest) \
+            .select(['LST_Day_1km', 'LST_Night_1km'])
+        collection = collection.map(
+            lambda image: ee.Image(image.multiply(0.02).subtract(273.15)
+                                   .copyProperties(image, ['system:time_start'])))
+
+        def build(doy_number):
+            filtered = collection.filter(
+                ee.Filter.calendarRange(doy_number, doy_number, 'day_of_year'))
+            return filtered, (['LST_Day_1km', 'LST_Night_1km'], LST_VARIABLES)
+
+        return self._doy_composites(build, self._zeros)
+
+    def prism_image(self, year):
+        """PRISM weather means within +-3 days of every DOY as one image"""
+        collection = ee.ImageCollection('OREGONSTATE/PRISM/AN81d') \
+            .filterDate(f'{year}-01-01', f'{year}-12-31') \
+            .filterBounds(self.area_of_interest)
+
+        def build(doy_number):
+            date = ee.Date.fromYMD(year, 1, 1).advance(doy_number - 1, 'day')
+            filtered = collection.filterDate(
+                ee.DateRange(date.advance(-3, 'day'), date.advance(3, 'day')))
+            return filtered, (PRISM_VARIABLES, PRISM_VARIABLES)
+
+        return self._doy_composites(build, self._zeros)
+
+    def gldas_image(self, year):
+        """GLDAS evaporation and root moisture for every DOY as one image"""
         collection = ee.ImageCollection('NASA/GLDAS/V021/NOAH/G025/T3H') \
-            .filterDate(start_date, end_date) \
+            .filterDate(f'{year}-01-01', f'{year}-12-31') \
             .filterBounds(self.area_of_interest)
-        
-        variables = {
-            'Evap': 'Evap_tavg',
-            'PotEvap': 'PotEvap_tavg',
-            'RootMoist': 'RootMoist_inst'
+
+        def build(doy_number):
+            filtered = collection.filter(
+                ee.Filter.calendarRange(doy_number, doy_number, 'day_of_year'))
+            return filtered, (list(GLDAS_BANDS.values()), list(GLDAS_BANDS))
+
+        return self._doy_composites(build, self._zeros)
+
+    def report_round_trips(self, df):
+        """Log request counts and timings and attach them to the frame"""
+        total = sum(self.round_trips.values())
+        logger.info(f"Earth Engine round trips: {total} {self.round_trips}")
+        df.attrs['round_trips'] = dict(self.round_trips, total=total)
+        df.attrs['timings'] = dict(self.timings)
+
+    def split_by_doy(self, values, variables):
+        """Turn {'EVI_058': v, ...} into {'058': {'EVI': v, ...}, ...}"""
+        return {
+            doy: {var: values.get(f"{var}_{doy}") for var in variables}
+            for doy in self.doy_list
         }
-        
-        for doy in self.doy_list:
-            doy_number = int(doy)
-            filtered = collection.filter(ee.Filter.calendarRange(doy_number, doy_number, 'day_of_year'))
-            
-            if filtered.size().getInfo() > 0:
-                reduced = filtered.mean().reduceRegion(
-                    reducer=ee.Reducer.mean(),
-                    geometry=self.area_of_interest.geometry(),
-                    scale=25000,
-                    maxPixels=1e9
-                )
-                values = reduced.getInfo()
-                
-                gldas_data[doy] = {
-                    'Evap': values['Evap_tavg'],
-                    'PotEvap': values['PotEvap_tavg'],
-                    'RootMoist': values['RootMoist_inst']
-                }
-                # Calculate GLDASws
-                if values['PotEvap_tavg'] != 0:
-                    gldas_data[doy]['GLDASws'] = values['Evap_tavg'] / (values['PotEvap_tavg'] * 0.408 * 1e-6)
-                else:
-                    gldas_data[doy]['GLDASws'] = 0
-                
+
+    def gldas_by_doy(self, values):
+        gldas_data = self.split_by_doy(values, list(GLDAS_BANDS))
+        for data in gldas_data.values():
+            data['GLDASws'] = gldas_water_stress(data['Evap'], data['PotEvap'])
         return gldas_data
 
-    def create_feature_vector(self, year=2023):
-        """Create complete feature vector"""
+    def reduce_regions(self, image, scale, source):
+        """Mean of every band within each input feature, in one request
+
+        Returns:
+            list: One {band: value} dictionary per input feature, in the
+                order of the uploaded FeatureCollection
+        """
+        reduced = self.get_info(image.reduceRegions(
+            collection=self.regions,
+            reducer=ee.Reducer.mean(),
+            scale=scale
+        ), source)
+
+        rows = [{} for _ in range(self.num_regions)]
+        for feature in reduced['features']:
+            properties = feature['properties']
+            rows[int(properties.pop('_index'))] = properties
+        return rows
+
+    def create_feature_matrix(self, year=2023):
+        """Create one feature row per uploaded feature
+
+        Each data source is reduced over all features with a single
+        ``reduceRegions`` request, so the number of Earth Engine round
+        trips does not grow with the number of fields.
+
+        Returns:
+            pandas.DataFrame: (N, 291) features, one row per input feature
+        """
         try:
-            # Get all data
-            logger.info("Getting soil properties...")
-            soil_data = self.get_soil_properties()
-            logger.info("Soil properties obtained")
-
-            logger.info("Getting vegetation indices...")
-            vi_data = self.get_modis_vis(year)
-            logger.info("Vegetation indices obtained")
-
-            logger.info("Getting LST data...")
-            lst_data = self.get_lst_data(year)
-            logger.info("LST data obtained")
-
-            logger.info("Getting weather data...")
-            weather_data = self.get_weather_data(year)
-            logger.info("Weather data obtained")
-
-            logger.info("Getting GLDAS data...")
-            gldas_data = self.get_gldas_data(year)
-            logger.info("GLDAS data obtained")
+            logger.info(f"Extracting features for {self.num_regions} regions")
+            results = self.run_sources({
+                'soil': lambda: self.reduce_regions(self.soil_image(), 250, 'soil'),
+                'modis_vi': lambda: self.reduce_regions(self.modis_vi_image(year), 250, 'modis_vi'),
+                'lst': lambda: self.reduce_regions(self.lst_image(year), 1000, 'lst'),
+                'prism': lambda: self.reduce_regions(self.prism_image(year), 4000, 'prism'),
+                'gldas': lambda: self.reduce_regions(self.gldas_image(year), 25000, 'gldas')
+            })
+            soil, vi, lst, weather, gldas = (results[name] for name in
+                                             ['soil', 'modis_vi', 'lst', 'prism', 'gldas'])
+
+            rows = []
+            for i in range(self.num_regions):
+                soil_data = {var: soil[i].get(var) for var in SOIL_VARIABLES}
+                rows.append(self.assemble_features(
+                    soil_data,
+                    self.split_by_doy(vi[i], VI_VARIABLES),
+                    self.split_by_doy(lst[i], LST_VARIABLES),
+                    self.split_by_doy(weather[i], PRISM_VARIABLES),
+                    self.gldas_by_doy(gldas[i])))
+
+            df = pd.DataFrame(rows)
+            assert df.shape[1] == 291, f"Wrong number of features: {df.shape[1]}"
+            self.report_round_trips(df)
+            return df
+
+        except Exception as e:
+            logger.error(f"Error in create_feature_matrix: {str(e)}")
+            raise
+
+    def create_feature_vector(self, year=2023, soil=True):
+        """Create the feature vector of ``doy_list``, and soil unless
+        ``soil`` is False; complete (291 features) with the defaults"""
+        try:
+            # Get all data; the sources are independent, so fetch them
+            # concurrently
+            logger.info("Getting soil, VI, LST, weather and GLDAS data...")
+            tasks = {}
+            if soil:
+                tasks['soil'] = self.get_soil_properties
+            if self.doy_list:
+                tasks.update({
+                    'modis_vi': lambda: self.get_modis_vis(year),
+                    'lst': lambda: self.get_lst_data(year),
+                    'prism': lambda: self.get_weather_data(year),
+                    'gldas': lambda: self.get_gldas_data(year)
+                })
+            results = self.run_sources(tasks)
+            logger.info(f"All sources obtained: {self.timings}")
             
             # Create feature dictionary
-            features = {}
-            
-            # Add soil properties
-            features.update(soil_data)
-            
-            # Add time series features
-            for doy in self.doy_list:
-                # Log progress for each DOY
-                logger.info(f"Processing DOY {doy}")
-                
-                try:
-                    # Add vegetation indices
-                    for vi in ['EVI', 'NDVI', 'GCI', 'NDWI']:
-                        features[f'{vi}_{doy}'] = vi_data[doy].get(vi, 0)
-                    
-                    # Add LST
-                    for lst in ['LSTday', 'LSTnight']:
-                        features[f'{lst}_{doy}'] = lst_data[doy].get(lst, 0)
-                    
-                    # Add weather variables
-                    for var in ['ppt', 'tmax', 'tmean', 'tmin', 'tdmean', 'vpdmax', 'vpdmean', 'vpdmin']:
-                        features[f'{var}_{doy}'] = weather_data[doy].get(var, 0)
-                    
-                    # Add GLDAS variables
-                    for var in ['Evap', 'PotEvap', 'RootMoist', 'GLDASws']:
-                        features[f'{var}_{doy}'] = gldas_data[doy].get(var, 0)
-                
-                except Exception as e:
-                    logger.error(f"Error processing DOY {doy}: {str(e)}")
-                    # Fill missing values with zeros
-                    logger.warning(f"Filling missing values with zeros for DOY {doy}")
-                    for feature_type in ['EVI', 'NDVI', 'GCI', 'NDWI', 'LSTday', 'LSTnight',
-                                    'ppt', 'tmax', 'tmean', 'tmin', 'tdmean', 'vpdmax', 'vpdmean', 'vpdmin',
-                                    'Evap', 'PotEvap', 'RootMoist', 'GLDASws']:
-                        features[f'{feature_type}_{doy}'] = 0
+            features = self.assemble_features(results.get('soil', {}),
+                                              results.get('modis_vi'),
+                                              results.get('lst'),
+                                              results.get('prism'),
+                                              results.get('gldas'))
             
             # Convert to DataFrame
             df = pd.DataFrame([features])
@@ -372,9 +482,11 @@ class FeatureExtractor:
             # Log feature names and counts
             logger.info(f"Total features created: {df.shape[1]}")
             logger.info(f"Feature names: {list(df.columns)}")
+            self.report_round_trips(df)
             
             # Verify feature count
-            assert df.shape[1] == 291, f"Wrong number of features: {df.shape[1]}"
+            expected = len(SOIL_VARIABLES) * soil + FEATURES_PER_DOY * len(self.doy_list)
+            assert df.shape[1] == expected, f"Wrong number of features: {df.shape[1]}"
             
             return df
             
@@ -382,11 +494,97 @@ class FeatureExtractor:
             logger.error(f"Error in create_feature_vector: {str(e)}")
             raise
 
-def get_features(geojson_path):
-    """Main function to get feature vector"""
+def get_features(geojson_path, year=2023, cache=feature_cache, progress=None):
+    """Main function to get feature vector
+
+    Features are looked up in the persistent cache by the canonical hash of
+    the geometry first. Earth Engine is only asked for the groups (soil or
+    single DOYs) that are missing or expired. ``progress(source, state)``
+    is told about each source in ``SOURCES``, with state 'cached' for
+    those not extracted.
+    """
     try:
-        extractor = FeatureExtractor(geojson_path)
-        return extractor.create_feature_vector()
+        with open(geojson_path) as f:
+            geojson = json.load(f)
+        key = geometry_hash(geojson)
+
+        groups = cache.get_groups(key, year) if cache is not None else {}
+        missing_doys = [doy for doy in DOY_LIST if doy not in groups]
+        need_soil = SOIL_GROUP not in groups
+
+        if not missing_doys and not need_soil:
+            logger.info(f"Feature cache hit for {key[:12]} ({year})")
+            if progress is not None:
+                for source in SOURCES:
+                    progress(source, 'cached')
+            df = pd.DataFrame([{name: value for values in groups.values()
+                                for name, value in values.items()}])
+            df.attrs['round_trips'] = {'total': 0}
+            return df
+
+        if groups:
+            logger.info(f"Feature cache partial hit for {key[:12]} ({year}): "
+                        f"extracting {'soil and ' if need_soil else ''}"
+                        f"DOYs {missing_doys}")
+        extractor = FeatureExtractor(geojson_path, geojson, progress,
+                                     doys=missing_doys)
+        cached_sources = ([] if need_soil else ['soil']) + \
+            ([] if missing_doys else SOURCES[1:])
+        for source in cached_sources:
+            extractor.report(source, 'cached')
+        extracted = extractor.create_feature_vector(year, soil=need_soil)
+        fresh = extracted.iloc[0].to_dict()
+        if cache is not None:
+            cache.put(key, year, fresh)
+
+        # Soil first, then DOYs ascending, as a full extraction orders them
+        for name, value in fresh.items():
+            groups.setdefault(feature_group(name), {})[name] = value
+        order = [SOIL_GROUP] + DOY_LIST
+        df = pd.DataFrame([{name: value for group in order
+                            for name, value in groups[group].items()}])
+        df.attrs['round_trips'] = extracted.attrs['round_trips']
+        df.attrs['timings'] = extracted.attrs['timings']
+        return df
+    except Exception as e:
+        print(f"Error extracting features: {str(e)}")
+        return None
+
+def get_feature_matrix(geojson_path, year=2023, cache=feature_cache):
+    """Get one feature row per feature of a FeatureCollection
+
+    Each feature is cached on its own, so only fields missing from the
+    cache are sent to Earth Engine.
+    """
+    try:
+        with open(geojson_path) as f:
+            geojson = json.load(f)
+        features = geojson.get('features', [geojson])
+        keys = [geometry_hash(feature) for feature in features]
+
+        rows = [cache.get(key, year) if cache is not None else None
+                for key in keys]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        logger.info(f"Feature cache: {len(rows) - len(missing)} of "
+                    f"{len(rows)} fields cached")
+
+        round_trips, timings = {'total': 0}, {}
+        if missing:
+            subset = {'type': 'FeatureCollection',
+                      'features': [features[i] for i in missing]}
+            extractor = FeatureExtractor(geojson_path, subset)
+            extracted = extractor.create_feature_matrix(year)
+            round_trips = extracted.attrs['round_trips']
+            timings = extracted.attrs['timings']
+            for i, row in zip(missing, extracted.to_dict('records')):
+                rows[i] = row
+                if cache is not None:
+                    cache.put(keys[i], year, row)
+
+        df = pd.DataFrame(rows)
+        df.attrs['round_trips'] = round_trips
+        df.attrs['timings'] = timings
+        return df
     except Exception as e:
         print(f"Error extracting features: {str(e)}")
         return None
@@ -0,0 +1,283 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+JOB_STORE_PATH = Path(os.environ.get(
+    'JOB_STORE_PATH',
+    Path(__file__).resolve().parent.parent / 'cache' / 'jobs.sqlite'))
+
+# Finished jobs (and their events) are kept this long, in seconds
+JOB_TTL = int(os.environ.get('JOB_TTL', 7 * 24 * 3600))
+
+# Seconds between heartbeats of the worker running a job, and how long
+# a job may go without one before it is failed as orphaned
+JOB_HEARTBEAT_SECONDS = float(os.environ.get('JOB_HEARTBEAT_SECONDS', 15))
+JOB_STALE_SECONDS = float(os.environ.get('JOB_STALE_SECONDS', 120))
+
+# Progress stages of a prediction job, in pipeline order
+STAGES = ('validate', 'soil', 'vi', 'lst', 'prism', 'gldas', 'inference')
+
+# Job states; succeeded and failed are final
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINAL_STATES = (SUCCEEDED, FAILED)
+
+# Stage states
+STAGE_RUNNING = 'running'
+STAGE_DONE = 'done'
+STAGE_CACHED = 'cached'
+STAGE_FAILED = 'failed'
+
+
+class JobStore:
+    """Prediction jobs and their progress events in a SQLite database
+
+    The database is shared by every gunicorn worker, so a job started in
+    one worker can be polled or streamed from any other. Each stage change
+    is appended to ``job_events`` with an increasing id, which doubles as
+    the SSE event id for resuming a stream.
+
+    Jobs run in the pool of the worker that created them, which records
+    itself as the job's owner and refreshes ``heartbeat_at`` of its
+    unfinished jobs from a background thread. A job whose heartbeat is
+    older than ``stale_after`` seconds lost its worker (restart, OOM,
+    max_requests) and is marked failed on the next read.
+    """
+
+    def __init__(self, path=JOB_STORE_PATH, ttl=JOB_TTL,
+                 heartbeat_interval=JOB_HEARTBEAT_SECONDS,
+                 stale_after=JOB_STALE_SECONDS):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._conn = None
+        self._owner = None
+        self._heartbeat = None
+
+    def _connect(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # WAL lets every gunicorn worker share the same file
+            conn = sqlite3.connect(str(self.path), timeout=30,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    stage TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    owner TEXT,
+                    heartbeat_at REAL
+                )""")
+            # Databases created before jobs had owners
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    message TEXT,
+                    at REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS job_events_job "
+                         "ON job_events (job_id, id)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @property
+    def owner(self):
+        """Token of this worker process, new after every fork
+
+        A pid alone could be reused by the worker that replaces a dead one
+        and revive its jobs.
+        """
+        pid = os.getpid()
+        if self._owner is None or self._owner[0] != pid:
+            self._owner = (pid, f"{pid}-{uuid.uuid4().hex[:8]}")
+            self._heartbeat = None
+        return self._owner[1]
+
+    def _ensure_heartbeat(self):
+        owner = self.owner
+        if self._heartbeat is None or not self._heartbeat.is_alive():
+            self._heartbeat = threading.Thread(target=self._beat, args=(owner,),
+                                               name='job-heartbeat', daemon=True)
+            self._heartbeat.start()
+
+    def _beat(self, owner):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                with self._lock:
+                    conn = self._connect()
+                    conn.execute(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? "
+                        "AND status NOT IN (?, ?)",
+                        (time.time(), owner) + FINAL_STATES)
+                    conn.commit()
+            except Exception as e:
+                logger.error(f"Job heartbeat failed: {str(e)}")
+
+    def _append(self, conn, job_id, stage, state, message, now):
+        conn.execute(
+            "INSERT INTO job_events (job_id, stage, state, message, at) "
+            "VALUES (?, ?, ?, ?, ?)", (job_id, stage, state, message, now))
+
+    def create(self, mode):
+        """Register a new queued job and return its id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._ensure_heartbeat()
+        with self._lock:
+            conn = self._connect()
+            self._prune(conn, now)
+            conn.execute(
+                "INSERT INTO jobs (id, status, mode, created_at, updated_at, "
+                "owner, heartbeat_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, mode, now, now, self.owner, now))
+            self._append(conn, job_id, 'job', QUEUED, None, now)
+            conn.commit()
+        return job_id
+
+    def stage(self, job_id, stage, state, message=None):
+        """Record a stage entering ``state``; the first running stage marks
+        a queued job as running"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE jobs SET stage = ?, updated_at = ? WHERE id = ?",
+                (stage, now, job_id))
+            if state == STAGE_RUNNING:
+                conn.execute(
+                    "UPDATE jobs SET status = ? WHERE id = ? AND status = ?",
+                    (RUNNING, job_id, QUEUED))
+            self._append(conn, job_id, stage, state, message, now)
+            conn.commit()
+
+    def finish(self, job_id, result):
+        """Store the result of a successful job"""
+        self._close(job_id, SUCCEEDED, result=json.dumps(result))
+
+    def fail(self, job_id, error):
+        """Mark a job as failed with an error message"""
+        self._close(job_id, FAILED, error=str(error))
+
+    def _close(self, job_id, status, result=None, error=None):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, "
+                "updated_at = ? WHERE id = ?",
+                (status, result, error, now, job_id))
+            self._append(conn, job_id, 'job', status, error, now)
+            conn.commit()
+
+    def get(self, job_id):
+        """The job as a dict, or None if it is unknown (or expired)"""
+        with self._lock:
+            conn = self._connect()
+            self._fail_stale(conn, time.time())
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "mode": row["mode"],
+            "stage": row["stage"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+    def events(self, job_id, after=0):
+        """Events of a job with an id greater than ``after``, oldest first"""
+        with self._lock:
+            conn = self._connect()
+            self._fail_stale(conn, time.time())
+            rows = conn.execute(
+                "SELECT id, stage, state, message, at FROM job_events "
+                "WHERE job_id = ? AND id > ? ORDER BY id",
+                (job_id, int(after))).fetchall()
+        return [dict(row) for row in rows]
+
+    def fail_stale(self):
+        """Fail every unfinished job whose worker stopped sending heartbeats
+
+        Returns:
+            int: Number of jobs failed
+        """
+        with self._lock:
+            return self._fail_stale(self._connect(), time.time())
+
+    def _fail_stale(self, conn, now):
+        cutoff = now - self.stale_after
+        stale = [row[0] for row in conn.execute(
+            "SELECT id FROM jobs WHERE status NOT IN (?, ?) "
+            "AND COALESCE(heartbeat_at, updated_at) < ?",
+            FINAL_STATES + (cutoff,))]
+        if not stale:
+            return 0
+        error = "The worker running this job stopped; submit it again"
+        conn.executemany(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+            "WHERE id = ? AND status NOT IN (?, ?)",
+            [(FAILED, error, now, job_id) + FINAL_STATES for job_id in stale])
+        for job_id in stale:
+            self._append(conn, job_id, 'job', FAILED, error, now)
+        conn.commit()
+        logger.warning(f"Failed {len(stale)} orphaned jobs")
+        return len(stale)
+
+    def _prune(self, conn, now):
+        cutoff = now - self.ttl
+        expired = [row[0] for row in conn.execute(
+            "SELECT id FROM jobs WHERE updated_at < ? AND status IN (?, ?)",
+            (cutoff,) + FINAL_STATES)]
+        if expired:
+            conn.executemany("DELETE FROM job_events WHERE job_id = ?",
+                             [(job_id,) for job_id in expired])
+            conn.executemany("DELETE FROM jobs WHERE id = ?",
+                             [(job_id,) for job_id in expired])
+            logger.info(f"Pruned {len(expired)} finished jobs")
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._connect().execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            "path": str(self.path),
+            "ttl_seconds": self.ttl,
+            "stale_after_seconds": self.stale_after,
+            **{status: counts.get(status, 0)
+               for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+        }
+
+
+job_store = JobStore()
@@ -0,0 +1,247 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS_DIR = Path(__file__).resolve().parent.parent / 'weights'
+
+# Network layout used by every checkpoint served by the API
+NUM_FEATURES = 293
+FEATURE_EXTRACTOR_NN = [NUM_FEATURES, 256, 128]
+OUTPUT_NN = [64, 32, 1]
+
+DEFAULT_MODEL = 'BNN2'
+
+# "numpy" serves from the TensorFlow-free engine in utils.bnn_numpy,
+# "tensorflow" from the original Keras model
+BACKEND = os.environ.get('BNN_BACKEND', 'numpy')
+
+# "sample": one flipout pass (the historical /api/model behaviour),
+# "map": posterior means only, "monte_carlo": batched posterior sampling,
+# "moments": deterministic moment propagation
+MODES = ("sample", "map", "monte_carlo", "moments")
+
+
+class WarmModel:
+    """A BayesianDensityNetwork loaded once and kept warm for serving
+
+    The weights are read a single time. With the TensorFlow backend the
+    forward pass is also traced with an unknown batch dimension, so every
+    later call reuses the same concrete function instead of rebuilding
+    the Keras graph.
+    """
+
+    def __init__(self, name, weights_path, backend=BACKEND):
+        self.name = name
+        self.weights_path = Path(weights_path)
+        self.backend = backend
+        self.warm = False
+        self.load_time = None
+        self.loaded_at = None
+        self.error = None
+        self._model = None
+        self._passes = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Restore the checkpoint and prepare every inference pass"""
+        start = time.perf_counter()
+        if self.backend == 'tensorflow':
+            model, passes = self._load_tensorflow()
+        else:
+            model, passes = self._load_numpy()
+
+        with self._lock:
+            self._model = model
+            self._passes = passes
+            self.load_time = time.perf_counter() - start
+            self.loaded_at = datetime.now(timezone.utc)
+            self.warm = True
+            self.error = None
+
+        logger.info(f"Loaded model {self.name} ({self.backend}) "
+                    f"in {self.load_time:.2f}s")
+
+    def _load_numpy(self):
+        from utils.bnn_numpy import NumpyBayesianDensityNetwork
+
+        model = NumpyBayesianDensityNetwork.load(self.weights_path)
+        passes = {
+            "sample": lambda x: model(x, sampling=True),
+            "map": lambda x: model(x, sampling=False),
+            "samples": model.call_samples,
+            "moments": model.call_moments,
+        }
+        return model, passes
+
+    def _load_tensorflow(self):
+        import tensorflow as tf
+        from utils.Dual_BNN_untrainable import BayesianDensityNetwork
+
+        model = BayesianDensityNetwork(FEATURE_EXTRACTOR_NN, OUTPUT_NN)
+        model.load_weights(str(self.weights_path)).expect_partial()
+
+        signature = [tf.TensorSpec([None, NUM_FEATURES], tf.float32)]
+        passes = {
+            "sample": tf.function(lambda x: model(x, sampling=True),
+                                  input_signature=signature),
+            "map": tf.function(lambda x: model(x, sampling=False),
+                               input_signature=signature),
+            "samples": tf.function(
+                lambda x, n: model.call_samples(x, n),
+                input_signature=signature + [tf.TensorSpec([], tf.int32)]),
+            "moments": tf.function(model.call_moments,
+                                   input_signature=signature),
+        }
+
+        # Trace every pass so the first request does not pay for it
+        dummy = np.zeros((1, NUM_FEATURES), dtype=np.float32)
+        for name, fn in passes.items():
+            fn(dummy, 2) if name == "samples" else fn(dummy)
+
+        return model, passes
+
+    def _run(self, name, batch, *args):
+        if not self.warm:
+            raise RuntimeError(f"Model {self.name} is not loaded")
+
+        batch = np.asarray(batch, dtype=np.float32).reshape(-1, NUM_FEATURES)
+        with self._lock:
+            return self._passes[name](batch, *args)
+
+    def predict(self, batch, sampling=True):
+        """Run the forward pass on a (N, 293) batch
+
+        Args:
+            batch (array-like): Model inputs, one row per sample
+            sampling (bool): Sample the weights (True) or use the MAP
+                estimates (False)
+
+        Returns:
+            numpy.ndarray: (N, 2) array of mean and std predictions
+        """
+        return np.asarray(self._run("sample" if sampling else "map", batch))
+
+    def posterior(self, batch, n_samples=100):
+        """Monte Carlo posterior summary for a whole batch in one pass
+
+        Args:
+            batch (array-like): Model inputs, one row per sample
+            n_samples (int): Number of weight samples to draw
+
+        Returns:
+            dict: Per-row ``mean``, ``epistemic`` and ``aleatoric`` arrays,
+                the uncertainties expressed as standard deviations
+        """
+        draws = np.asarray(self._run("samples", batch, int(n_samples)))
+        return {
+            "mean": draws[:, :, 0].mean(axis=0),
+            "epistemic": draws[:, :, 0].std(axis=0),
+            "aleatoric": np.sqrt((draws[:, :, 1]**2).mean(axis=0))
+        }
+
+    def moments(self, batch):
+        """Deterministic moment-propagation summary for a whole batch
+
+        Returns:
+            dict: Same keys as ``posterior``, computed in a single pass
+        """
+        means, variances = self._run("moments", batch)
+        means = np.asarray(means)
+        variances = np.asarray(variances)
+        return {
+            "mean": means[:, 0],
+            "epistemic": np.sqrt(variances[:, 0]),
+            "aleatoric": np.sqrt(means[:, 1]**2 + variances[:, 1])
+        }
+
+    def infer(self, batch, mode="sample", n_samples=100):
+        """Summarise a batch with the requested inference mode
+
+        Args:
+            batch (array-like): Model inputs, one row per sample
+            mode (str): One of ``MODES``
+            n_samples (int): Weight samples for ``monte_carlo``
+
+        Returns:
+            dict: Per-row ``mean`` and ``aleatoric`` arrays, plus
+                ``epistemic`` for the modes that estimate it (else None)
+        """
+        if mode == "monte_carlo":
+            return self.posterior(batch, n_samples)
+        if mode == "moments":
+            return self.moments(batch)
+        if mode not in ("sample", "map"):
+            raise ValueError(f"Unknown inference mode: {mode}")
+
+        preds = self.predict(batch, sampling=mode == "sample")
+        return {"mean": preds[:, 0], "epistemic": None, "aleatoric": preds[:, 1]}
+
+    def status(self):
+        """Load time and warm status for health reporting"""
+        return {
+            "warm": self.warm,
+            "backend": self.backend,
+            "weights_path": str(self.weights_path),
+            "load_time_seconds": self.load_time,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "error": self.error
+        }
+
+
+class ModelRegistry:
+    """Process-wide collection of warm models keyed by checkpoint name"""
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, weights_path=None):
+        """Register a checkpoint; it is loaded by ``load_all`` or lazily"""
+        if weights_path is None:
+            weights_path = WEIGHTS_DIR / name
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = WarmModel(name, weights_path)
+            return self._models[name]
+
+    def load_all(self):
+        """Load every registered checkpoint, recording failures per model"""
+        for model in list(self._models.values()):
+            if model.warm:
+                continue
+            try:
+                model.load()
+            except Exception as e:
+                model.error = str(e)
+                logger.error(f"Failed to load model {model.name}: {str(e)}")
+
+    def get(self, name=DEFAULT_MODEL):
+        """Return a warm model, loading it on first use if needed"""
+        model = self._models.get(name) or self.register(name)
+        if not model.warm:
+            with self._lock:
+                if not model.warm:
+                    model.load()
+        return model
+
+    def predict(self, batch, name=DEFAULT_MODEL, sampling=True):
+        """Thread-safe prediction with the named model"""
+        return self.get(name).predict(batch, sampling=sampling)
+
+    def infer(self, batch, mode="sample", n_samples=100, name=DEFAULT_MODEL):
+        """Thread-safe inference with the named model and mode"""
+        return self.get(name).infer(batch, mode=mode, n_samples=n_samples)
+
+    def status(self):
+        return {name: model.status() for name, model in self._models.items()}
+
+
+registry = ModelRegistry()
+registry.register(DEFAULT_MODEL)
@@ -0,0 +1,88 @@
+import logging
+
+import numpy as np
+import shapely
+
+from utils.result_store import result_store, to_python, PREDICTION, UNCERTAINTY
+from utils.spatial_index import county_index, geojson_geometry
+
+logger = logging.getLogger(__name__)
+
+
+def county_overlaps(geometry, index=county_index):
+    """FIPS of the counties a geometry overlaps and the overlapping areas
+
+    Areas are in square degrees. Only their ratios are used, and the
+    counties under one field lie close enough together for the latitude
+    distortion to cancel out.
+    """
+    index.warm()
+    candidates = index.tree.query(geometry, predicate='intersects')
+    areas = shapely.area(shapely.intersection(index.polygons[candidates], geometry))
+    overlapping = areas > 0
+    return index.polygon_fips[candidates[overlapping]], areas[overlapping]
+
+
+def provisional_estimate(geojson, crop="corn", snapshot=None, index=county_index):
+    """Area-weighted county estimate for a field, available immediately
+
+    The newest in-season result file of the crop is looked up for every
+    county the field overlaps, and the county predictions are averaged with
+    the overlapping areas as weights. The uncertainty is that of the
+    resulting mixture: the weighted county variances plus the spread of
+    the county predictions around the mean.
+
+    Args:
+        geojson (dict): GeoJSON geometry, Feature or FeatureCollection
+        crop (str): corn or soybean
+        snapshot (ResultSnapshot): Results to use; the current ones if None
+
+    Returns:
+        dict: The estimate, its source file and the contributing counties,
+            or None when the field overlaps no county with a prediction or
+            its geometry cannot be overlaid
+    """
+    snapshot = snapshot or result_store.snapshot
+    latest = snapshot.latest(crop)
+    if latest is None:
+        return None
+    year, doy = latest
+
+    try:
+        geometry = geojson_geometry(geojson)
+        if not geometry.is_valid:
+            # A self-intersecting field such as a bowtie makes the overlay
+            # fail; its valid equivalent covers the same area
+            geometry = shapely.make_valid(geometry)
+        fips, areas = county_overlaps(geometry, index)
+    except shapely.errors.GEOSException as e:
+        logger.warning(f"No provisional estimate for an unusable geometry: {str(e)}")
+        return None
+    weight_of = dict(zip(fips.tolist(), areas.tolist()))
+    found, values = snapshot.counties(crop, year, fips, doy)
+    if not len(found):
+        return None
+
+    weights = np.array([weight_of[code] for code in found.tolist()])
+    covered = weights.sum()
+    weights = weights / covered
+    predictions = values[:, PREDICTION].astype(np.float64)
+    uncertainties = values[:, UNCERTAINTY].astype(np.float64)
+
+    mean = float(weights @ predictions)
+    variance = float(weights @ (uncertainties ** 2 + (predictions - mean) ** 2))
+
+    return {
+        "prediction": [round(mean, 4), round(np.sqrt(variance), 4)],
+        "crop": crop,
+        "year": year,
+        "doy": doy,
+        "coverage": round(float(covered / geometry.area), 4) if geometry.area else None,
+        "counties": [
+            {"FIPS": code, "weight": round(float(weight), 4),
+             "prediction": prediction, "uncertainty": uncertainty}
+            for code, weight, prediction, uncertainty in zip(
+                found.tolist(), weights,
+                to_python(values[:, PREDICTION]), to_python(values[:, UNCERTAINTY]))
+        ]
+    }
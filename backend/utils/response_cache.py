@@ -0,0 +1,180 @@
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is in requirements.txt
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 256))
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+
+def _finite(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def encode_json(content):
+    """Serialise ``content`` to compact JSON bytes, NaN and Inf as null"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(_finite(content), separators=(',', ':')).encode()
+
+
+class EncodedBody:
+    """One response body, serialised once, with its compressed variants
+
+    Each variant is a distinct representation and has its own strong
+    ETag: the hash of the uncompressed body, suffixed with the coding for
+    compressed variants.
+    """
+
+    def __init__(self, body, media_type="application/json", compress=True):
+        self.media_type = media_type
+        self.variants = {"identity": body}
+        if compress and len(body) >= MIN_COMPRESS_BYTES:
+            self.variants["gzip"] = gzip.compress(body, compresslevel=6, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=5)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etags = {coding: f'"{digest}"' if coding == "identity"
+                      else f'"{digest}-{coding}"' for coding in self.variants}
+
+    @property
+    def nbytes(self):
+        return sum(len(variant) for variant in self.variants.values())
+
+
+def _accepted_codings(header):
+    """Content codings in an Accept-Encoding header that have q > 0"""
+    codings = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            codings.add(coding.lower())
+    return codings
+
+
+def etag_matches(if_none_match, *etags):
+    """Whether an If-None-Match header matches any of ``etags``
+
+    Uses the weak comparison RFC 9110 prescribes for If-None-Match, so a
+    ``W/`` prefix on either side is ignored.
+    """
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or any(etag.removeprefix("W/") in tags for etag in etags)
+
+
+def encoded_response(request, encoded, headers=None):
+    """Raw Response for a cached body, negotiating the content coding
+
+    Answers ``304 Not Modified`` when If-None-Match carries the ETag of
+    any variant of the body, as they only differ in their coding; the 304
+    carries the ETag of the variant that would have been sent.
+    """
+    accepted = _accepted_codings(request.headers.get("accept-encoding"))
+    coding = next((coding for coding in ("br", "gzip")
+                   if coding in accepted and coding in encoded.variants), "identity")
+
+    headers = {"ETag": encoded.etags[coding], "Vary": "Accept-Encoding",
+               "Cache-Control": "no-cache", **(headers or {})}
+    if etag_matches(request.headers.get("if-none-match"), *encoded.etags.values()):
+        return Response(status_code=304, headers=headers)
+
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return Response(encoded.variants[coding],
+                    media_type=encoded.media_type, headers=headers)
+
+
+class ResponseCache:
+    """Encoded response bodies keyed by route key and data version
+
+    ``get(key, version, build)`` returns the cached EncodedBody while the
+    version (a file's mtime and size, a store's reload counter, ...) is
+    unchanged and otherwise calls ``build()`` for fresh content, so a
+    payload is serialised and compressed once per version. Least recently
+    used keys are dropped beyond ``max_entries``.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, build, media_type="application/json",
+            compress=True):
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        # Built outside the lock; a concurrent miss just builds twice
+        content = build()
+        body = content if isinstance(content, bytes) else encode_json(content)
+        encoded = EncodedBody(body, media_type, compress)
+
+        with self._lock:
+            self._entries[key] = (version, encoded)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return encoded
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(encoded.nbytes for _, encoded in self._entries.values()),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "brotli": brotli is not None
+            }
+
+
+def file_version(path):
+    """Version of a file for ResponseCache: its mtime and size"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+response_cache = ResponseCache()
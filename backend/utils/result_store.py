@@ -0,0 +1,359 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from utils.catalog import BNN, CROPS, END_OF_SEASON, catalog
+
+logger = logging.getLogger(__name__)
+
+# Seconds between polls of the result directories for new or changed files
+POLL_INTERVAL = float(os.environ.get('RESULT_POLL_SECONDS', 30))
+
+# Columns of every result CSV, stored along the last axis of the cube
+FIELDS = ("y_test_pred", "y_test", "y_test_pred_uncertainty")
+PREDICTION, ACTUAL, UNCERTAINTY = range(len(FIELDS))
+
+
+def to_python(values):
+    """float32 values as Python floats with their shortest decimal repr
+
+    Going through the float32 string keeps 18.496082 from turning into
+    18.496082305908203 in JSON responses.
+    """
+    return np.asarray(values, dtype=np.float32).astype(str).astype(float).tolist()
+
+
+class ResultSnapshot:
+    """Immutable, dense view of every result CSV
+
+    ``values`` is a float32 array indexed [crop, year, doy, county, field]
+    holding NaN where a file or county is missing, ``fips`` the county
+    codes along the county axis and ``doys`` the DOY labels along the DOY
+    axis, END_OF_SEASON first. ``orders`` keeps the county rows of each
+    file in their original order.
+    """
+
+    def __init__(self, crops, years, doys, fips, values, files, orders):
+        self.crops = list(crops)
+        self.years = list(years)
+        self.doys = list(doys)
+        self.fips = np.asarray(fips, dtype=np.int64)
+        self.values = values
+        self.files = files
+        self.orders = orders
+        # Reload counter of the store that built this snapshot
+        self.version = 0
+        self.crop_index = {crop: i for i, crop in enumerate(self.crops)}
+        self.year_index = {year: i for i, year in enumerate(self.years)}
+        self.doy_index = {doy: i for i, doy in enumerate(self.doys)}
+        self.row_index = {int(code): i for i, code in enumerate(self.fips)}
+
+        # Which (crop, year, doy) slots came from a file
+        self.present = np.zeros(values.shape[:3], dtype=bool)
+        for crop, year, doy in files:
+            self.present[self.crop_index[crop], self.year_index[year],
+                         self.doy_index[doy]] = True
+
+    def _slot(self, crop, year, doy):
+        try:
+            return (self.crop_index[crop], self.year_index[int(year)],
+                    self.doy_index[doy])
+        except KeyError:
+            return None
+
+    def has(self, crop, year, doy=END_OF_SEASON):
+        """Whether result{year}[_doy].csv exists for the crop"""
+        slot = self._slot(crop, year, doy)
+        return slot is not None and bool(self.present[slot])
+
+    def available_doys(self, crop, year):
+        """In-season DOY labels with a file for the crop and year"""
+        if crop not in self.crop_index or int(year) not in self.year_index:
+            return []
+        mask = self.present[self.crop_index[crop], self.year_index[int(year)]]
+        return [doy for doy, present in zip(self.doys, mask)
+                if present and doy != END_OF_SEASON]
+
+    def latest(self, crop):
+        """(year, doy) of the newest in-season file of a crop, or None"""
+        for year in reversed(self.years):
+            doys = self.available_doys(crop, year)
+            if doys:
+                return year, doys[-1]
+        return None
+
+    def county(self, crop, year, fips, doy=END_OF_SEASON):
+        """{prediction, actual, uncertainty} of one county, or None"""
+        slot = self._slot(crop, year, doy)
+        row = self.row_index.get(int(fips))
+        if slot is None or row is None:
+            return None
+        values = self.values[slot + (row,)]
+        if np.isnan(values[PREDICTION]):
+            return None
+        prediction, actual, uncertainty = to_python(values)
+        return {"prediction": prediction, "actual": actual,
+                "uncertainty": uncertainty}
+
+    def in_season(self, crop, year, fips):
+        """{doy: {prediction, actual, uncertainty}} over every in-season file"""
+        row = self.row_index.get(int(fips))
+        if row is None:
+            return {}
+        predictions = {}
+        for doy in self.available_doys(crop, year):
+            prediction = self.county(crop, year, fips, doy)
+            if prediction is not None:
+                predictions[doy] = prediction
+        return predictions
+
+    def series(self, crop, fips):
+        """Every year and DOY of some counties, sliced from the cube
+
+        Only years and DOYs with at least one file for the crop are kept,
+        and only counties the store knows, in input order.
+
+        Returns:
+            tuple: (years, doys, fips, values) with ``values`` a float32
+                [county, year, doy, field] array along FIELDS, NaN where a
+                file or county value is missing; None for an unknown crop
+        """
+        if crop not in self.crop_index:
+            return None
+        present = self.present[self.crop_index[crop]]
+        years = np.flatnonzero(present.any(axis=1))
+        doys = np.flatnonzero(present.any(axis=0))
+        fips = np.asarray(fips, dtype=np.int64)
+        rows = np.array([self.row_index.get(code, -1) for code in fips.tolist()],
+                        dtype=np.int64)
+        fips, rows = fips[rows >= 0], rows[rows >= 0]
+
+        block = self.values[self.crop_index[crop]][np.ix_(years, doys, rows)]
+        return ([self.years[i] for i in years], [self.doys[i] for i in doys],
+                fips, block.transpose(2, 0, 1, 3))
+
+    def rows(self, crop, year, doy=END_OF_SEASON):
+        """(fips, values) of one file in its row order, or None if missing
+
+        ``values`` is a float32 [county, field] array along FIELDS.
+        """
+        if not self.has(crop, year, doy):
+            return None
+        rows = self.orders[(crop, int(year), doy)]
+        return self.fips[rows], self.values[self._slot(crop, year, doy)][rows]
+
+    def counties(self, crop, year, fips, doy=END_OF_SEASON):
+        """(fips, values) of those of the given counties with a prediction
+
+        Keeps the order of ``fips``; ``values`` is a float32 [county, field]
+        array along FIELDS.
+        """
+        fips = np.asarray(fips, dtype=np.int64)
+        slot = self._slot(crop, year, doy)
+        if slot is None or not self.present[slot]:
+            return fips[:0], np.empty((0, len(FIELDS)), dtype=np.float32)
+        rows = np.array([self.row_index.get(code, -1) for code in fips.tolist()],
+                        dtype=np.int64)
+        known = rows >= 0
+        fips, values = fips[known], self.values[slot][rows[known]]
+        predicted = ~np.isnan(values[:, PREDICTION])
+        return fips[predicted], values[predicted]
+
+    def frame(self, crop, year, doy=END_OF_SEASON):
+        """One file as a DataFrame of FIPS plus float32 FIELDS, or None"""
+        if not self.has(crop, year, doy):
+            return None
+        block = self.values[self._slot(crop, year, doy)]
+        rows = self.orders[(crop, int(year), doy)]
+        df = pd.DataFrame(block[rows], columns=list(FIELDS))
+        df.insert(0, "FIPS", self.fips[rows])
+        return df
+
+    def table(self, crop, year, doy=END_OF_SEASON):
+        """Records of one file as FIPS plus FIELDS, or None if it is missing"""
+        if not self.has(crop, year, doy):
+            return None
+        block = self.values[self._slot(crop, year, doy)]
+        rows = self.orders[(crop, int(year), doy)]
+        columns = zip(self.fips[rows].tolist(),
+                      *zip(*to_python(block[rows])))
+        return [dict(zip(("FIPS",) + FIELDS, record)) for record in columns]
+
+
+def read_result_file(path):
+    return pd.read_csv(path, usecols=["FIPS", *FIELDS])
+
+
+def assemble_snapshot(frames, crops=CROPS):
+    """Lay already parsed result frames out as a ResultSnapshot
+
+    Args:
+        frames (dict): (crop, year, doy) -> (path, DataFrame)
+    """
+    years = sorted({year for _, year, _ in frames})
+    doys = [END_OF_SEASON] + sorted({doy for _, _, doy in frames
+                                     if doy != END_OF_SEASON}, key=int)
+    fips = sorted(set().union(*(set(df["FIPS"]) for _, df in frames.values())))
+    row_index = {code: i for i, code in enumerate(fips)}
+
+    crop_index = {crop: i for i, crop in enumerate(crops)}
+    year_index = {year: i for i, year in enumerate(years)}
+    doy_index = {doy: i for i, doy in enumerate(doys)}
+
+    values = np.full((len(crops), len(years), len(doys), len(fips), len(FIELDS)),
+                     np.nan, dtype=np.float32)
+    files, orders = {}, {}
+    for (crop, year, doy), (path, df) in frames.items():
+        rows = df["FIPS"].map(row_index).to_numpy()
+        values[crop_index[crop], year_index[year], doy_index[doy], rows] = \
+            df[list(FIELDS)].to_numpy(dtype=np.float32)
+        files[(crop, year, doy)] = path
+        orders[(crop, year, doy)] = rows
+
+    return ResultSnapshot(crops, years, doys, fips, values, files, orders)
+
+
+def build_snapshot(catalog=catalog, crops=CROPS):
+    """Read every catalogued result CSV into a ResultSnapshot"""
+    frames = {key: (path, read_result_file(path)) for key, (path, _) in
+              catalog.manifest(BNN).items()}
+    return assemble_snapshot(frames, crops)
+
+
+class ResultStore:
+    """Per-worker holder of the current ResultSnapshot
+
+    The snapshot is built at startup (or on first use) and kept current by
+    ``refresh``, which a background thread calls every ``poll_interval``
+    seconds. A refresh rescans the catalog and re-reads only the result
+    files whose mtime or size changed,
+    builds a complete new snapshot and swaps it in with one assignment, so
+    readers never see a half-loaded store.
+    """
+
+    def __init__(self, catalog=catalog, crops=CROPS,
+                 poll_interval=POLL_INTERVAL):
+        self.catalog = catalog
+        self.crops = crops
+        self.poll_interval = poll_interval
+        self.loaded_at = None
+        self.load_time = None
+        self.reloads = 0
+        self.last_changes = None
+        self.last_error = None
+        self._snapshot = None
+        self._manifest = {}
+        self._frames = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.RLock()
+        self._watcher = None
+        self._listeners = []
+
+    def subscribe(self, callback):
+        """Call ``callback(snapshot)`` with every newly loaded snapshot"""
+        self._listeners.append(callback)
+
+    def load(self):
+        """(Re)build the snapshot, reading new or changed files only"""
+        return self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """Pick up added, changed and removed result files
+
+        Returns:
+            dict: Keys added, changed and removed since the last refresh
+        """
+        with self._load_lock:
+            start = time.perf_counter()
+            self.catalog.refresh()
+            manifest = self.catalog.manifest(BNN)
+
+            added = [key for key in manifest if key not in self._manifest]
+            changed = [key for key in manifest if key in self._manifest
+                       and manifest[key] != self._manifest[key]]
+            removed = [key for key in self._manifest if key not in manifest]
+            if not (added or changed or removed or force):
+                return {"added": [], "changed": [], "removed": []}
+
+            frames = dict(self._frames)
+            for key in removed:
+                frames.pop(key, None)
+            for key in added + changed:
+                path = manifest[key][0]
+                frames[key] = (path, read_result_file(path))
+
+            snapshot = assemble_snapshot(frames, self.crops)
+            snapshot.version = self.reloads + 1
+            with self._lock:
+                self._frames = frames
+                self._manifest = manifest
+                self._snapshot = snapshot
+                self.load_time = time.perf_counter() - start
+                self.loaded_at = datetime.now(timezone.utc)
+                self.reloads += 1
+                self.last_changes = {"added": len(added),
+                                     "changed": len(changed),
+                                     "removed": len(removed)}
+
+        logger.info(f"Loaded {len(snapshot.files)} result files for "
+                    f"{len(snapshot.fips)} counties in {self.load_time:.2f}s "
+                    f"({self.last_changes})")
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                # Derived tables fall back to being built on first use
+                logger.error(f"Result store listener failed: {str(e)}")
+        return {"added": added, "changed": changed, "removed": removed}
+
+    def start_watcher(self):
+        """Poll the result directories in a daemon thread of this worker"""
+        if self.poll_interval <= 0:
+            return
+        if self._watcher is None or not self._watcher.is_alive():
+            self._watcher = threading.Thread(target=self._watch,
+                                             name='result-store-watcher',
+                                             daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                # Keep serving the previous snapshot
+                self.last_error = str(e)
+                logger.error(f"Result store refresh failed: {str(e)}")
+
+    @property
+    def snapshot(self):
+        if self._snapshot is None:
+            with self._load_lock:
+                if self._snapshot is None:
+                    self.refresh(force=True)
+        return self._snapshot
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            "loaded": snapshot is not None,
+            "files": len(snapshot.files) if snapshot is not None else 0,
+            "counties": len(snapshot.fips) if snapshot is not None else 0,
+            "nbytes": snapshot.values.nbytes if snapshot is not None else 0,
+            "load_time_seconds": self.load_time,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "reloads": self.reloads,
+            "last_changes": self.last_changes,
+            "poll_interval_seconds": self.poll_interval,
+            "last_error": self.last_error
+        }
+
+
+result_store = ResultStore()
@@ -0,0 +1,255 @@
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import box, shape
+from shapely.ops import unary_union
+from scipy.spatial import cKDTree
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+COUNTY_GEOJSON = BASE_DIR / 'data' / 'gz_2010_us_050_00_20m.json'
+COUNTY_INFO = BASE_DIR / 'data' / 'county_info.csv'
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _unit_vectors(lat, lon):
+    """Points on the unit sphere, so chord order matches great-circle order"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon),
+                            np.cos(lat) * np.sin(lon),
+                            np.sin(lat)])
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def geojson_geometry(geojson, repair=False):
+    """Shapely geometry of a GeoJSON geometry, Feature or FeatureCollection
+
+    The features of a collection are unioned. With ``repair``, invalid
+    geometries such as self-intersecting polygons are made valid first,
+    so the union cannot fail on them.
+    """
+    def to_shape(geometry):
+        geometry = shape(geometry)
+        if repair and not geometry.is_valid:
+            geometry = shapely.make_valid(geometry)
+        return geometry
+
+    if geojson["type"] == "FeatureCollection":
+        return unary_union([to_shape(feature["geometry"])
+                            for feature in geojson["features"]])
+    if geojson["type"] == "Feature":
+        return to_shape(geojson["geometry"])
+    return to_shape(geojson)
+
+
+class CountyIndex:
+    """Spatial indexes over the counties, built once per worker
+
+    County polygons from the census boundary file go into an STRtree for
+    bounding-box and polygon queries; the centroids in county_info.csv go
+    into a KD-tree over unit vectors for nearest-neighbour queries. Every
+    query returns FIPS codes, to look predictions up in the result store.
+    """
+
+    def __init__(self, geojson_path=COUNTY_GEOJSON, info_path=COUNTY_INFO):
+        self.geojson_path = Path(geojson_path)
+        self.info_path = Path(info_path)
+        self.build_time = None
+        self._lock = threading.Lock()
+        self._built = False
+
+    def warm(self):
+        """Build the indexes now rather than on the first query"""
+        self._ensure_built()
+
+    def _ensure_built(self):
+        if self._built:
+            return
+        with self._lock:
+            if self._built:
+                return
+            start = time.perf_counter()
+            with open(self.geojson_path, encoding='latin-1') as f:
+                features = json.load(f)['features']
+            self.polygon_fips = np.array(
+                [int(feature['properties']['GEO_ID'][-5:]) for feature in features],
+                dtype=np.int64)
+            self.polygons = np.array([shape(feature['geometry'])
+                                      for feature in features], dtype=object)
+            self.names = dict(zip(self.polygon_fips.tolist(),
+                                  (feature['properties']['NAME'] for feature in features)))
+            self.tree = shapely.STRtree(self.polygons)
+            # Prepared polygons speed up the point-in-polygon tests of
+            # the FIPS resolver
+            shapely.prepare(self.polygons)
+
+            info = pd.read_csv(self.info_path, usecols=['FIPS', 'NAME', 'lat', 'lon'])
+            info = info.dropna(subset=['lat', 'lon'])
+            self.centroid_fips = info['FIPS'].to_numpy(dtype=np.int64)
+            for code, name in zip(self.centroid_fips.tolist(), info['NAME']):
+                self.names.setdefault(code, name)
+            self.kdtree = cKDTree(_unit_vectors(info['lat'].to_numpy(),
+                                                info['lon'].to_numpy()))
+
+            self.build_time = time.perf_counter() - start
+            self._built = True
+            logger.info(f"Spatial index over {len(self.polygons)} polygons and "
+                        f"{len(self.centroid_fips)} centroids built in "
+                        f"{self.build_time:.2f}s")
+
+    def name(self, fips):
+        self._ensure_built()
+        return self.names.get(int(fips))
+
+    def within_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """FIPS of the counties whose polygon intersects a bounding box"""
+        return self.intersecting(box(min_lon, min_lat, max_lon, max_lat))
+
+    def intersecting(self, geometry):
+        """FIPS of the counties whose polygon intersects a geometry
+
+        Args:
+            geometry: A shapely geometry or a GeoJSON geometry dict
+        """
+        self._ensure_built()
+        if isinstance(geometry, dict):
+            geometry = shape(geometry)
+        hits = self.tree.query(geometry, predicate='intersects')
+        return self.polygon_fips[np.sort(hits)]
+
+    def nearest(self, lat, lon, k=1):
+        """FIPS of the ``k`` counties with the nearest centroids, and their
+        great-circle distances in km, nearest first"""
+        self._ensure_built()
+        k = min(int(k), len(self.centroid_fips))
+        chord, rows = self.kdtree.query(_unit_vectors([lat], [lon])[0], k=k)
+        chord, rows = np.atleast_1d(chord), np.atleast_1d(rows)
+        return self.centroid_fips[rows], _chord_to_km(chord)
+
+    def resolve_many(self, lon, lat):
+        """FIPS of the county containing each point, 0 where there is none
+
+        Vectorized: the STRtree finds candidate polygons for every point by
+        bounding box in one call, and the prepared polygons test all
+        candidates at once. A point on a border shared by two counties
+        resolves to the first of them.
+
+        Args:
+            lon, lat: Sequences of point coordinates in degrees
+
+        Returns:
+            numpy.ndarray: int64 FIPS codes aligned with the input
+        """
+        self._ensure_built()
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        fips = np.zeros(len(lon), dtype=np.int64)
+
+        points, candidates = self.tree.query(shapely.points(lon, lat))
+        inside = shapely.intersects_xy(self.polygons[candidates],
+                                       lon[points], lat[points])
+        points, candidates = points[inside], candidates[inside]
+        # Output is grouped by point, so the first hit of each is kept
+        points, first = np.unique(points, return_index=True)
+        fips[points] = self.polygon_fips[candidates[first]]
+        return fips
+
+    def resolve(self, lon, lat):
+        """FIPS of the county containing one point, or None"""
+        fips = int(self.resolve_many([lon], [lat])[0])
+        return fips or None
+
+    def resolve_geometries(self, geometries):
+        """FIPS of the county containing each geometry's centroid, 0 where
+        there is none
+
+        Falls back to a point guaranteed inside the geometry when the
+        centroid of an irregular shape lies outside every county.
+
+        Args:
+            geometries: Shapely geometries
+        """
+        geometries = np.asarray(geometries, dtype=object)
+        centroids = shapely.centroid(geometries)
+        fips = self.resolve_many(shapely.get_x(centroids), shapely.get_y(centroids))
+        missing = np.flatnonzero(fips == 0)
+        if len(missing):
+            points = shapely.point_on_surface(geometries[missing])
+            fips[missing] = self.resolve_many(shapely.get_x(points),
+                                              shapely.get_y(points))
+        return fips
+
+    def resolve_geometry(self, geometry):
+        """FIPS of the county containing a geometry's centroid, or None
+
+        The FIPS is informational, so a geometry GEOS cannot handle even
+        after repair yields None rather than an error.
+
+        Args:
+            geometry: A shapely geometry or a GeoJSON geometry dict
+        """
+        try:
+            if isinstance(geometry, dict):
+                geometry = geojson_geometry(geometry, repair=True)
+            return int(self.resolve_geometries([geometry])[0]) or None
+        except shapely.errors.GEOSException as e:
+            logger.warning(f"No county for an unusable geometry: {str(e)}")
+            return None
+
+    def status(self):
+        return {
+            "built": self._built,
+            "polygons": len(self.polygons) if self._built else 0,
+            "centroids": len(self.centroid_fips) if self._built else 0,
+            "build_time_seconds": self.build_time
+        }
+
+
+county_index = CountyIndex()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+    parser = argparse.ArgumentParser(
+        description="Benchmark point-in-polygon FIPS resolution")
+    parser.add_argument('--points', type=int, default=10000,
+                        help="Random points in the contiguous US per batch")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    county_index.warm()
+    print(f"Index built in {county_index.build_time:.3f}s")
+
+    rng = np.random.default_rng(0)
+    lon = rng.uniform(-124.8, -66.9, args.points)
+    lat = rng.uniform(24.5, 49.4, args.points)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        fips = county_index.resolve_many(lon, lat)
+        timings.append(time.perf_counter() - start)
+    batch = min(timings)
+    print(f"Batch: {args.points} points in {batch * 1e3:.2f} ms, "
+          f"{batch / args.points * 1e6:.2f} us per point, "
+          f"{np.count_nonzero(fips)} inside a county")
+
+    single = min(args.points, 1000)
+    start = time.perf_counter()
+    for x, y in zip(lon[:single], lat[:single]):
+        county_index.resolve(x, y)
+    elapsed = time.perf_counter() - start
+    print(f"Single: {elapsed / single * 1e6:.1f} us per point")
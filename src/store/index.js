@@ -3,40 +3,10 @@ import { createStore } from 'vuex'
 import Papa from 'papaparse'
 import * as d3 from 'd3'
 import { getBasemapUrl } from '@/utils/basemaps'
+import { getAvailableFiles, getPredictionCsvUrl } from '@/utils/availableDays'
 
 const baseUrl = import.meta.env.BASE_URL
 
-//
-async function getAvailableFiles(crop, year) {
-  const days = ["140", "156", "172", "188", "204", "220", "236", "252", "268", "284"]
-  const availableDays = []
-
-  for (const day of days) {
-    const csvPath = `${baseUrl}20260306/result_${crop}/bnn_${day}/result_test_${year}_doy${day}.csv`
-    try {
-      const response = await fetch(csvPath)
-      if (!response.ok) {
-        console.debug(`File not found: ${csvPath}`)
-        continue
-      }
-
-      const text = await response.text()
-      const firstLine = text.trim().split('\n')[0]
-
-      if (firstLine.includes('predicted_yield') || firstLine.includes('FIPS')) {
-        availableDays.push(day)
-        console.log(`[getAvailableFiles] confirmed: ${crop} ${year} DOY${day}`)
-      } else {
-        console.debug(`[getAvailableFiles] not a valid CSV: ${csvPath}`)
-      }
-    } catch {
-      console.debug(`File not found: ${csvPath}`)
-    }
-  }
-  console.log(`[getAvailableFiles] ${crop} ${year} available:`, availableDays)
-  return availableDays
-}
-
 export default createStore({
     state: {
       map: null,
@@ -328,7 +298,7 @@ export default createStore({
           }
 
           const day = parseInt(currentDay).toString()
-          const csvPath = `${baseUrl}20260306/result_${currentCrop}/bnn_${day}/result_test_${currentYear}_doy${day}.csv`
+          const csvPath = await getPredictionCsvUrl(currentCrop, currentYear, day)
 
           try {
             console.log("Attempting to fetch from:", csvPath)
@@ -1,10 +1,63 @@
 const baseUrl = import.meta.env.BASE_URL
 
+// Snapshot served when the catalog API is unreachable (e.g. the static
+// GitHub Pages build), and the days probed in it
+const FALLBACK_SNAPSHOT = '20260306'
+const FALLBACK_DAYS = ["140", "156", "172", "188", "204", "220", "236", "252", "268", "284"]
+
+const snapshotRequests = new Map()
+
+// Catalog entries of the newest snapshot for a crop and year, or null when
+// the API is unreachable. Requests are shared per crop and year.
+function getSnapshotEntries(crop, year) {
+  const key = `${crop}_${year}`
+  if (!snapshotRequests.has(key)) {
+    snapshotRequests.set(key, (async () => {
+      try {
+        const response = await fetch(`/api/catalog?source=snapshot&crop=${crop}&year=${year}`)
+        if (!response.ok) return null
+        const { entries } = await response.json()
+        const newest = entries.reduce(
+          (latest, entry) => entry.snapshot_date > latest ? entry.snapshot_date : latest, '')
+        return entries.filter(entry => entry.snapshot_date === newest)
+      } catch {
+        return null
+      }
+    })())
+    // Retry on the next call rather than caching a failure
+    snapshotRequests.get(key).then(entries => {
+      if (entries === null) snapshotRequests.delete(key)
+    })
+  }
+  return snapshotRequests.get(key)
+}
+
+function fallbackCsvUrl(crop, year, day) {
+  return `${baseUrl}${FALLBACK_SNAPSHOT}/result_${crop}/bnn_${day}/result_test_${year}_doy${day}.csv`
+}
+
+// URL of the prediction CSV of one crop, year and day in the newest
+// snapshot; catalog paths are relative to the repository, and public/ is
+// served at the site root
+export async function getPredictionCsvUrl(crop, year, day) {
+  const d = parseInt(day).toString()
+  const entries = await getSnapshotEntries(crop, year)
+  const entry = entries && entries.find(entry => parseInt(entry.doy).toString() === d)
+  if (entry) return baseUrl + entry.path.replace(/^public\//, '')
+  return fallbackCsvUrl(crop, year, d)
+}
+
 export async function getAvailableFiles(crop, year) {
-  const days = ["140", "156", "172", "188", "204", "220", "236", "252", "268", "284"]
+  const entries = await getSnapshotEntries(crop, year)
+  if (entries) {
+    const days = [...new Set(entries.map(entry => entry.doy))].sort()
+    console.log(`[getAvailableFiles] ${crop} ${year} available (catalog):`, days)
+    return days
+  }
+
   const availableDays = []
-  for (const day of days) {
-    const csvPath = `${baseUrl}20260306/result_${crop}/bnn_${day}/result_test_${year}_doy${day}.csv`
+  for (const day of FALLBACK_DAYS) {
+    const csvPath = fallbackCsvUrl(crop, year, day)
     try {
       const response = await fetch(csvPath)
       if (!response.ok) continue
@@ -17,5 +70,6 @@ export async function getAvailableFiles(crop, year) {
       continue
     }
   }
+  console.log(`[getAvailableFiles] ${crop} ${year} available:`, availableDays)
   return availableDays
-}
\ No newline at end of file
+}